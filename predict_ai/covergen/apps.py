@@ -1,6 +1,36 @@
+import sys
+import threading
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def is_server_process() -> bool:
+    """True under runserver / a WSGI or ASGI server, False for other manage.py commands."""
+    if Path(sys.argv[0]).name != "manage.py":
+        return True
+    return len(sys.argv) > 1 and sys.argv[1] == "runserver"
 
 
 class CovergenConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'covergen'
+
+    def ready(self):
+        from .helpers.embedding_backends import embedding_backend
+
+        # Load the local embedding model before the first request needs it
+        # (the OpenAI backend has nothing to load).
+        if not (getattr(settings, "EMBEDDING_WARMUP", False) and is_server_process()):
+            return
+        if embedding_backend()["type"] == "local":
+            threading.Thread(target=self.warm_up, name="embedding-warmup", daemon=True).start()
+
+    def warm_up(self):
+        from .rag_vectors import warm_up_embeddings
+
+        try:
+            print(f"Embedding backend warmed up in {warm_up_embeddings():.2f}s")
+        except Exception as e:
+            print(f"Embedding warm-up failed: {e}")
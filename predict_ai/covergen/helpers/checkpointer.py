@@ -0,0 +1,487 @@
+"""
+Conversation checkpointers for the proposal agent (settings.CHECKPOINTER).
+
+    "memory" -> LangGraph's InMemorySaver: per process, unbounded, lost on restart
+    "sqlite" -> SQLiteCheckpointSaver below: one file shared by every worker on
+                the host, so a session can continue on any worker
+
+SQLiteCheckpointSaver bounds what it keeps:
+
+  * threads unused for `ttl` seconds expire (reads treat them as gone);
+  * beyond `max_threads` the least recently used threads are evicted;
+  * a background thread compacts every `compact_interval` seconds: expired and
+    excess threads are dropped, each thread keeps only its newest
+    `keep_checkpoints` checkpoints, and channel blobs no remaining checkpoint
+    points at (old copies of the message list, attachments) are deleted.
+    A lease row in the file lets only one worker compact per interval.
+
+Nothing is cached in process memory, so memory stays flat however many
+sessions pass through.
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import InMemorySaver
+
+DEFAULT_CHECKPOINTER = {
+    "type": "sqlite",
+    "path": None,               # defaults to BASE_DIR / "var" / "checkpoints.sqlite3"
+    "ttl": 24 * 3600,           # seconds since a thread was last used
+    "max_threads": 10_000,
+    "keep_checkpoints": 2,      # per thread and namespace
+    "compact_interval": 300,    # seconds; 0 disables the background task
+}
+CHECKPOINTER_TYPES = ("memory", "sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY, last_used REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS threads_last_used ON threads (last_used);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT, type TEXT NOT NULL, checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL, metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id));
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL,
+    version TEXT NOT NULL, type TEXT NOT NULL, blob BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version));
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT NOT NULL,
+    type TEXT NOT NULL, value BLOB, task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx));
+CREATE TABLE IF NOT EXISTS compaction_lease (
+    id INTEGER PRIMARY KEY CHECK (id = 1), owner TEXT NOT NULL, expires REAL NOT NULL);
+"""
+COMPACT_BATCH = 500           # rows per delete transaction
+COMPACT_LEASE_SECONDS = 600   # a compactor that died mid-run blocks the others this long at most
+
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: Optional[str]) -> Optional[RunnableConfig]:
+    if not checkpoint_id:
+        return None
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver on a local SQLite file with per-thread TTL, LRU eviction and compaction."""
+
+    def __init__(self, path, ttl: float = DEFAULT_CHECKPOINTER["ttl"],
+                 max_threads: int = DEFAULT_CHECKPOINTER["max_threads"],
+                 keep_checkpoints: int = DEFAULT_CHECKPOINTER["keep_checkpoints"],
+                 compact_interval: float = DEFAULT_CHECKPOINTER["compact_interval"], serde=None):
+        super().__init__(serde=serde)
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.keep_checkpoints = max(1, keep_checkpoints)
+        self.compact_interval = compact_interval
+        self._conn = None
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._stop = threading.Event()
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self.counters = {"expired": 0, "evicted": 0, "compactions": 0}
+
+    # ---- storage ----
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Opened on first use, so importing the views never touches the disk."""
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False, isolation_level=None)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.executescript(SCHEMA)
+                    self._conn = conn
+        return self._conn
+
+    def _ensure_compactor(self) -> None:
+        if self.compact_interval <= 0 or (self._compactor is not None and self._compactor.is_alive()):
+            return
+        with self._lock:
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self._compact_loop, name="checkpoint-compactor", daemon=True)
+                self._compactor.start()
+
+    def _compact_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Checkpoint compaction failed: {e}")
+
+    def _is_live(self, thread_id: str) -> bool:
+        """Touch a thread; an expired one is deleted and reported as missing."""
+        now = time.time()
+        row = self.conn.execute("SELECT last_used FROM threads WHERE thread_id = ?", (thread_id,)).fetchone()
+        if row is None:
+            return False
+        if now - row[0] > self.ttl:
+            self._delete_threads([thread_id])
+            self.counters["expired"] += 1
+            return False
+        self.conn.execute("UPDATE threads SET last_used = ? WHERE thread_id = ?", (now, thread_id))
+        return True
+
+    def _delete_threads(self, thread_ids: Sequence[str]) -> None:
+        rows = [(t,) for t in thread_ids]
+        for table in ("writes", "blobs", "checkpoints", "threads"):
+            self.conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", rows)
+
+    def _evict_over_limit(self) -> None:
+        excess = self.conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] - self.max_threads
+        if excess > 0:
+            victims = [r[0] for r in self.conn.execute(
+                "SELECT thread_id FROM threads ORDER BY last_used, rowid LIMIT ?", (excess,)
+            )]
+            self._delete_threads(victims)
+            self.counters["evicted"] += len(victims)
+
+    def _load_tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, type_, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint: Checkpoint = self.serde.loads_typed((type_, checkpoint_blob))
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = self.conn.execute(
+                "SELECT type, blob FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed((blob[0], blob[1]))
+        writes = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes"
+            " WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id),
+            pending_writes=[(task_id, channel, self.serde.loads_typed((t, v))) for task_id, channel, t, v in writes],
+        )
+
+    # ---- BaseCheckpointSaver ----
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if not self._is_live(thread_id):
+                return None
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+                    " ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            return self._load_tuple(thread_id, checkpoint_ns, row) if row is not None else None
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint,"
+                 " metadata_type, metadata FROM checkpoints")
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            if config and not self._is_live(config["configurable"]["thread_id"]):
+                return
+            results = []
+            for thread_id, checkpoint_ns, *row in self.conn.execute(query, params).fetchall():
+                if filter:
+                    metadata = self.serde.loads_typed((row[4], row[5]))
+                    if not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                results.append(self._load_tuple(thread_id, checkpoint_ns, tuple(row)))
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        c = checkpoint.copy()
+        values: dict = c.pop("channel_values")
+        blobs = []
+        for channel, version in new_versions.items():
+            type_, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", None)
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), type_, blob))
+        type_, checkpoint_blob = self.serde.dumps_typed(c)
+        metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     type_, checkpoint_blob, metadata_type, metadata_blob),
+                )
+                conn.execute("INSERT OR REPLACE INTO threads (thread_id, last_used) VALUES (?, ?)", (thread_id, time.time()))
+                self._evict_over_limit()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self._ensure_compactor()
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str, task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                         channel, type_, blob, task_path))
+        # Special writes (negative idx) replace; regular writes are kept from the first attempt.
+        verb = "INSERT OR REPLACE" if all(w[0] in WRITES_IDX_MAP for w in writes) else "INSERT OR IGNORE"
+        with self._lock:
+            self.conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._delete_threads([thread_id])
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Async variants run the SQLite calls off the event loop.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    # ---- maintenance ----
+
+    def compact(self) -> dict:
+        """
+        Drop expired / excess threads, old checkpoints and unreferenced blobs.
+
+        Every worker runs a compactor, so a lease row lets one process at a
+        time (and one per `compact_interval`) do the work. Candidates are
+        selected on a separate connection in a read transaction, which in WAL
+        mode blocks no writer, and checkpoints are deserialized there; the
+        deletes then run in short write transactions of COMPACT_BATCH rows,
+        re-checking that a thread is still expired / least recently used.
+        """
+        result = {"expired_threads": 0, "checkpoints": 0, "blobs": 0}
+        conn = sqlite3.connect(str(self.path), timeout=10, isolation_level=None)
+        try:
+            self.conn  # creates the file and schema on first use
+            if not self._acquire_lease(conn):
+                print("--- Checkpoint compaction skipped: another process holds the lease ---")
+                return {**result, "skipped": True}
+
+            now = time.time()
+            conn.execute("BEGIN")
+            try:
+                expired = conn.execute(
+                    "SELECT thread_id FROM threads WHERE last_used < ?", (now - self.ttl,)
+                ).fetchall()
+                excess = conn.execute("SELECT COUNT(*) FROM threads").fetchone()[0] - len(expired) - self.max_threads
+                victims = conn.execute(
+                    "SELECT thread_id, last_used FROM threads WHERE last_used >= ? ORDER BY last_used, rowid LIMIT ?",
+                    (now - self.ttl, max(excess, 0)),
+                ).fetchall()
+                dropped = {t for (t,) in expired} | {t for t, _ in victims}
+
+                # Keep the newest keep_checkpoints per (thread, namespace).
+                old, referenced = [], set()
+                for thread_id, checkpoint_ns, checkpoint_id, n, type_, blob in conn.execute(
+                    "SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER ("
+                    " PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC), type, checkpoint"
+                    " FROM checkpoints"
+                ):
+                    if thread_id in dropped:
+                        continue
+                    if n > self.keep_checkpoints:
+                        old.append((thread_id, checkpoint_ns, checkpoint_id))
+                        continue
+                    versions = self.serde.loads_typed((type_, blob))["channel_versions"]
+                    referenced.update((thread_id, checkpoint_ns, ch, str(v)) for ch, v in versions.items())
+                # Blobs written after this snapshot are not listed, so a concurrent put is never cut short.
+                orphans = [
+                    key for key in conn.execute("SELECT thread_id, checkpoint_ns, channel, version FROM blobs")
+                    if key[0] not in dropped and tuple(key) not in referenced
+                ]
+            finally:
+                conn.execute("COMMIT")
+
+            result["expired_threads"] = self._delete_batches(
+                conn, expired, "SELECT thread_id FROM threads WHERE thread_id = ? AND last_used < ?",
+                lambda row: (row[0], now - self.ttl),
+            )
+            evicted = self._delete_batches(
+                conn, victims, "SELECT thread_id FROM threads WHERE thread_id = ? AND last_used = ?", tuple,
+            )
+            for i in range(0, len(old), COMPACT_BATCH):
+                with self._write(conn):
+                    for table in ("checkpoints", "writes"):
+                        conn.executemany(
+                            f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                            old[i:i + COMPACT_BATCH],
+                        )
+            for i in range(0, len(orphans), COMPACT_BATCH):
+                with self._write(conn):
+                    conn.executemany(
+                        "DELETE FROM blobs WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                        orphans[i:i + COMPACT_BATCH],
+                    )
+            result["checkpoints"], result["blobs"] = len(old), len(orphans)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._release_lease(conn)
+        finally:
+            conn.close()
+
+        self.counters["expired"] += result["expired_threads"]
+        self.counters["evicted"] += evicted
+        self.counters["compactions"] += 1
+        print(f"--- Compacted checkpoints: {result} ---")
+        return result
+
+    @contextmanager
+    def _write(self, conn: sqlite3.Connection):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_batches(self, conn: sqlite3.Connection, rows: list, recheck: str, params) -> int:
+        """Delete the threads in `rows` that still match `recheck`, COMPACT_BATCH at a time."""
+        deleted = 0
+        for i in range(0, len(rows), COMPACT_BATCH):
+            with self._write(conn):
+                thread_ids = [t for row in rows[i:i + COMPACT_BATCH]
+                              for (t,) in conn.execute(recheck, params(row)).fetchall()]
+                for table in ("writes", "blobs", "checkpoints", "threads"):
+                    conn.executemany(f"DELETE FROM {table} WHERE thread_id = ?", [(t,) for t in thread_ids])
+            deleted += len(thread_ids)
+        return deleted
+
+    def _acquire_lease(self, conn: sqlite3.Connection) -> bool:
+        """Take the compaction lease unless another saver holds it or compacted less than an interval ago."""
+        now = time.time()
+        with self._write(conn):
+            conn.execute(
+                "INSERT INTO compaction_lease (id, owner, expires) VALUES (1, ?, ?)"
+                " ON CONFLICT (id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires"
+                " WHERE compaction_lease.expires < ? OR compaction_lease.owner = excluded.owner",
+                (self._owner, now + COMPACT_LEASE_SECONDS, now),
+            )
+            row = conn.execute("SELECT owner FROM compaction_lease WHERE id = 1").fetchone()
+        return row[0] == self._owner
+
+    def _release_lease(self, conn: sqlite3.Connection) -> None:
+        # Held until an interval from now, so the other workers skip their own run.
+        with self._write(conn):
+            conn.execute(
+                "UPDATE compaction_lease SET expires = ? WHERE id = 1 AND owner = ?",
+                (time.time() + self.compact_interval * 0.9, self._owner),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {
+                table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("threads", "checkpoints", "blobs", "writes")
+            }
+        return {**counts, **self.counters}
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def make_checkpointer(overrides: Optional[dict] = None) -> BaseCheckpointSaver:
+    options = {**DEFAULT_CHECKPOINTER, **getattr(settings, "CHECKPOINTER", {}), **(overrides or {})}
+    if options["type"] not in CHECKPOINTER_TYPES:
+        raise ImproperlyConfigured(f"Unknown CHECKPOINTER type {options['type']!r}; use one of {CHECKPOINTER_TYPES}")
+    if options["type"] == "memory":
+        return InMemorySaver()
+    return SQLiteCheckpointSaver(
+        options["path"] or settings.BASE_DIR / "var" / "checkpoints.sqlite3",
+        ttl=options["ttl"],
+        max_threads=options["max_threads"],
+        keep_checkpoints=options["keep_checkpoints"],
+        compact_interval=options["compact_interval"],
+    )
@@ -0,0 +1,78 @@
+"""
+Embedding backend selection (settings.EMBEDDING_BACKEND).
+
+    "openai" -> OpenAIEmbeddings over the network (the original setup)
+    "local"  -> a sentence-transformers model on CPU through
+                langchain-huggingface, optionally as an ONNX / int8-quantized
+                graph; no network on the query path
+
+Vectors from different models are not comparable, so every stored vector and
+snapshot records embedding_model_id(); indexes built with another model are
+rejected instead of silently returning nonsense neighbours.
+"""
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_EMBEDDING_BACKEND = {
+    "type": "openai",
+    "model": "text-embedding-ada-002",
+    # local only:
+    "onnx": True,         # run the ONNX export instead of PyTorch
+    "onnx_file": None,    # e.g. "onnx/model_qint8_avx512.onnx" for the int8-quantized graph
+    "batch_size": 64,
+    "normalize": True,
+    "cache_folder": None,
+}
+BACKEND_TYPES = ("openai", "local")
+
+
+class EmbeddingModelMismatch(RuntimeError):
+    """Stored vectors were produced by a different embedding model than the configured one."""
+
+
+def embedding_backend(overrides: Optional[dict] = None) -> dict:
+    backend = {**DEFAULT_EMBEDDING_BACKEND, **getattr(settings, "EMBEDDING_BACKEND", {}), **(overrides or {})}
+    if backend["type"] not in BACKEND_TYPES:
+        raise ImproperlyConfigured(f"Unknown EMBEDDING_BACKEND type {backend['type']!r}; use one of {BACKEND_TYPES}")
+    return backend
+
+
+def embedding_model_id(backend: Optional[dict] = None) -> str:
+    """Identity stored next to vectors, e.g. "openai:text-embedding-ada-002"."""
+    backend = embedding_backend(backend)
+    model_id = f"{backend['type']}:{backend['model']}"
+    if backend["type"] == "local" and backend["onnx"]:
+        model_id += f":{backend['onnx_file'] or 'onnx'}"
+    return model_id
+
+
+def make_embeddings(backend: Optional[dict] = None) -> Embeddings:
+    backend = embedding_backend(backend)
+    if backend["type"] == "openai":
+        from langchain_openai import OpenAIEmbeddings
+
+        return OpenAIEmbeddings(model=backend["model"])
+
+    try:
+        from langchain_huggingface import HuggingFaceEmbeddings
+        import sentence_transformers  # noqa: F401
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            "EMBEDDING_BACKEND type 'local' needs sentence-transformers "
+            "(pip install 'sentence-transformers[onnx]')"
+        ) from e
+
+    model_kwargs = {"device": "cpu"}
+    if backend["onnx"]:
+        model_kwargs["backend"] = "onnx"
+        if backend["onnx_file"]:
+            model_kwargs["model_kwargs"] = {"file_name": backend["onnx_file"]}
+    return HuggingFaceEmbeddings(
+        model_name=backend["model"],
+        cache_folder=backend["cache_folder"],
+        model_kwargs=model_kwargs,
+        encode_kwargs={"batch_size": backend["batch_size"], "normalize_embeddings": backend["normalize"]},
+    )
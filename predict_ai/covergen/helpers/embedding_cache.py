@@ -0,0 +1,218 @@
+"""
+Two-tier cache for query embeddings.
+
+The agent's search queries are short keyword strings that repeat a lot
+("Shopify migration custom app"), and each one used to be a network round
+trip to the embeddings API. CachedEmbeddings wraps any LangChain Embeddings
+and answers embed_query from:
+
+    1. an in-process LRU (OrderedDict), then
+    2. a local SQLite file shared by every worker on the host, then
+    3. the wrapped backend, filling both tiers on the way back.
+
+Keys are (model name, normalized query), so switching embedding models never
+serves a stale vector. The SQLite tier is trimmed to `max_bytes`, evicting the
+least recently used entries first. embed_documents is passed straight through:
+indexing embeds each row once and would only flush useful queries out.
+"""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from .vector_codec import pack_vector, unpack_vector
+
+DEFAULT_LRU_SIZE = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query."""
+    return " ".join((text or "").lower().split())
+
+
+def model_name(embeddings: Embeddings) -> str:
+    """Best-effort model identifier of an Embeddings backend (e.g. "text-embedding-3-small")."""
+    name = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return str(name or type(embeddings).__name__)
+
+
+class QueryEmbeddingStore:
+    """Persistent (model, query) -> packed vector map in a SQLite file."""
+
+    def __init__(self, path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " model TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, query))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS query_embeddings_last_used ON query_embeddings (last_used)")
+
+    def get(self, model: str, query: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT embedding FROM query_embeddings WHERE model = ? AND query = ?", (model, query)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE query_embeddings SET last_used = ? WHERE model = ? AND query = ?",
+                    (time.time(), model, query),
+                )
+        return bytes(row[0]) if row is not None else None
+
+    def put(self, model: str, query: str, blob: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, embedding, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (model, query, blob, len(blob) + len(query), time.time()),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM query_embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop oldest entries until we are back under budget.
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for rowid, size in self._conn.execute("SELECT rowid, size FROM query_embeddings ORDER BY last_used, rowid"):
+            victims.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM query_embeddings WHERE rowid = ?", victims)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM query_embeddings").fetchone()[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM query_embeddings")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that caches embed_query results in an LRU and an optional QueryEmbeddingStore."""
+
+    def __init__(self, embeddings: Embeddings, store: Optional[QueryEmbeddingStore] = None,
+                 lru_size: int = DEFAULT_LRU_SIZE, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.store = store
+        self.lru_size = lru_size
+        self.model = model or model_name(embeddings)
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"lru_hits": 0, "store_hits": 0, "misses": 0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.counters["lru_hits"] += 1
+                return list(vector)
+
+        blob = self.store.get(self.model, key) if self.store is not None else None
+        if blob is not None:
+            self._count("store_hits")
+        else:
+            blob = pack_vector(self.embeddings.embed_query(text))
+            self._count("misses")
+            if self.store is not None:
+                self.store.put(self.model, key, blob)
+
+        # Always float32-rounded, so every tier returns the exact same vector.
+        vector = unpack_vector(blob).tolist()
+        self._remember(key, vector)
+        return list(vector)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        embed_query() for several texts; everything missing from both tiers
+        goes to the backend together (its embed_queries when it has one, so a
+        coalescer can batch it with other callers, else one embed_documents).
+        """
+        keys = [normalize_query(t) for t in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru and key not in found:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                    self.counters["lru_hits"] += 1
+
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key in found or key in missing:
+                continue
+            blob = self.store.get(self.model, key) if self.store is not None else None
+            if blob is not None:
+                self._count("store_hits")
+                found[key] = unpack_vector(blob).tolist()
+            else:
+                missing[key] = text
+
+        if missing:
+            # A coalescing backend batches these with other callers' misses.
+            embed_many = getattr(self.embeddings, "embed_queries", self.embeddings.embed_documents)
+            vectors = embed_many(list(missing.values()))
+            for key, values in zip(missing, vectors):
+                blob = pack_vector(values)
+                self._count("misses")
+                if self.store is not None:
+                    self.store.put(self.model, key, blob)
+                found[key] = unpack_vector(blob).tolist()
+
+        for key in dict.fromkeys(keys):
+            self._remember(key, found[key])
+        return [list(found[key]) for key in keys]
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+            lru_entries = len(self._lru)
+        lookups = sum(counters.values())
+        hits = counters["lru_hits"] + counters["store_hits"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "lru_entries": lru_entries,
+            "store_entries": len(self.store) if self.store is not None else 0,
+        }
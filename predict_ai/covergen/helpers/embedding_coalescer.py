@@ -0,0 +1,106 @@
+"""
+Micro-batching of query embeddings across concurrent callers.
+
+At peak many sessions call the retrieval tool at once, and each used to make
+its own single-text embeddings request. EmbeddingCoalescer queues every
+embed_query / embed_queries text; one background thread waits up to `max_wait_ms` after the
+first queued text (or until `max_batch` texts are queued), sends them as a
+single embed_documents request and hands each caller its own vector.
+Identical texts in the same batch are embedded once. Up to `max_inflight`
+batch requests run at the same time, so a slow round trip does not hold up
+the next batch.
+
+A failed batch fails every caller waiting on it with the same exception.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from .embedding_cache import model_name
+
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_INFLIGHT = 4
+
+
+class EmbeddingCoalescer(Embeddings):
+    """Embeddings wrapper that batches concurrent embed_query calls into embed_documents requests."""
+
+    def __init__(self, embeddings: Embeddings, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_batch: int = DEFAULT_MAX_BATCH, max_inflight: int = DEFAULT_MAX_INFLIGHT):
+        self.embeddings = embeddings
+        self.model = model_name(embeddings)
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self.max_inflight = max(1, max_inflight)
+        self._inflight = threading.BoundedSemaphore(self.max_inflight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="embedding-batch")
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self.stats = {"queries": 0, "requests": 0, "largest_batch": 0}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Queue several texts at once; they share batches with every other caller's."""
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> list:
+        """Block for the first request, then gather more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        # Wait for a free request slot; callers queued meanwhile join this batch.
+        self._inflight.acquire()
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            self.stats["queries"] += len(batch)
+            self.stats["requests"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: list) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = dict(zip(texts, self.embeddings.embed_documents(texts)))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._inflight.release()
+        for text, future in batch:
+            future.set_result(list(vectors[text]))
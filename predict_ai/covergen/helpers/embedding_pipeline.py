@@ -0,0 +1,304 @@
+"""
+Batch embedding stage for catalog ingest.
+
+- Texts are split into batches bounded by a token budget and a max item count.
+- Batches run on a bounded thread pool; an adaptive limiter halves the number
+  of in-flight requests and backs off whenever the backend reports a rate
+  limit, then slowly opens back up after successes.
+- Every finished batch is appended to a local journal (JSONL, keyed by content
+  hash), so a rerun after a crash only embeds what is still missing.
+
+Works with any LangChain `Embeddings` implementation, including the fake
+ones from langchain_core for tests.
+"""
+import base64
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .vector_codec import pack_vector
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_BATCH_TOKENS = 50_000
+DEFAULT_MAX_BATCH_SIZE = 512
+DEFAULT_MAX_RETRIES = 8
+
+
+class RateLimitExhausted(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------
+# Token counting & batching
+# ---------------------------------------------------------------------
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when its encoding is available, else ~4 chars/token."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def make_batches(items: List[dict], max_tokens: int, max_size: int) -> List[List[dict]]:
+    """
+    Group items (each with "text" and "tokens") into batches that stay under
+    `max_tokens` and `max_size`. A single oversized item gets its own batch.
+    """
+    batches: List[List[dict]] = []
+    current: List[dict] = []
+    current_tokens = 0
+
+    for item in items:
+        if current and (current_tokens + item["tokens"] > max_tokens or len(current) >= max_size):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += item["tokens"]
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+# ---------------------------------------------------------------------
+# Checkpoint journal
+# ---------------------------------------------------------------------
+class EmbeddingJournal:
+    """
+    Append-only JSONL of {"hash": content_hash, "vector": base64(packed float32)}.
+
+    Only a hash -> file offset table is kept in memory; vectors are read back
+    on demand, so resuming a very large ingest does not load the whole journal.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._offsets: Optional[Dict[str, int]] = None
+
+    def _scan(self) -> Dict[str, int]:
+        if self._offsets is None:
+            offsets: Dict[str, int] = {}
+            if self.path.exists():
+                with open(self.path, "rb") as f:
+                    offset = 0
+                    for line in f:
+                        try:
+                            offsets[json.loads(line)["hash"]] = offset
+                        except (ValueError, KeyError):
+                            # A torn final line from a crash mid-write; everything before it is good.
+                            pass
+                        offset += len(line)
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._scan())
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._scan()
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, bytes]:
+        """Packed vectors for the given hashes that are already journaled."""
+        with self._lock:
+            offsets = self._scan()
+            wanted = sorted((offsets[h], h) for h in set(hashes) if h in offsets)
+            found: Dict[str, bytes] = {}
+            if not wanted:
+                return found
+            with open(self.path, "rb") as f:
+                for offset, content_hash in wanted:
+                    f.seek(offset)
+                    found[content_hash] = base64.b64decode(json.loads(f.readline())["vector"])
+            return found
+
+    def append(self, entries: Dict[str, bytes]) -> None:
+        lines = [
+            (h, (json.dumps({"hash": h, "vector": base64.b64encode(v).decode("ascii")}) + "\n").encode("utf-8"))
+            for h, v in entries.items()
+        ]
+        with self._lock:
+            offsets = self._scan()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                for content_hash, line in lines:
+                    f.write(line)
+                    offsets[content_hash] = offset
+                    offset += len(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+            self._offsets = {}
+
+
+# ---------------------------------------------------------------------
+# Adaptive concurrency
+# ---------------------------------------------------------------------
+def is_rate_limit_error(exc: Exception) -> bool:
+    if getattr(exc, "status_code", None) == 429:
+        return True
+    try:
+        import openai
+        if isinstance(exc, openai.RateLimitError):
+            return True
+    except ImportError:
+        pass
+    return "rate limit" in str(exc).lower()
+
+
+class AdaptiveLimiter:
+    """
+    Caps in-flight requests. On a rate limit the cap is halved (AIMD);
+    after `grow_after` consecutive successes it grows by one again.
+    """
+
+    def __init__(self, max_limit: int, grow_after: int = 4):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.grow_after = grow_after
+        self._active = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self._active >= self.limit:
+                self._cond.wait()
+            self._active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.grow_after and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+
+    def on_rate_limit(self) -> None:
+        with self._cond:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+
+# ---------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------
+class EmbeddingPipeline:
+    def __init__(
+        self,
+        embeddings,
+        journal: Optional[EmbeddingJournal] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.embeddings = embeddings
+        self.journal = journal
+        self.max_workers = max(1, max_workers)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stats: Dict[str, float] = {}
+        self._stats_lock = threading.Lock()
+
+    def _embed_batch(self, batch: List[dict], limiter: AdaptiveLimiter) -> Dict[str, bytes]:
+        texts = [item["text"] for item in batch]
+        for attempt in range(self.max_retries + 1):
+            try:
+                with limiter:
+                    vectors = self.embeddings.embed_documents(texts)
+            except Exception as exc:
+                if not is_rate_limit_error(exc) or attempt == self.max_retries:
+                    if is_rate_limit_error(exc):
+                        raise RateLimitExhausted(f"Still rate limited after {attempt} retries") from exc
+                    raise
+                limiter.on_rate_limit()
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+
+            limiter.on_success()
+            packed = {item["hash"]: pack_vector(vec) for item, vec in zip(batch, vectors)}
+            if self.journal is not None:
+                self.journal.append(packed)
+            return packed
+
+    def run(self, items: Iterable[dict]) -> Dict[str, bytes]:
+        """
+        Embed items of the form {"hash": content_hash, "text": page_content}.
+        Returns content_hash -> packed float32 vector. Hashes already in the
+        journal are not sent to the backend again.
+        """
+        started = time.perf_counter()
+        self.stats = {"rows": 0, "tokens": 0, "resumed": 0, "batches": 0, "retries": 0}
+
+        unique: Dict[str, dict] = {}
+        for item in items:
+            unique.setdefault(item["hash"], item)
+
+        results: Dict[str, bytes] = self.journal.get_many(unique) if self.journal is not None else {}
+        self.stats["resumed"] = len(results)
+
+        pending = [
+            {**item, "tokens": count_tokens(item["text"])}
+            for content_hash, item in unique.items()
+            if content_hash not in results
+        ]
+
+        batches = make_batches(pending, self.max_batch_tokens, self.max_batch_size)
+        limiter = AdaptiveLimiter(self.max_workers)
+
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = [(batch, pool.submit(self._embed_batch, batch, limiter)) for batch in batches]
+            for batch, future in futures:
+                results.update(future.result())
+                self.stats["batches"] += 1
+                self.stats["rows"] += len(batch)
+                self.stats["tokens"] += sum(item["tokens"] for item in batch)
+        except BaseException:
+            # Batches already in flight finish and land in the journal; queued ones are dropped.
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+
+        elapsed = time.perf_counter() - started
+        self.stats["seconds"] = elapsed
+        self.stats["rows_per_s"] = self.stats["rows"] / elapsed if elapsed else 0.0
+        self.stats["tokens_per_s"] = self.stats["tokens"] / elapsed if elapsed else 0.0
+
+        return results
@@ -0,0 +1,201 @@
+"""
+Turn portfolio CSV rows into the records stored in ProjectVector.
+
+Each record gets a stable `project_key` (the project URL, with "#2", "#3"...
+appended when the same URL appears more than once) and a `content_hash` of
+its page_content, so re-indexing can tell new, changed and removed rows
+apart without re-embedding everything.
+
+The compact fields the retrieval tool hands to the agent (url, title,
+summary, short_description) are also derived here, once, at index time.
+"""
+import hashlib
+import re
+from typing import Dict, Iterable, Iterator, List
+from urllib.parse import urlparse
+
+SUMMARY_MAX_CHARS = 200
+DESCRIPTION_MIN_WORDS = 10
+DESCRIPTION_MAX_WORDS = 15
+# ProjectVector.title / .short_description max_length.
+TITLE_MAX_CHARS = 255
+SHORT_DESCRIPTION_MAX_CHARS = 255
+APP_STORE_HOSTS = ("apps.apple.com", "play.google.com", "chromewebstore.google.com", "chrome.google.com")
+
+
+def content_hash(page_content: str) -> str:
+    return hashlib.sha256(page_content.encode("utf-8")).hexdigest()
+
+
+def normalize_term(term: str) -> str:
+    """Lowercase and collapse whitespace, e.g. "Subscriptions  /  Subscribe" -> "subscriptions / subscribe"."""
+    return re.sub(r"\s+", " ", term or "").strip().lower()
+
+
+def split_terms(value: str, lower: bool = True) -> List[str]:
+    """Comma-separated CSV cell -> unique normalized terms, in order."""
+    terms = []
+    for part in (value or "").split(","):
+        term = normalize_term(part) if lower else re.sub(r"\s+", " ", part).strip()
+        if term and term.lower() != "n/a" and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def parse_priority(value) -> int:
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def get_project_url(row: Dict[str, str]) -> str:
+    return (
+        row.get("Project_URL")
+        or row.get("ProjectUrl")
+        or row.get("URL")
+        or row.get("project_url")
+        or row.get("\ufeffProject_URL")
+        or "Unknown URL"
+    )
+
+
+def title_from_url(url: str) -> str:
+    """
+    Readable project name from its URL: the app slug for store listings
+    ("seen-dating-meet-real-people" -> "Seen Dating Meet Real People"),
+    otherwise the host without "www.".
+    """
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = (parsed.hostname or "").removeprefix("www.")
+    if host in APP_STORE_HOSTS:
+        parts = [p for p in parsed.path.split("/") if p]
+        slug = ""
+        if "app" in parts and parts.index("app") + 1 < len(parts):
+            slug = parts[parts.index("app") + 1]
+        elif "detail" in parts and parts.index("detail") + 1 < len(parts):
+            slug = parts[parts.index("detail") + 1]
+        elif "id=" in parsed.query:
+            slug = parsed.query.split("id=", 1)[1].split("&", 1)[0].rsplit(".", 1)[-1]
+        if slug:
+            return " ".join(w.capitalize() for w in re.split(r"[-_]+", slug) if w)
+    return host or url
+
+
+def _truncate_chars(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",;/ ") + "..."
+
+
+def build_summary(technologies: str, categories: str, description: str = "") -> str:
+    """One line: "<Technology> - <Categories>", or the CSV description when there is one."""
+    if description.strip():
+        return _truncate_chars(" ".join(description.split()), SUMMARY_MAX_CHARS)
+    parts = [p for p in (technologies.strip(), ", ".join(split_terms(categories, lower=False))) if p]
+    return _truncate_chars(" - ".join(parts), SUMMARY_MAX_CHARS)
+
+
+def build_short_description(technologies: str, categories: str, description: str = "") -> str:
+    """A 10-15 word description of the project, for citing it in the proposal."""
+    if description.strip():
+        words = description.split()[:DESCRIPTION_MAX_WORDS]
+        return " ".join(words).rstrip(",;.") + "."
+
+    tech = ", ".join(split_terms(technologies, lower=False)) or "Custom"
+    words = f"{tech} project covering".split()
+    covered = []
+    for category in split_terms(categories, lower=False):
+        candidate = covered + [category.split(" / ")[0]]
+        if len(words) + len(", ".join(candidate).split()) > DESCRIPTION_MAX_WORDS - 1:
+            break
+        covered = candidate
+    words += (", ".join(covered) or "a client website").split()
+
+    for filler in ("built end to end", "with custom design and development"):
+        if len(words) >= DESCRIPTION_MIN_WORDS:
+            break
+        words += filler.split()
+    return " ".join(words[:DESCRIPTION_MAX_WORDS]) + "."
+
+
+def build_page_content(row: Dict[str, str]) -> str:
+    """Same text we have always embedded for a CSV row."""
+    project_url = get_project_url(row)
+    priority = parse_priority(row.get("Priority"))
+
+    categories = row.get("Categories", "N/A")
+    technology = row.get("Technology", "N/A")
+    title = row.get("Title") or row.get("ProjectName") or row.get("Name") or ""
+    description = row.get("Description") or row.get("Notes") or ""
+
+    return " | ".join(
+        x for x in [
+            title.strip(),
+            description.strip(),
+            f"Categories: {categories}",
+            f"Technology: {technology}",
+            f"URL: {project_url}",
+            f"Priority: {priority}",
+        ] if x
+    )
+
+
+def iter_project_records(rows: Iterable[Dict[str, str]]) -> Iterator[dict]:
+    """
+    Yield one record per CSV row:
+    {"project_key", "row_index", "page_content", "content_hash",
+     "categories", "technologies", "priority",
+     "url", "title", "summary", "short_description"}
+    """
+    seen_urls: Dict[str, int] = {}
+
+    for idx, row in enumerate(rows):
+        url = get_project_url(row).strip()
+        occurrence = seen_urls.get(url, 0) + 1
+        seen_urls[url] = occurrence
+        project_key = url if occurrence == 1 else f"{url}#{occurrence}"
+
+        page_content = build_page_content(row)
+        title = row.get("Title") or row.get("ProjectName") or row.get("Name") or ""
+        description = row.get("Description") or row.get("Notes") or ""
+        categories = row.get("Categories", "") or ""
+        technology = row.get("Technology", "") or ""
+        yield {
+            "project_key": project_key,
+            "row_index": idx,
+            "page_content": page_content,
+            "content_hash": content_hash(page_content),
+            "categories": split_terms(row.get("Categories", "")),
+            "technologies": split_terms(row.get("Technology", "")),
+            "priority": parse_priority(row.get("Priority")),
+            "url": url,
+            # _truncate_chars may add "..." past the limit.
+            "title": _truncate_chars(title.strip() or title_from_url(url), TITLE_MAX_CHARS - 3),
+            "summary": build_summary(technology, categories, description),
+            "short_description": _truncate_chars(
+                build_short_description(technology, categories, description), SHORT_DESCRIPTION_MAX_CHARS - 3
+            ),
+        }
+
+
+def parse_page_content(page_content: str) -> Dict[str, str]:
+    """
+    Inverse of build_page_content, for rows stored before a field existed:
+    returns a CSV-like row dict ("Title", "Description", "Categories", ...).
+    """
+    row: Dict[str, str] = {}
+    labels = {"categories": "Categories", "technology": "Technology", "url": "Project_URL", "priority": "Priority"}
+    free_text = []
+    for segment in (page_content or "").split(" | "):
+        label, sep, value = segment.partition(":")
+        key = labels.get(label.strip().lower()) if sep else None
+        if key:
+            row[key] = value.strip()
+        elif segment.strip():
+            free_text.append(segment.strip())
+    if free_text:
+        row["Title"] = free_text[0]
+    if len(free_text) > 1:
+        row["Description"] = free_text[1]
+    return row
@@ -0,0 +1,74 @@
+"""
+Deterministic reranking of retrieval candidates.
+
+The combined score is a weighted sum of per-candidate signals computed in one
+NumPy pass:
+
+    score = w_similarity * cosine + w_priority * priority / priority_scale + w_recency * recency
+
+Similarity and priority are absolute (cosine = 1 - d / 2 from FAISS
+squared-L2 distances between unit vectors; priority over a fixed scale), so a
+project's score doesn't depend on which other candidates came back. Recency
+is min-max normalized over the candidate set. Candidates sharing a dedupe key
+(the project URL) keep only their best-scoring entry.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_WEIGHTS = {"similarity": 0.7, "priority": 0.3, "recency": 0.0}
+# Catalog priorities run from 0 to 10.
+DEFAULT_PRIORITY_SCALE = 10
+
+
+def _minmax(values: np.ndarray) -> np.ndarray:
+    span = values.max() - values.min()
+    if span <= 0:
+        return np.zeros_like(values)
+    return (values - values.min()) / span
+
+
+def combined_scores(
+    distances: Sequence[float],
+    priorities: Sequence[float],
+    recency: Optional[Sequence[float]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    priority_scale: float = DEFAULT_PRIORITY_SCALE,
+) -> np.ndarray:
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    similarity = 1.0 - np.asarray(distances, dtype=np.float64) / 2.0
+    priority = np.clip(np.asarray(priorities, dtype=np.float64) / priority_scale, 0.0, 1.0)
+
+    scores = weights["similarity"] * similarity
+    scores += weights["priority"] * priority
+    if recency is not None and weights["recency"]:
+        scores += weights["recency"] * _minmax(np.asarray(recency, dtype=np.float64))
+    return scores
+
+
+def rank_candidates(
+    keys: Sequence[str],
+    distances: Sequence[float],
+    priorities: Sequence[float],
+    recency: Optional[Sequence[float]] = None,
+    weights: Optional[Dict[str, float]] = None,
+    top_n: int = 3,
+    priority_scale: float = DEFAULT_PRIORITY_SCALE,
+):
+    """
+    Return (positions, scores): indexes into the candidate arrays of the
+    best `top_n` unique keys, best first, and their combined scores.
+    Ties are broken by raw distance, then by original candidate order.
+    """
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    scores = combined_scores(distances, priorities, recency, weights, priority_scale)
+    distances = np.asarray(distances, dtype=np.float64)
+    # lexsort uses the last key as primary: score desc, then distance asc, then position.
+    order = np.lexsort((np.arange(len(scores)), distances, -scores))
+
+    # First occurrence of each key in ranked order == its best-scoring candidate.
+    _, first = np.unique(np.asarray(keys, dtype=object)[order], return_index=True)
+    picked = order[np.sort(first)][:top_n]
+    return picked, scores[picked]
@@ -0,0 +1,116 @@
+"""
+Wire encoding of the generate stream (settings.SSE_STREAM).
+
+AgentStreamProcessor produces SSE frames ("data: {...}\\n\\n"); SSEWriter turns
+each batch of them into one chunk for the StreamingHttpResponse:
+
+  * every frame gets an "id: N" line;
+  * progress frames are coalesced to at most one per `progress_interval`
+    seconds: only the latest percent is kept, and it goes out once the
+    interval has passed (or when the stream closes);
+  * after `heartbeat` seconds without a write, a ": ping" comment keeps
+    proxies from closing the idle connection;
+  * with `gzip` on and a client that accepts it, the stream is gzipped and
+    flushed with Z_SYNC_FLUSH after every chunk so nothing waits in the
+    compressor.
+"""
+import time
+import zlib
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.http import HttpRequest
+
+DEFAULT_SSE_STREAM = {
+    "progress_interval": 0.1,   # seconds between progress frames; 0 sends every one
+    "heartbeat": 15.0,          # seconds of silence before a ": ping" comment; 0 disables
+    "gzip": False,              # gzip when the client sends Accept-Encoding: gzip
+}
+
+PROGRESS_PREFIX = 'data: {"type": "progress"'
+HEARTBEAT = ": ping\n\n"
+
+
+class SSEWriter:
+    def __init__(self, progress_interval: float = 0.1, heartbeat: float = 15.0,
+                 compress: bool = False, clock=time.monotonic):
+        self.progress_interval = progress_interval
+        self.heartbeat = heartbeat
+        self.clock = clock
+        self.next_id = 1
+        self.pending_progress: Optional[str] = None
+        self.last_progress_at = None
+        self.last_write_at = clock()
+        self.writes = 0
+        self.compress = compress
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        if self.compress:
+            headers.update({"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+        return headers
+
+    def heartbeat_in(self) -> Optional[float]:
+        """Seconds until a heartbeat is due (None when disabled)."""
+        if not self.heartbeat:
+            return None
+        return max(0.0, self.last_write_at + self.heartbeat - self.clock())
+
+    def write(self, frames: Iterable[str]) -> bytes:
+        """One chunk for the response: the frames to send now, or a heartbeat when one is due, or b""."""
+        now = self.clock()
+        parts = []
+        for frame in frames:
+            if frame.startswith(PROGRESS_PREFIX):
+                self.pending_progress = frame
+            else:
+                parts.append(frame)
+        if self.pending_progress and (
+            self.last_progress_at is None or now - self.last_progress_at >= self.progress_interval
+        ):
+            parts.insert(0, self.pending_progress)
+            self.pending_progress = None
+            self.last_progress_at = now
+        parts = [self._numbered(frame) for frame in parts]
+
+        if not parts:
+            if self.heartbeat and now - self.last_write_at >= self.heartbeat:
+                parts.append(HEARTBEAT)
+            else:
+                return b""
+        self.last_write_at = now
+        return self._encode("".join(parts))
+
+    def close(self) -> bytes:
+        """The held back progress frame, if any, and the end of the gzip stream."""
+        text = self._numbered(self.pending_progress) if self.pending_progress else ""
+        self.pending_progress = None
+        if self._compressor:
+            data = self._compressor.compress(text.encode()) + self._compressor.flush(zlib.Z_FINISH)
+            self._compressor = None
+            return data
+        return text.encode()
+
+    def _numbered(self, frame: str) -> str:
+        frame = f"id: {self.next_id}\n{frame}"
+        self.next_id += 1
+        return frame
+
+    def _encode(self, text: str) -> bytes:
+        self.writes += 1
+        data = text.encode()
+        if self._compressor:
+            data = self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+
+def make_sse_writer(request: Optional[HttpRequest] = None, overrides: Optional[dict] = None) -> SSEWriter:
+    options = {**DEFAULT_SSE_STREAM, **getattr(settings, "SSE_STREAM", {}), **(overrides or {})}
+    accepts_gzip = request is not None and "gzip" in request.headers.get("Accept-Encoding", "")
+    return SSEWriter(
+        progress_interval=options["progress_interval"],
+        heartbeat=options["heartbeat"],
+        compress=bool(options["gzip"]) and accepts_gzip,
+    )
@@ -1,329 +1,672 @@
+import asyncio
+import contextvars
 import json
-import time
-import traceback
-from typing import Dict, Any, Generator
+import queue
 import re
+import threading
+import traceback
+from functools import lru_cache
+from typing import Dict, Any, AsyncGenerator, Generator, Iterator, List, Optional
+
+from django.db import connection
+from langchain_core.messages import AIMessageChunk
+from pydantic import TypeAdapter
+
+from .sse_writer import SSEWriter
+from .system_prompts import ProposalAnalysisData
 
 # --- JSON extractor helper ---
 class JSONExtractionError(Exception):
     pass
 
 
+JSON_DECODER = json.JSONDecoder()
+# Double-quoted strings (braces inside them don't count) and braces.
+JSON_SPAN_TOKEN_RE = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}]')
+# What fix_json_like_string rewrites. Double-quoted strings are matched first and kept
+# as they are, so apostrophes and colons inside them are never touched.
+JSON_REPAIR_RE = re.compile(r"""
+    (?P<string>"[^"\\]*(?:\\.[^"\\]*)*")
+  | '(?P<single>[^'\\]*(?:\\.[^'\\]*)*)'
+  | (?P<comma>,)(?=\s*[}\]])
+  | (?<=[{,])(?P<space>\s*)(?P<key>[A-Za-z_][A-Za-z0-9_]*)(?=\s*:)
+""", re.VERBOSE)
+
+
+def _balanced_end(text: str, start: int) -> int:
+    """Index just past the brace that closes the one at `start`, or -1."""
+    depth = 0
+    for match in JSON_SPAN_TOKEN_RE.finditer(text, start):
+        token = match.group()
+        if token == "{":
+            depth += 1
+        elif token == "}":
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    return -1
+
+
 def extract_json_and_span(text: str):
     """
     Find first top-level JSON object in `text`.
-    Returns tuple: (parsed_json: dict, start_index: int, end_index_inclusive: int)
+    Returns tuple: (parsed_json: dict, start_index: int, end_index_exclusive: int)
     Raises JSONExtractionError on failure.
+
+    Each "{" is tried with JSONDecoder.raw_decode. When the object there is not
+    valid JSON, only its balanced span is repaired with fix_json_like_string;
+    if that fails too, the search resumes after the span, so a brace in the
+    prose before the real object (or an inner object of a broken one) is not
+    taken for the answer.
     """
     if not text or "{" not in text:
         raise JSONExtractionError("No JSON object start found in text.")
 
+    error = None
     start = text.find("{")
-    stack = []
-    idx = start
-    in_string = False
-    escape = False
-
-    while idx < len(text):
-        ch = text[idx]
-
-        if in_string:
-            if escape:
-                escape = False
-            elif ch == "\\":
-                escape = True
+    while start != -1:
+        try:
+            parsed, end = JSON_DECODER.raw_decode(text, start)
+            if isinstance(parsed, dict):
+                return parsed, start, end
+        except json.JSONDecodeError:
+            pass
+
+        end = _balanced_end(text, start)
+        if end == -1:
+            break
+        candidate = text[start:end]
+        try:
+            parsed = json.loads(fix_json_like_string(candidate))
+            if isinstance(parsed, dict):
+                return parsed, start, end
+        except json.JSONDecodeError as e:
+            error = error or JSONExtractionError(f"JSON decode failed: {e.msg}. Candidate prefix: {candidate[:400]}...")
+        start = text.find("{", end)
+
+    raise error or JSONExtractionError("Reached end of text without closing JSON object.")
+
+
+def _repair_token(match) -> str:
+    if match.group("string") is not None:
+        return match.group("string")
+    if match.group("single") is not None:
+        body = match.group("single").replace("\\'", "'")
+        return '"' + re.sub(r'(?<!\\)"', r'\\"', body) + '"'
+    if match.group("comma") is not None:
+        return ""
+    return f'{match.group("space")}"{match.group("key")}"'
+
+
+def fix_json_like_string(bad_json: str):
+    """
+    Convert JS-like object (with single quotes, unquoted keys, etc.)
+    into valid JSON as much as possible.
+
+    Meant for the candidate object only: text outside any string is rewritten,
+    so prose around the object would be mangled.
+    """
+    return JSON_REPAIR_RE.sub(_repair_token, bad_json)
+
+
+SSE_JSON = json.JSONEncoder(ensure_ascii=False)  # built once; json.dumps(..., ensure_ascii=False) builds one per call
+
+
+def emit_sse(obj: dict) -> str:
+    """Format SSE data line"""
+    return f"data: {SSE_JSON.encode(obj)}\n\n"
+
+
+DONE_FRAME = emit_sse({"type": "done"})
+TEXT_DELTA_PREFIX = emit_sse({"type": "cover_letter_delta", "text": ""})[:-len('""}\n\n')]
+
+
+def emit_text_delta(text: str) -> str:
+    """emit_sse() of a cover_letter_delta event; only the text is serialized per call."""
+    return f"{TEXT_DELTA_PREFIX}{SSE_JSON.encode(text)}}}\n\n"
+
+
+PROPOSAL_MARKER = "human_proposal_text"
+STRUCTURED_MARKER = "structured_data"
+TOTAL_WORD_RE = re.compile(r"total_word:\s*(\d+)")
+TOTAL_WORD_WINDOW = 64  # chars of proposal text kept to catch "total_word: N" split across chunks
+
+
+class ProposalScanner:
+    """
+    Incremental scan of the streamed model output.
+
+    States: WAITING -> PROPOSAL (after "human_proposal_text") -> STRUCTURED
+    (after "structured_data", from any state). Each chunk is looked at once,
+    together with a short tail of the previous text so that markers and the
+    "total_word: N" header split across chunks are still found. Besides the
+    proposal text itself (which is the output) the state is constant-size.
+    """
+
+    WAITING = "waiting"
+    PROPOSAL = "proposal"
+    STRUCTURED = "structured"
+
+    def __init__(self):
+        self.state = self.WAITING
+        self.proposal_parts: List[str] = []
+        self.words = 0          # whitespace-separated words in the proposal text so far
+        self.total_word = 0     # the model's own "total_word: N" announcement
+        self._tail = ""
+        self._proposal_tail = ""
+        self._in_word = False
+        self._total_word_final = False
+        self._tail_size = max(len(PROPOSAL_MARKER), len(STRUCTURED_MARKER)) - 1
+
+    @property
+    def proposal_text(self) -> str:
+        return "".join(self.proposal_parts)
+
+    def feed(self, chunk: str) -> None:
+        window = self._tail + chunk
+        self._tail = window[-self._tail_size:]
+        if self.state == self.WAITING and PROPOSAL_MARKER in window:
+            self.state = self.PROPOSAL
+        if self.state != self.STRUCTURED and STRUCTURED_MARKER in window:
+            self.state = self.STRUCTURED
+        if self.state == self.PROPOSAL:
+            self._add_proposal(chunk)
+
+    def _add_proposal(self, chunk: str) -> None:
+        self.proposal_parts.append(chunk)
+
+        # Count word starts; a word running on from the previous chunk is not new.
+        starts = len(re.findall(r"\s\S", chunk))
+        if not chunk[0].isspace() and not self._in_word:
+            starts += 1
+        self.words += starts
+        self._in_word = not chunk[-1].isspace()
+
+        if not self._total_word_final:
+            window = self._proposal_tail + chunk
+            match = TOTAL_WORD_RE.search(window)
+            if match:
+                self.total_word = int(match.group(1))
+                # Digits may continue in the next chunk until something else follows them.
+                self._total_word_final = match.end() < len(window)
+            self._proposal_tail = window[-TOTAL_WORD_WINDOW:]
+
+    @property
+    def percent(self) -> int:
+        return self.words * 100 // self.total_word if self.total_word else 0
+
+
+JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+STRING_SPECIAL_RE = re.compile(r'["\\]')
+TOTAL_WORD_HEADER_RE = re.compile(r"\s*total_word:\s*\d+")
+TOTAL_WORD_HEADER = "total_word:"
+
+
+class JsonFieldStreamReader:
+    """
+    Incremental reader for one top-level string field of a JSON object that
+    arrives in arbitrary chunks (the structured output's human_proposal_text).
+
+    feed() returns the newly decoded characters of that field's value, with
+    escapes (including \\uXXXX surrogate pairs) resolved even when they are
+    split across chunks. Text before the first "{" is skipped, nested objects
+    and other fields are only tracked for structure. Keeps a bracket stack and
+    at most one pending escape between chunks.
+    """
+
+    VALUE = object()
+
+    def __init__(self, field: str):
+        self.field = field
+        self.parts: List[str] = []
+        self.started = False    # the field's value has begun
+        self.done = False       # ...and its closing quote has been read
+        self._stack: List[str] = []
+        self._expect_key = False
+        self._in_string = False
+        self._target = None     # VALUE, the key being read, or None to skip the current string
+        self._out: List[str] = []
+        self._key_parts: List[str] = []
+        self._last_key = None
+        self._escape = ""
+        self._high_surrogate = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def feed(self, chunk: str) -> str:
+        out = self._out = []
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._in_string:
+                i = self._read_string(chunk, i)
+                continue
+            ch = chunk[i]
+            i += 1
+            if not self._stack:
+                if ch == "{":
+                    self._stack.append(ch)
+                    self._expect_key = True
             elif ch == '"':
-                in_string = False
+                self._start_string()
+            elif ch in "{[":
+                self._stack.append(ch)
+                self._expect_key = ch == "{"
+            elif ch in "}]":
+                self._stack.pop()
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = self._stack[-1] == "{"
+            elif ch == ":":
+                self._expect_key = False
+        delta = "".join(out)
+        if delta:
+            self.parts.append(delta)
+        return delta
+
+    def _start_string(self) -> None:
+        self._in_string = True
+        self._target = None
+        if self._stack == ["{"]:
+            if self._expect_key:
+                self._key_parts = []
+                self._target = self._key_parts
+            elif self._last_key == self.field and not self.started:
+                self.started = True
+                self._target = self.VALUE
+
+    def _read_string(self, chunk: str, i: int) -> int:
+        n = len(chunk)
+        while i < n:
+            if self._escape == "\\":
+                code = chunk[i]
+                i += 1
+                if code == "u":
+                    self._escape = "\\u"
+                else:
+                    self._escape = ""
+                    self._put(JSON_ESCAPES.get(code, code))
+                continue
+            if self._escape:
+                take = min(6 - len(self._escape), n - i)
+                self._escape += chunk[i:i + take]
+                i += take
+                if len(self._escape) == 6:
+                    self._put_code_point(int(self._escape[2:], 16))
+                    self._escape = ""
+                continue
+
+            match = STRING_SPECIAL_RE.search(chunk, i)
+            end = match.start() if match else n
+            if end > i:
+                self._put(chunk[i:end])
+            if match is None:
+                return n
+            i = end + 1
+            if chunk[end] == '"':
+                self._end_string()
+                return i
+            self._escape = "\\"
+        return i
+
+    def _put(self, text: str) -> None:
+        if self._high_surrogate is not None:
+            self._high_surrogate = None
+            text = "\ufffd" + text
+        if self._target is self.VALUE:
+            self._out.append(text)
+        elif self._target is not None:
+            self._target.append(text)
+
+    def _put_code_point(self, code: int) -> None:
+        if 0xD800 <= code < 0xDC00:
+            if self._high_surrogate is not None:
+                self._put("")
+            self._high_surrogate = code
+        elif 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            self._put(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
         else:
+            self._put(chr(code) if not 0xD800 <= code < 0xE000 else "\ufffd")
+
+    def _end_string(self) -> None:
+        if self._high_surrogate is not None:
+            self._put("")
+        self._in_string = False
+        if self._target is self._key_parts:
+            self._last_key = "".join(self._key_parts)
+        elif self._target is not None:
+            self.done = True
+        self._target = None
+        self._expect_key = False
+
+
+@lru_cache(maxsize=None)
+def field_adapter(schema, name: str) -> TypeAdapter:
+    """Validator for one field of a pydantic model; building one costs far more than using it."""
+    return TypeAdapter(schema.model_fields[name].annotation)
+
+
+class StructuredFieldReader:
+    """
+    Incremental reader that yields each field of the streamed structured_data
+    object as soon as its value is complete and validates against
+    ProposalAnalysisData.
+
+    The object is read either from {"structured_data": {...}} (structured
+    output) or, when the first key of the top-level object is already one of
+    the analysis fields, from the top-level object itself (the labelled-text
+    format with the JSON block appended). Only the raw text of the value being
+    completed is buffered; everything else is tracked as bracket structure.
+    """
+
+    def __init__(self, schema=ProposalAnalysisData, container: str = STRUCTURED_MARKER):
+        self.schema = schema
+        self.container = container
+        self.fields = {}        # name -> validated value, in completion order
+        self._stack: List[str] = []
+        self._keys: List[Optional[str]] = []   # current key per open object/array
+        self._field_depth = None               # stack depth of the analysis object, once known
+        self._expect_key = False
+        self._after_colon = False
+        self._in_string = False
+        self._escaped = False
+        self._key_parts: Optional[List[str]] = None
+        self._value: Optional[List[str]] = None  # raw text of the field value being read
+        self._value_kind = None                  # '"', '{', '[' or 's' (scalar)
+
+    def feed(self, chunk: str) -> List[tuple]:
+        """Returns [(field, value), ...] for the fields completed by this chunk."""
+        completed = []
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._in_string:
+                i = self._read_string(chunk, i, completed)
+                continue
+            ch = chunk[i]
+            i += 1
+            if not self._stack:
+                if ch == "{":
+                    self._open(ch)
+                continue
+            if ch.isspace():
+                if self._value is not None:
+                    self._value.append(ch)
+                continue
+
+            if self._after_colon and self._at_field_level():
+                self._after_colon = False
+                self._value = []
+                self._value_kind = ch if ch in '"{[' else "s"
+            elif self._value is not None and self._value_kind == "s" and ch in ",}" and len(self._stack) == self._field_depth:
+                self._finish_value(completed)
+            self._after_colon = False
+
+            if self._value is not None:
+                self._value.append(ch)
             if ch == '"':
-                in_string = True
-            elif ch == "{":
-                stack.append("{")
-            elif ch == "}":
-                if not stack:
-                    raise JSONExtractionError("Unbalanced braces while parsing JSON.")
-                stack.pop()
-                if not stack:
-                    end = idx + 1  # end is exclusive here
-                    candidate = text[start:end]
-                    try:
-                        parsed = json.loads(candidate)
-                        return parsed, start, end
-                    except json.JSONDecodeError as e:
-                        # helpful debug info
-                        raise JSONExtractionError(f"JSON decode failed: {e.msg}. Candidate prefix: {candidate[:400]}...") from e
-        idx += 1
-
-    raise JSONExtractionError("Reached end of text without closing JSON object.")
-
-
-# --- Updated stream_generator (drop-in replacement) ---
-def stream_generator(
-    agent,
-    agent_input: Dict[str, Any],
-    config: Dict[str, Any],
-    state: Dict[str, Any]
-) -> Generator[str, None, None]:
+                self._in_string = True
+                if self._expect_key:
+                    self._key_parts = []
+            elif ch in "{[":
+                self._open(ch)
+            elif ch in "}]":
+                self._stack.pop()
+                self._keys.pop()
+                self._expect_key = False
+                if self._value is not None and self._value_kind in "{[" and len(self._stack) == self._field_depth:
+                    self._finish_value(completed)
+            elif ch == ",":
+                self._expect_key = self._stack[-1] == "{"
+            elif ch == ":":
+                self._expect_key = False
+                self._after_colon = True
+        return completed
+
+    def _open(self, ch: str) -> None:
+        self._stack.append(ch)
+        self._keys.append(None)
+        self._expect_key = ch == "{"
+
+    def _at_field_level(self) -> bool:
+        if self._field_depth is None or len(self._stack) != self._field_depth:
+            return False
+        return self._field_depth == 1 or (self._stack[:2] == ["{", "{"] and self._keys[0] == self.container)
+
+    def _read_string(self, chunk: str, i: int, completed: list) -> int:
+        n = len(chunk)
+        start = i
+        while i < n:
+            if self._escaped:
+                self._escaped = False
+                i += 1
+                continue
+            match = STRING_SPECIAL_RE.search(chunk, i)
+            if match is None:
+                i = n
+                break
+            i = match.end()
+            if match.group() == "\\":
+                self._escaped = True
+                continue
+            self._in_string = False
+            break
+        text = chunk[start:i]
+        if self._value is not None:
+            self._value.append(text)
+        if self._key_parts is not None:
+            self._key_parts.append(text)
+            if not self._in_string:
+                self._end_key()
+        elif not self._in_string and self._value is not None and self._value_kind == '"' and len(self._stack) == self._field_depth:
+            self._finish_value(completed)
+        return i
+
+    def _end_key(self) -> None:
+        raw, self._key_parts = "".join(self._key_parts), None
+        try:
+            key = json.loads('"' + raw)
+        except json.JSONDecodeError:
+            key = None
+        self._keys[-1] = key
+        if self._field_depth is None and len(self._stack) == 1:
+            self._field_depth = 1 if key in self.schema.model_fields else 2
+        self._expect_key = False
+
+    def _finish_value(self, completed: list) -> None:
+        raw, self._value = "".join(self._value).strip(), None
+        name = self._keys[-1]
+        field = self.schema.model_fields.get(name)
+        if field is None or name in self.fields:
+            return
+        try:
+            adapter = field_adapter(self.schema, name)
+            value = adapter.dump_python(adapter.validate_json(raw), mode="json")
+        except ValueError as e:
+            print(f"[DEBUG] structured field {name!r} did not validate: {e}")
+            return
+        self.fields[name] = value
+        completed.append((name, value))
+
+
+class AgentStreamProcessor:
     """
-    Streams SSE-like events from a multi-step agent with **smooth 1-100% progress**.
+    Turns the agent's `stream_mode="messages"` steps into SSE frames.
+
+    Holds all per-response state, so the sync and async generators below only
+    drive the agent and forward what start() / feed() / finish() / fail() return.
+
+    Emits a structured_field event for each analysis field as soon as it is complete:
+    - structured_field: {"type": "structured_field", "field": "job_summary", "value": ...}
 
     Emits an additional structured_data event when JSON is found inside the AI response:
     - structured_data: {"type": "structured_data", "data": {...}}
     - structured_data_failed: {"type": "structured_data_failed", "error": "...", "candidate": "..."}
     (candidate is truncated for safety)
     """
-    # ============================================
-    # TIMING & PROGRESS STATE
-    # ============================================
-    start_time = time.time()
-    last_progress = 0
-    last_emit_time = time.time()
-    generation_start_time = None
-
-    # Phase tracking
-    extraction_completed = False
-    projects_completed = False
-    generation_completed = False
-
-    # Content buffering
-    full_response_text = ""
-    last_content = ""
-
-    # Breakdown data (from extraction tool)
-    breakdown_data = None
-
-    # Token usage
-    prompt_tokens = 0
-    completion_tokens = 0
-
-    def emit_sse(obj: dict) -> str:
-        """Format SSE data line"""
-        return f"data: {json.dumps(obj, ensure_ascii=False)}\n\n"
-
-    def emit_progress(percent: int, message: str) -> str:
-        """Emit monotonically increasing progress (1-100)"""
-        nonlocal last_progress, last_emit_time
 
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.last_progress = 0
+
+        # Content buffering
+        self.full_response_text = ""
+        self.scanner = ProposalScanner()
+        self.reader = JsonFieldStreamReader(PROPOSAL_MARKER)
+        self.fields = StructuredFieldReader()
+        self.message_id = None
+        self.header_state = "pending"  # the leading "total_word: N" line is held back from deltas
+        self.held_delta = ""
+        self.send_text = False
+        self.all_messages = []  # Collect all messages to find final AI response
+
+        # Breakdown data (from extraction tool)
+        self.breakdown_data = None
+
+        # Token usage
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def emit_progress(self, percent: int, message: str) -> List[str]:
+        """Emit monotonically increasing progress (1-100)"""
         percent = max(1, min(100, percent))
 
         # Only emit if progress increased
-        if percent > last_progress:
-            last_progress = percent
-            last_emit_time = time.time()
-            return emit_sse({
+        if percent > self.last_progress:
+            self.last_progress = percent
+            return [emit_sse({
                 "type": "progress",
                 "percent": percent,
                 "message": message
-            })
-        return ""
-
-    def update_response_text(new_text: str) -> None:
-        """Update full response text with new content"""
-        print(f"[DEBUG] Updating response text with {len(new_text)} chars")
-        nonlocal full_response_text
-        full_response_text += new_text
-
-    def capture_breakdown(data: dict) -> None:
-        """Capture breakdown data from extraction tool"""
-        nonlocal breakdown_data
-        breakdown_data = data
-
-    def fix_json_like_string(bad_json: str):
+            })]
+        return []
+
+    def record_usage(self, msg, only_positive: bool = True) -> None:
+        usage = getattr(msg, "usage_metadata", None)
+        if not usage:
+            return
+        in_tokens = usage.get("input_tokens")
+        out_tokens = usage.get("output_tokens")
+        if in_tokens is not None and (in_tokens > 0 or not only_positive):
+            self.prompt_tokens = in_tokens
+        if out_tokens is not None and (out_tokens > 0 or not only_positive):
+            self.completion_tokens = out_tokens
+        print(f"[DEBUG] Token usage: input={in_tokens}, output={out_tokens}")
+
+    def start(self) -> List[str]:
+        return self.emit_progress(1, "Initializing...")
+
+    def feed(self, step) -> List[str]:
+        """Process one (message_chunk, metadata) step from the agent stream."""
+        frames = []
+        message = step[0]
+        content = getattr(message, "content", None)
+        if isinstance(content, str) and content:
+            scanner = self.scanner
+            scanner.feed(content)
+
+            if isinstance(message, AIMessageChunk):
+                if message.id != self.message_id:
+                    # Structured output is the text of one model message; start over on a new one.
+                    self.message_id = message.id
+                    if not self.reader.started:
+                        self.reader = JsonFieldStreamReader(PROPOSAL_MARKER)
+                    if not self.fields.fields:
+                        self.fields = StructuredFieldReader()
+                if not self.send_text:
+                    visible = self.visible_delta(self.reader.feed(content))
+                    if visible:
+                        frames.append(emit_text_delta(visible))
+                for field, value in self.fields.feed(content):
+                    frames.append(emit_sse({"type": "structured_field", "field": field, "value": value}))
+
+            if scanner.state == scanner.PROPOSAL and scanner.total_word:
+                frames += self.emit_progress(scanner.percent, "Generating your cover letter...")
+
+            reader = self.reader
+            finished = reader.done or (scanner.state == scanner.STRUCTURED and not reader.started)
+            if finished and not self.send_text:
+                frames.append(emit_sse({
+                    "type": "cover_letter_done",
+                    "content": reader.text if reader.started else scanner.proposal_text
+                }))
+                frames.append(DONE_FRAME)
+                self.send_text = True
+
+        # Validate step structure
+        if not isinstance(step, list) or not step:
+            return frames
+
+        # Store all messages
+        self.all_messages.extend(step)
+
+        for idx, msg in enumerate(step):
+            message_content = getattr(msg, 'content', None)
+            print(f"[DEBUG] Step {idx}: type={getattr(msg, 'type', None)}, name={getattr(msg, 'name', None)}, "
+                  f"content_len={len(str(message_content)) if message_content else 0}")
+
+        # TOKEN USAGE (Extract from any message)
+        self.record_usage(step[-1], only_positive=False)
+        return frames
+
+    def visible_delta(self, delta: str) -> str:
+        """Proposal text to show live: everything after the model's "total_word: N" header line."""
+        if not delta or self.header_state == "done":
+            return delta
+        if self.header_state == "skip_newlines":
+            delta = delta.lstrip("\n")
+            if delta:
+                self.header_state = "done"
+            return delta
+
+        held = self.held_delta + delta
+        match = TOTAL_WORD_HEADER_RE.match(held)
+        stripped = held.lstrip()
+        if match and match.end() < len(held):
+            self.held_delta = ""
+            self.header_state = "skip_newlines"
+            return self.visible_delta(held[match.end():])
+        if match or TOTAL_WORD_HEADER.startswith(stripped) or re.fullmatch(r"total_word:\s*", stripped):
+            self.held_delta = held  # could still be the header
+            return ""
+        self.held_delta = ""
+        self.header_state = "done"
+        return held
+
+    def needs_final_state(self) -> bool:
         """
-        Convert JS-like object (with single quotes, unquoted keys, etc.)
-        into valid JSON as much as possible.
+        Collect token usage from the streamed messages and look for the final
+        AI response in them; True when it has to come from the agent state.
         """
-        # 1) Replace single quotes around strings → double quotes
-        bad_json = re.sub(r"\'([^']*)\'", r'"\1"', bad_json)
-
-        # 2) Add quotes around keys if missing
-        bad_json = re.sub(r'(\{|,)\s*([a-zA-Z_][a-zA-Z0-9_]*)(\s*:)', r'\1 "\2"\3', bad_json)
-
-        # 3) Remove trailing commas
-        bad_json = re.sub(r',\s*([}\]])', r'\1', bad_json)
-
-        return bad_json
-
-    def get_smooth_progress(elapsed_time: float, phase_name: str) -> int:
-        """
-        Get smooth progress based on elapsed time.
-        Allocates progress ranges to different phases:
-        - 1-15%: Initialization & Analysis
-        - 15-50%: Processing & Projects
-        - 50-95%: Generation
-        - 95-100%: Finalization
-        """
-        if elapsed_time < 1:
-            # First second: init to 15%
-            return max(1, 1 + int(14 * (elapsed_time / 1)))
-        elif elapsed_time < 5:
-            # Seconds 1-5: 15% to 50%
-            progress = 15 + int(35 * ((elapsed_time - 1) / 4))
-            return min(progress, 50)
-        elif elapsed_time < 15:
-            # Seconds 5-15: 50% to 95%
-            progress = 50 + int(45 * ((elapsed_time - 5) / 10))
-            return min(progress, 95)
-        else:
-            # Beyond 15 seconds: 95% to 99%
-            return min(99, 95 + int(4 * ((elapsed_time - 15) / 10)))
-
-    try:
-        # ============================================
-        # START: Initialize at 1%
-        # ============================================
-        yield emit_progress(1, "Initializing...")
-
-        # ============================================
-        # STREAM AGENT EXECUTION
-        # ============================================
-        all_messages = []  # Collect all messages to find final AI response
-
-        response_text = ""
-        text_only = ""
-        json_data = ""
-        sent_words = 0
-        total_word = 0
-        send_text = False
-        for step in agent.stream(agent_input, config=config, stream_mode="messages",state=state):
-            last_message1 =step[0]
-            msg_type = getattr(last_message1, "type", None)
-            content = getattr(last_message1, "content", None)
-            response_text += content
-
-            if "human_proposal_text" in response_text and "structured_data" not in response_text:
-                text_only += content
-
-            match = re.search(r"total_word:\s*(\d+)", text_only)
-            if match and "structured_data" not in response_text:
-                total_word = int(match.group(1))
-                new_words = len(text_only.split())
-                sent_words += new_words
-                progress = int((sent_words / total_word) * 100)
-                if progress <= 100:
-                    print("total_word:", total_word, "sent_words:", sent_words, "progress:", progress)
-                    yield emit_sse({
-                        "type": "progress",
-                        "percent": min(progress, 100),
-                        "message": "Generating your cover letter..."
-                    })
-
-            if "structured_data" in response_text:
-                json_data += content
-                if not send_text:
-                    yield emit_sse({
-                        "type": "cover_letter_done",
-                        "content": text_only
-                    })
-                    yield emit_sse({"type": "done"})
-                    send_text = True
-
-            # Validate step structure
-            if not isinstance(step, list) or not step:
-                continue
-
-            # Store all messages
-            all_messages.extend(step)
-
-            for idx, msg in enumerate(step):
-                message_type = getattr(msg, 'type', None)
-                message_name = getattr(msg, 'name', None)
-                message_content = getattr(msg, 'content', None)
-
-                # DEBUG: Log every message
-                print(f"[DEBUG] Step {idx}: type={message_type}, name={message_name}, content_len={len(str(message_content)) if message_content else 0}")
-
-            last_message = step[-1]
-            message_type = getattr(last_message, 'type', None)
-            message_name = getattr(last_message, 'name', None)
-            message_content = getattr(last_message, 'content', None)
-            print(f"[DEBUG] Last message: type={message_type}")
-
-            # ============================================
-            # TOKEN USAGE (Extract from any message)
-            # ============================================
-            if hasattr(last_message, "usage_metadata") and last_message.usage_metadata:
-                usage = last_message.usage_metadata
-                in_tokens = usage.get("input_tokens")
-                out_tokens = usage.get("output_tokens")
-
-                if in_tokens is not None:
-                    prompt_tokens = in_tokens
-                if out_tokens is not None:
-                    completion_tokens = out_tokens
-
-                print(f"[DEBUG] Token usage found: input={in_tokens}, output={out_tokens}")
-
-        # ============================================
-        # EXTRACT FINAL RESPONSE FROM COLLECTED MESSAGES
-        # Extract token usage from all collected messages
-        for msg in all_messages:
-            if hasattr(msg, "usage_metadata") and msg.usage_metadata:
-                usage = msg.usage_metadata
-                in_tokens = usage.get("input_tokens")
-                out_tokens = usage.get("output_tokens")
-
-                if in_tokens is not None and in_tokens > 0:
-                    prompt_tokens = in_tokens
-                if out_tokens is not None and out_tokens > 0:
-                    completion_tokens = out_tokens
-
-                print(f"[DEBUG] Token usage from message: input={in_tokens}, output={out_tokens}")
+        for msg in self.all_messages:
+            self.record_usage(msg)
 
         # If no response was captured, search backwards through all messages for AI response
-        if not full_response_text:
-            print("[DEBUG] No response captured from stream, searching all messages...")
-            for msg in reversed(all_messages):
-                msg_type = getattr(msg, 'type', None)
+        if not self.full_response_text:
+            for msg in reversed(self.all_messages):
                 msg_content = getattr(msg, 'content', None)
-
-                print(f"[DEBUG] Checking message type: {msg_type}, has_content: {bool(msg_content)}")
-
-                if msg_type == "ai" and isinstance(msg_content, str) and msg_content:
-                    full_response_text = msg_content
-                    print(f"[DEBUG] Found AI response in collected messages: {len(full_response_text)} chars")
+                if getattr(msg, 'type', None) == "ai" and isinstance(msg_content, str) and msg_content:
+                    self.full_response_text = msg_content
+                    print(f"[DEBUG] Found AI response in collected messages: {len(self.full_response_text)} chars")
+                    break
+        return not self.full_response_text
+
+    def use_final_state(self, final_state) -> None:
+        """Take the final AI response (and its token usage) from agent.get_state()."""
+        print(f"[DEBUG] Final state type: {type(final_state)}")
+        if hasattr(final_state, 'values') and isinstance(final_state.values, dict):
+            for msg in reversed(final_state.values.get('messages', [])):
+                self.record_usage(msg)
+                if getattr(msg, 'type', None) == 'ai' and hasattr(msg, 'content'):
+                    self.full_response_text = msg.content
+                    print(f"[DEBUG] Found AI response in state: {len(self.full_response_text)} chars")
                     break
 
-        # ============================================
-        # COMPLETION SEQUENCE
-        # ============================================
-        generation_completed = True
-
-        # If still no response, try to get it from agent state
-        if not full_response_text:
-            print("[DEBUG] No response in messages, checking agent state...")
-            try:
-                final_state = agent.get_state(config)
-                print(f"[DEBUG] Final state type: {type(final_state)}")
-
-                if hasattr(final_state, 'values') and isinstance(final_state.values, dict):
-                    if 'messages' in final_state.values:
-                        messages = final_state.values['messages']
-                        for msg in reversed(messages):
-                            # Extract token usage from final state messages
-                            if hasattr(msg, "usage_metadata") and msg.usage_metadata:
-                                usage = msg.usage_metadata
-                                in_tokens = usage.get("input_tokens")
-                                out_tokens = usage.get("output_tokens")
-
-                                if in_tokens is not None and in_tokens > 0:
-                                    prompt_tokens = in_tokens
-                                if out_tokens is not None and out_tokens > 0:
-                                    completion_tokens = out_tokens
-
-                                print(f"[DEBUG] Token usage from state: input={in_tokens}, output={out_tokens}")
-
-                            # Extract response
-                            if hasattr(msg, 'type') and msg.type == 'ai' and hasattr(msg, 'content'):
-                                full_response_text = msg.content
-                                print(f"[DEBUG] Found AI response in state: {len(full_response_text)} chars")
-                                break
-            except Exception as e:
-                print(f"[DEBUG] Error extracting from state: {e}")
-
-        # ============================================
-        # PARSE RESPONSE INTO COVER LETTER & STRUCTURED DATA
-        # ============================================
+    def finish(self) -> List[str]:
+        """Parse the response into cover letter & structured data and emit the closing events."""
+        frames = []
+        full_response_text = self.full_response_text
         cover_letter_only = ""
         if full_response_text:
             # 1) First try: treat the entire response as JSON (structured output case)
@@ -347,10 +690,10 @@ def stream_generator(
 
                 # Emit structured JSON as its own event
                 print("[DEBUG] Emitting structured_data event from top-level JSON")
-                yield emit_sse({
+                frames.append(emit_sse({
                     "type": "structured_data",
                     "data": structured
-                })
+                }))
 
                 # Fallback if somehow proposal is empty
                 if not cover_letter_only.strip():
@@ -360,15 +703,14 @@ def stream_generator(
             else:
                 # 2) Fallback: old behavior — cover letter + JSON embedded in text
                 try:
-                    candidate_fixed = fix_json_like_string(full_response_text)
-                    parsed_json, json_start, json_end = extract_json_and_span(candidate_fixed)
+                    parsed_json, json_start, json_end = extract_json_and_span(full_response_text)
 
                     # Emit structured JSON as its own event
                     print("[DEBUG] Emitting structured_data event with parsed JSON from embedded block")
-                    yield emit_sse({
+                    frames.append(emit_sse({
                         "type": "structured_data",
                         "data": parsed_json
-                    })
+                    }))
 
                     # Remove JSON block from the end of the response to get clean cover letter
                     cover_letter_only = full_response_text[:json_start]
@@ -388,81 +730,181 @@ def stream_generator(
                     # Parsing failed: emit a structured_data_failed event and send full response as cover letter
                     print(f"[DEBUG] structured JSON extraction failed: {jde}")
                     candidate = ""
-                    try:
-                        first_brace = full_response_text.find("{")
-                        if first_brace != -1:
-                            candidate = full_response_text[first_brace:first_brace + 4000]
-                    except Exception:
-                        candidate = ""
-
-                    yield emit_sse({
+                    first_brace = full_response_text.find("{")
+                    if first_brace != -1:
+                        candidate = full_response_text[first_brace:first_brace + 4000]
+
+                    frames.append(emit_sse({
                         "type": "structured_data_failed",
                         "error": str(jde),
                         "candidate": candidate[:2000]
-                    })
+                    }))
 
                     cover_letter_only = full_response_text
 
                 except Exception as e:
                     # Unexpected error during extraction
                     print(f"[DEBUG] Unexpected error extracting structured JSON: {e}")
-                    yield emit_sse({
+                    frames.append(emit_sse({
                         "type": "structured_data_failed",
                         "error": "unexpected error: " + str(e),
                         "candidate": ""
-                    })
+                    }))
                     cover_letter_only = full_response_text
         else:
             print("[DEBUG] No full_response_text to parse for structured JSON")
-            cover_letter_only = full_response_text
 
-
-        # Emit final cover letter using cover_letter_only (this will not include the JSON block)
-        if cover_letter_only:
-            print(f"[DEBUG] Emitting cover_letter_done (cleaned) with {len(cover_letter_only)} chars")
-            # yield emit_sse({
-            #     "type": "cover_letter_done",
-            #     "content": cover_letter_only
-            # })
-        else:
+        if not cover_letter_only:
             print("[DEBUG] WARNING: No cover letter text to send!")
 
-        # Emit breakdown (analysis_done) event FIRST if we have it
-        if breakdown_data:
-            print(f"[DEBUG] Emitting analysis_done with breakdown: {list(breakdown_data.keys()) if isinstance(breakdown_data, dict) else breakdown_data}")
-            yield emit_sse({
+        # Emit breakdown (analysis_done) event if we have it
+        if self.breakdown_data:
+            frames.append(emit_sse({
                 "type": "analysis_done",
-                "analysis": breakdown_data
-            })
-        else:
-            print("[DEBUG] WARNING: No breakdown data to send!")
+                "analysis": self.breakdown_data
+            }))
 
         # Emit token usage
-        total_tokens = prompt_tokens + completion_tokens
-        print(f"[DEBUG] Final token counts - input: {prompt_tokens}, output: {completion_tokens}, total: {total_tokens}")
+        total_tokens = self.prompt_tokens + self.completion_tokens
+        print(f"[DEBUG] Final token counts - input: {self.prompt_tokens}, output: {self.completion_tokens}, total: {total_tokens}")
 
-        yield emit_sse({
+        frames.append(emit_sse({
             "type": "usage",
-            "input_tokens": prompt_tokens,
-            "output_tokens": completion_tokens,
+            "input_tokens": self.prompt_tokens,
+            "output_tokens": self.completion_tokens,
             "total_tokens": total_tokens
-        })
-        
-    except Exception as e:
-        # ============================================
-        # ERROR HANDLING
-        # ============================================
+        }))
+        return frames
+
+    def fail(self, e: Exception) -> List[str]:
         error_detail = traceback.format_exc()
         print(f"Stream error: {error_detail}")
 
-        yield emit_sse({
+        frames = [emit_sse({
             "type": "error",
             "message": str(e),
-            "detail": error_detail if config.get("debug") else None
-        })
-
+            "detail": error_detail if self.config.get("debug") else None
+        })]
         # Still try to reach 100%
+        return frames + self.emit_progress(self.last_progress + 5, f"Error: {str(e)}")
+
+
+STEPS_DONE = object()
+
+
+def pump_steps(steps: Iterator, stop: threading.Event) -> "queue.Queue":
+    """
+    Iterate `steps` on a worker thread and hand each item over a queue, so
+    the caller can wait with a timeout. Ends with STEPS_DONE, or with the
+    exception the iterator raised. Setting `stop` closes the iterator after
+    its next item (the client went away).
+    """
+    steps_queue: "queue.Queue" = queue.Queue()
+    context = contextvars.copy_context()
+
+    def run():
         try:
-            yield emit_progress(last_progress + 5, f"Error: {str(e)}")
-        except:
-            pass
\ No newline at end of file
+            for step in steps:
+                if stop.is_set():
+                    steps.close()
+                    return
+                steps_queue.put(step)
+            steps_queue.put(STEPS_DONE)
+        except BaseException as e:
+            steps_queue.put(e)
+        finally:
+            connection.close()
+
+    threading.Thread(target=context.run, args=(run,), name="agent-stream", daemon=True).start()
+    return steps_queue
+
+
+def stream_generator(
+    agent,
+    agent_input: Dict[str, Any],
+    config: Dict[str, Any],
+    writer: Optional[SSEWriter] = None,
+) -> Generator[bytes, None, None]:
+    """
+    Streams SSE events from a multi-step agent (sync: pins a worker thread for the whole stream).
+    The agent runs on a second thread, so heartbeats go out during long model or tool waits too.
+    """
+    processor = AgentStreamProcessor(config)
+    writer = writer or SSEWriter()
+    stop = threading.Event()
+    try:
+        yield writer.write(processor.start())
+        steps = pump_steps(agent.stream(agent_input, config=config, stream_mode="messages"), stop)
+        while True:
+            try:
+                step = steps.get(timeout=writer.heartbeat_in())
+            except queue.Empty:
+                data = writer.write([])
+            else:
+                if step is STEPS_DONE:
+                    break
+                if isinstance(step, BaseException):
+                    raise step
+                data = writer.write(processor.feed(step))
+            if data:
+                yield data
+
+        if processor.needs_final_state():
+            try:
+                processor.use_final_state(agent.get_state(config))
+            except Exception as e:
+                print(f"[DEBUG] Error extracting from state: {e}")
+        yield writer.write(processor.finish())
+    except Exception as e:
+        yield writer.write(processor.fail(e))
+    finally:
+        stop.set()
+    data = writer.close()
+    if data:
+        yield data
+
+
+async def astream_generator(
+    agent,
+    agent_input: Dict[str, Any],
+    config: Dict[str, Any],
+    writer: Optional[SSEWriter] = None,
+) -> AsyncGenerator[bytes, None]:
+    """stream_generator() over agent.astream(), for the async view: no thread is held while waiting on the LLM."""
+    processor = AgentStreamProcessor(config)
+    writer = writer or SSEWriter()
+    next_step = None
+    try:
+        yield writer.write(processor.start())
+        steps = agent.astream(agent_input, config=config, stream_mode="messages").__aiter__()
+        while True:
+            # Wait for the next step without cancelling it, so a heartbeat can go out meanwhile.
+            next_step = next_step or asyncio.ensure_future(steps.__anext__())
+            done, _ = await asyncio.wait({next_step}, timeout=writer.heartbeat_in())
+            if not done:
+                data = writer.write([])
+            else:
+                try:
+                    step = next_step.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_step = None
+                data = writer.write(processor.feed(step))
+            if data:
+                yield data
+
+        if processor.needs_final_state():
+            try:
+                processor.use_final_state(await agent.aget_state(config))
+            except Exception as e:
+                print(f"[DEBUG] Error extracting from state: {e}")
+        yield writer.write(processor.finish())
+    except Exception as e:
+        yield writer.write(processor.fail(e))
+    finally:
+        if next_step is not None:
+            next_step.cancel()  # the client went away mid-stream
+    data = writer.close()
+    if data:
+        yield data
@@ -51,7 +51,7 @@ Step 1 — Deep Client Analysis
 
 Step 2 — Mandatory RAG Tool Call
 - Call `find_relevant_past_projects` using the exact keywords from Step 1.
-- From the tool results, choose the project URLs with the highest priority.
+- The tool results are already ranked by relevance and priority (best first); use them in that order.
 - These URLs will be used in both:
   - the human proposal text
   - the structured_data.reference_websites field.
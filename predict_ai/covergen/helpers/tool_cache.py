@@ -0,0 +1,85 @@
+"""
+Per-conversation memo of retrieval tool results.
+
+Within one proposal generation the agent often calls the search tool again
+with the same or a reworded query ("shopify custom app" / "Custom Shopify
+app"). Results are memoized per thread_id under a key that ignores case,
+punctuation and word order, so those repeats skip both the embeddings
+request and the FAISS search.
+
+The view clears a thread's entries at the start of every request, so a memo
+never outlives the generation it was made in. Threads are kept in LRU order
+and dropped after `ttl` seconds or when more than `max_threads` are active.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+DEFAULT_MAX_THREADS = 512
+DEFAULT_TTL = 900
+
+
+def query_key(query: str, categories=None, catalog: Optional[str] = None) -> str:
+    """Order-, case- and punctuation-insensitive key for a tool call."""
+    words = sorted(set(re.findall(r"\w+", (query or "").lower())))
+    if isinstance(categories, str):
+        categories = categories.split(",")
+    selected = sorted({" ".join(c.lower().split()) for c in categories or [] if c and c.strip()})
+    return f"{catalog or ''}|" + " ".join(words) + "|" + ",".join(selected)
+
+
+class ToolResultCache:
+    """thread_id -> {query_key: result}."""
+
+    def __init__(self, max_threads: int = DEFAULT_MAX_THREADS, ttl: float = DEFAULT_TTL):
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._threads: "OrderedDict[str, tuple]" = OrderedDict()  # thread_id -> (created, {key: result})
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0}
+
+    def _entries(self, thread_id: str, create: bool = False) -> Optional[dict]:
+        now = time.monotonic()
+        slot = self._threads.get(thread_id)
+        if slot is not None and now - slot[0] > self.ttl:
+            del self._threads[thread_id]
+            slot = None
+        if slot is None:
+            if not create:
+                return None
+            slot = (now, {})
+            self._threads[thread_id] = slot
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return slot[1]
+
+    def get(self, thread_id: Optional[str], key: str) -> Optional[str]:
+        if not thread_id:
+            return None
+        with self._lock:
+            entries = self._entries(thread_id)
+            result = entries.get(key) if entries is not None else None
+            self.counters["hits" if result is not None else "misses"] += 1
+        return result
+
+    def put(self, thread_id: Optional[str], key: str, result: str) -> None:
+        if not thread_id:
+            return
+        with self._lock:
+            self._entries(thread_id, create=True)[key] = result
+
+    def __contains__(self, item) -> bool:
+        thread_id, key = item
+        with self._lock:
+            entries = self._entries(thread_id) if thread_id else None
+            return entries is not None and key in entries
+
+    def clear(self, thread_id: Optional[str] = None) -> None:
+        with self._lock:
+            if thread_id is None:
+                self._threads.clear()
+            else:
+                self._threads.pop(thread_id, None)
@@ -0,0 +1,110 @@
+"""
+Packed binary encoding for embedding vectors.
+
+Each vector is stored as a small fixed header followed by the raw
+little-endian values:
+
+    magic (2 bytes, b"PV") | format version (uint8) | dtype code (uint8) | dim (uint32) | values...
+
+The header is exactly 8 bytes, so a float32 payload stays 4-byte aligned and
+can be viewed by NumPy without copying.
+"""
+import struct
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+
+MAGIC = b"PV"
+FORMAT_VERSION = 1
+
+# dtype code -> numpy dtype (always little-endian on disk)
+DTYPES = {
+    1: np.dtype("<f4"),
+}
+DTYPE_CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+_HEADER = struct.Struct("<2sBBI")
+HEADER_SIZE = _HEADER.size  # 8 bytes
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class VectorCodecError(ValueError):
+    pass
+
+
+def pack_vector(values: Union[Sequence[float], np.ndarray], dtype: str = "<f4") -> bytes:
+    """Encode a 1-D vector (list of floats or ndarray) into header + raw bytes."""
+    dtype = np.dtype(dtype)
+    code = DTYPE_CODES.get(dtype)
+    if code is None:
+        raise VectorCodecError(f"Unsupported vector dtype: {dtype}")
+
+    arr = np.asarray(values, dtype=dtype)
+    if arr.ndim != 1:
+        raise VectorCodecError(f"Expected a 1-D vector, got shape {arr.shape}")
+
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, code, arr.shape[0]) + arr.tobytes()
+
+
+def read_header(blob: Buffer):
+    """Return (dtype, dim) from a packed vector, validating magic and size."""
+    if len(blob) < HEADER_SIZE:
+        raise VectorCodecError("Vector payload is shorter than its header")
+
+    magic, version, code, dim = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise VectorCodecError("Vector payload has a bad magic prefix")
+    if version != FORMAT_VERSION:
+        raise VectorCodecError(f"Unsupported vector format version: {version}")
+
+    dtype = DTYPES.get(code)
+    if dtype is None:
+        raise VectorCodecError(f"Unknown vector dtype code: {code}")
+
+    if len(blob) != HEADER_SIZE + dim * dtype.itemsize:
+        raise VectorCodecError(
+            f"Vector payload size {len(blob)} does not match header dim={dim}"
+        )
+    return dtype, dim
+
+
+def unpack_vector(blob: Buffer) -> np.ndarray:
+    """Decode a packed vector into a read-only ndarray view of the payload."""
+    dtype, dim = read_header(blob)
+    return np.frombuffer(blob, dtype=dtype, count=dim, offset=HEADER_SIZE)
+
+
+def stack_vectors(blobs: Iterable[Buffer], count: int) -> np.ndarray:
+    """
+    Copy `count` packed vectors into one contiguous (count, dim) float32 matrix.
+
+    The matrix is allocated once from the first header and every payload is
+    copied straight into its row, so no per-float Python objects are created
+    and `blobs` can be a lazy DB iterator.
+    """
+    matrix = None
+    dim = 0
+    n = 0
+
+    for blob in blobs:
+        dtype, row_dim = read_header(blob)
+        if matrix is None:
+            dim = row_dim
+            matrix = np.empty((count, dim), dtype=np.float32)
+        elif row_dim != dim:
+            raise VectorCodecError(f"Mixed vector dimensions: {dim} and {row_dim}")
+
+        if n >= count:
+            raise VectorCodecError(f"Got more than the expected {count} vectors")
+
+        matrix[n] = np.frombuffer(blob, dtype=dtype, count=dim, offset=HEADER_SIZE)
+        n += 1
+
+    if matrix is None:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if n != count:
+        # Rows disappeared between COUNT(*) and the fetch; drop the tail.
+        matrix = matrix[:n]
+    return matrix
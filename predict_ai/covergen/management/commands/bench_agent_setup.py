@@ -0,0 +1,54 @@
+import os
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ... import views
+
+
+class Command(BaseCommand):
+    help = (
+        "Per-request agent setup cost: building the chat client and compiling the "
+        "agent graph on every request (old path) vs. reusing the process-level "
+        "compiled agent. Reports p50/p99 latency and peak heap growth per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+
+    def measure(self, setup, requests: int):
+        latencies = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            setup()
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        # Peak heap growth while setting up one request.
+        peaks = []
+        tracemalloc.start()
+        for _ in range(min(requests, 20)):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            setup()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        tracemalloc.stop()
+        return latencies, float(np.mean(peaks))
+
+    def handle(self, *args, **options):
+        # ChatOpenAI wants a key at construction; nothing is sent.
+        os.environ.setdefault("OPENAI_API_KEY", "sk-bench-not-used")
+        views.clear_agents()
+        paths = {
+            "per-request": lambda: views.build_agent(views.make_chat_model()),
+            "shared": views.get_agent,
+        }
+        self.stdout.write(f"{'path':>12} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9}")
+        for name, setup in paths.items():
+            latencies, peak = self.measure(setup, options["requests"])
+            self.stdout.write(
+                f"{name:>12} {np.percentile(latencies, 50):>9.3f} {np.percentile(latencies, 99):>9.3f} "
+                f"{peak / 1024:>9.1f}"
+            )
+        views.clear_agents()
@@ -0,0 +1,158 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ...rag_vectors import load_vector_matrix
+from ...vector_index import BACKEND_TYPES, DEFAULT_BACKEND, apply_search_params, build_index, index_nbytes
+
+
+def bench_backend(backend_type: str, **params) -> dict:
+    """
+    A complete backend config: every key is set, so nothing from
+    settings.PROJECT_INDEX_BACKEND (e.g. truncate_dim / quantize) leaks into
+    the ground truth or the comparison.
+    """
+    return {**DEFAULT_BACKEND, "type": backend_type, **params}
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Unit vectors drawn around a few hundred topic centres, roughly like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(8, n // 200), dim), dtype=np.float32)
+    points = centres[rng.integers(0, len(centres), n)]
+    points += 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points
+
+
+def make_queries(base: np.ndarray, count: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of stored vectors, so every query has real neighbours."""
+    rng = np.random.default_rng(seed)
+    queries = base[rng.integers(0, len(base), count)].copy()
+    queries += 0.3 * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(base.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def recall_at(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    hits = sum(len(set(f[:k]) & set(t[:k])) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare flat / HNSW / IVF project indexes: recall@3/@10 against exact "
+        "search, build time, p50/p99 single-query latency and index size. "
+        "--compact adds truncated / int8 first passes with exact rescoring."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 100_000],
+                            help="Synthetic catalog sizes to test.")
+        parser.add_argument("--dim", type=int, default=1536)
+        parser.add_argument("--real", action="store_true",
+                            help="Also benchmark the vectors stored in ProjectVector.")
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--backends", nargs="+", default=list(BACKEND_TYPES), choices=BACKEND_TYPES)
+        parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 256])
+        parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 32])
+        parser.add_argument("--compact", nargs="*", default=None, metavar="VARIANT",
+                            help="Also compare compact first-pass variants with exact rescoring, "
+                                 "e.g. int8 512 256+int8 (default set when given without values).")
+        parser.add_argument("--rescore", type=int, default=4)
+
+    def compact_report(self, name: str, base: np.ndarray, queries: np.ndarray, truth: np.ndarray,
+                       options, header: bool = True) -> None:
+        """Resident index size and recall@3 of truncated / int8 first passes vs the full float32 flat index."""
+        variants = options["compact"] or ["int8", "512", "256", "512+int8", "256+int8"]
+        full_mb = base.nbytes / 1024 / 1024
+        if header:
+            self.stdout.write(
+                f"{'dataset':>18} {'variant':>10} {'index MB':>9} {'saved':>7} {'on disk MB':>11} "
+                f"{'R@3':>6} {'R@3 lost':>9} {'p50 ms':>8}"
+            )
+        self.stdout.write(
+            f"{name:>18} {'float32':>10} {full_mb:>9.1f} {'-':>7} {'-':>11} {1.0:>6.3f} {0.0:>9.3f} {'-':>8}"
+        )
+        for variant in variants:
+            backend = bench_backend("flat", rescore=options["rescore"])
+            for part in variant.split("+"):
+                if part == "int8":
+                    backend["quantize"] = "int8"
+                else:
+                    backend["truncate_dim"] = int(part)
+            if backend["truncate_dim"] and backend["truncate_dim"] >= base.shape[1]:
+                continue
+
+            index = build_index(base, backend)
+            _, found = index.search(queries, 10)
+            latencies = []
+            for q in queries[:100]:
+                t0 = time.perf_counter()
+                index.search(q[None, :], 10)
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+            index_mb = index_nbytes(index.compact) / 1024 / 1024
+            recall = recall_at(found, truth, 3)
+            self.stdout.write(
+                f"{name:>18} {variant:>10} {index_mb:>9.1f} {1 - index_mb / full_mb:>7.0%} {full_mb:>11.1f} "
+                f"{recall:>6.3f} {1.0 - recall:>9.3f} {np.percentile(latencies, 50):>8.3f}"
+            )
+
+    def handle(self, *args, **options):
+        datasets = [(f"synthetic-{n}", lambda n=n: synthetic_vectors(n, options["dim"])) for n in options["rows"]]
+        if options["real"]:
+            datasets.append(("catalog", lambda: load_vector_matrix()[0]))
+
+        self.stdout.write(
+            f"{'dataset':>18} {'backend':>8} {'param':>14} {'build s':>8} "
+            f"{'R@3':>6} {'R@10':>6} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8}"
+        )
+        compact_runs = []
+        for name, load in datasets:
+            base = load()
+            if len(base) < 10:
+                self.stdout.write(self.style.WARNING(f"{name}: only {len(base)} vectors, skipping"))
+                continue
+            queries = make_queries(base, options["queries"])
+            _, truth = build_index(base, bench_backend("flat")).search(queries, 10)
+            if options["compact"] is not None:
+                compact_runs.append((name, base, queries, truth))
+
+            for backend_type in options["backends"]:
+                backend = bench_backend(backend_type)
+                started = time.perf_counter()
+                index = build_index(base, backend)
+                build_s = time.perf_counter() - started
+                size_mb = index_nbytes(index) / 1024 / 1024
+
+                if backend_type == "hnsw":
+                    sweep = [("ef_search", v) for v in options["ef_search"]]
+                elif backend_type == "ivf":
+                    sweep = [("nprobe", v) for v in options["nprobe"]]
+                else:
+                    sweep = [("exact", None)]
+
+                for param, value in sweep:
+                    if value is not None:
+                        apply_search_params(index, {**backend, param: value})
+                    _, found = index.search(queries, 10)
+
+                    latencies = []
+                    for q in queries:
+                        t0 = time.perf_counter()
+                        index.search(q[None, :], 10)
+                        latencies.append((time.perf_counter() - t0) * 1000)
+
+                    label = param if value is None else f"{param}={value}"
+                    self.stdout.write(
+                        f"{name:>18} {backend_type:>8} {label:>14} {build_s:>8.2f} "
+                        f"{recall_at(found, truth, 3):>6.3f} {recall_at(found, truth, 10):>6.3f} "
+                        f"{np.percentile(latencies, 50):>8.3f} {np.percentile(latencies, 99):>8.3f} "
+                        f"{size_mb:>8.1f}"
+                    )
+
+        for i, (name, base, queries, truth) in enumerate(compact_runs):
+            self.stdout.write("")
+            self.compact_report(name, base, queries, truth, options, header=i == 0)
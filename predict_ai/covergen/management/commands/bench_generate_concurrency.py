@@ -0,0 +1,201 @@
+import asyncio
+import contextlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, List
+from unittest import mock
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, RequestFactory
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from ... import views
+
+STUB_REPLY = json.dumps({
+    "human_proposal_text": "total_word: 66\n\n" + "Hi, I have built and migrated Shopify stores for eight years. " * 6,
+    "structured_data": {"job_summary": "Shopify migration", "required_skills": ["Shopify", "Liquid"]},
+})
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Chat model with the latency shape of a hosted LLM: a wait before the first
+    token, then one word every `token_ms`. Sleeps with asyncio under astream,
+    so it costs the event loop nothing while "waiting on the API".
+    """
+
+    reply: str = STUB_REPLY
+    first_token_ms: float = 400.0
+    token_ms: float = 15.0
+    calls: int = 0
+    prompts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _words(self) -> List[str]:
+        words = self.reply.split(" ")
+        return [w + " " for w in words[:-1]] + words[-1:]
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        self.calls += 1
+        self.prompts.append(messages)
+        time.sleep((self.first_token_ms + self.token_ms * len(self._words())) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.reply))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        self.prompts.append(messages)
+        time.sleep(self.first_token_ms / 1000)
+        for word in self._words():
+            time.sleep(self.token_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        self.prompts.append(messages)
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for word in self._words():
+            await asyncio.sleep(self.token_ms / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word))
+            if run_manager:
+                await run_manager.on_llm_new_token(word, chunk=chunk)
+            yield chunk
+
+
+class StreamStats:
+    """Time to first frame, first cover letter text and total per stream, plus the peak number of open streams."""
+
+    def __init__(self):
+        self.ttfb: List[float] = []
+        self.first_text: List[float] = []
+        self.total: List[float] = []
+        self.frames = 0
+        self.open = 0
+        self.peak_open = 0
+        self._lock = threading.Lock()
+
+    def opened(self, started: float) -> None:
+        with self._lock:
+            self.ttfb.append((time.perf_counter() - started) * 1000)
+            self.open += 1
+            self.peak_open = max(self.peak_open, self.open)
+
+    def frame(self, started: float, frame: bytes, seen_text: bool) -> bool:
+        """Record the first cover_letter_delta of a stream; returns whether text has been seen."""
+        if not seen_text and b'"cover_letter_delta"' in frame:
+            with self._lock:
+                self.first_text.append((time.perf_counter() - started) * 1000)
+            return True
+        return seen_text
+
+    def closed(self, started: float, frames: int) -> None:
+        with self._lock:
+            self.total.append((time.perf_counter() - started) * 1000)
+            self.frames += frames
+            self.open -= 1
+
+
+def _payload() -> str:
+    return json.dumps({"session_id": uuid.uuid4().hex, "client_text": "Need a Shopify migration expert."})
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the sync and async generate views against a stub LLM: N concurrent "
+        "SSE streams through a fixed pool of worker threads (sync) or one event loop "
+        "(async). Reports wall time, peak concurrently open streams, time to first frame, "
+        "time to the first streamed cover letter text and total stream time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--streams", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument("--workers", type=int, default=8,
+                            help="Worker threads available to the sync view (WSGI threads).")
+        parser.add_argument("--first-token-ms", type=float, default=400.0)
+        parser.add_argument("--token-ms", type=float, default=15.0)
+        parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+
+    def run_sync(self, streams: int, workers: int) -> StreamStats:
+        stats = StreamStats()
+        factory = RequestFactory()
+
+        def one(started: float) -> None:
+            request = factory.post("/api/genrate-cover-letter", _payload(), content_type="application/json")
+            response = views.generate_cover_letter(request)
+            frames, seen_text = 0, False
+            for frame in response.streaming_content:
+                if frames == 0:
+                    stats.opened(started)
+                seen_text = stats.frame(started, frame, seen_text)
+                frames += 1
+            stats.closed(started, frames)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            started = time.perf_counter()
+            for future in [pool.submit(one, started) for _ in range(streams)]:
+                future.result()
+        return stats
+
+    def run_async(self, streams: int) -> StreamStats:
+        stats = StreamStats()
+        factory = AsyncRequestFactory()
+
+        async def one(started: float) -> None:
+            request = factory.post("/api/genrate-cover-letter", _payload(), content_type="application/json")
+            response = await views.agenerate_cover_letter(request)
+            frames, seen_text = 0, False
+            async for frame in response.streaming_content:
+                if frames == 0:
+                    stats.opened(started)
+                seen_text = stats.frame(started, frame, seen_text)
+                frames += 1
+            stats.closed(started, frames)
+
+        async def main() -> None:
+            started = time.perf_counter()
+            await asyncio.gather(*(one(started) for _ in range(streams)))
+
+        asyncio.run(main())
+        return stats
+
+    def handle(self, *args, **options):
+        model = StubChatModel(first_token_ms=options["first_token_ms"], token_ms=options["token_ms"])
+        modes = ["sync", "async"] if options["mode"] == "both" else [options["mode"]]
+        self.stdout.write(
+            f"{'mode':>6} {'streams':>8} {'wall s':>8} {'peak open':>10} {'frames':>8} "
+            f"{'ttfb p50':>9} {'ttfb p99':>9} {'text p50':>9} {'total p50':>10} {'total p99':>10}"
+        )
+        views.clear_agents()
+        with mock.patch.object(views, "make_chat_model", return_value=model):
+            for streams in options["streams"]:
+                for mode in modes:
+                    started = time.perf_counter()
+                    # The views' debug prints would drown the table.
+                    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                        if mode == "sync":
+                            stats = self.run_sync(streams, options["workers"])
+                        else:
+                            stats = self.run_async(streams)
+                    seconds = time.perf_counter() - started
+                    self.stdout.write(
+                        f"{mode:>6} {streams:>8} {seconds:>8.2f} {stats.peak_open:>10} {stats.frames:>8} "
+                        f"{np.percentile(stats.ttfb, 50):>9.0f} {np.percentile(stats.ttfb, 99):>9.0f} "
+                        f"{np.percentile(stats.first_text or [0], 50):>9.0f} "
+                        f"{np.percentile(stats.total, 50):>10.0f} {np.percentile(stats.total, 99):>10.0f}"
+                    )
+        views.clear_agents()
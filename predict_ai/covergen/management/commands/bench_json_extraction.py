@@ -0,0 +1,106 @@
+import json
+import re
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from ...helpers.stream_helper import JSONExtractionError, extract_json_and_span
+
+CORPUS_DIR = Path(__file__).resolve().parents[2] / "testdata" / "model_outputs"
+
+
+# --- The previous implementation, kept as the baseline ---
+def legacy_extract_json_and_span(text: str):
+    if not text or "{" not in text:
+        raise JSONExtractionError("No JSON object start found in text.")
+
+    start = text.find("{")
+    stack = []
+    idx = start
+    in_string = False
+    escape = False
+
+    while idx < len(text):
+        ch = text[idx]
+
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        else:
+            if ch == '"':
+                in_string = True
+            elif ch == "{":
+                stack.append("{")
+            elif ch == "}":
+                if not stack:
+                    raise JSONExtractionError("Unbalanced braces while parsing JSON.")
+                stack.pop()
+                if not stack:
+                    end = idx + 1
+                    candidate = text[start:end]
+                    try:
+                        return json.loads(candidate), start, end
+                    except json.JSONDecodeError as e:
+                        raise JSONExtractionError(f"JSON decode failed: {e.msg}") from e
+        idx += 1
+
+    raise JSONExtractionError("Reached end of text without closing JSON object.")
+
+
+def legacy_fix_json_like_string(bad_json: str):
+    bad_json = re.sub(r"\'([^']*)\'", r'"\1"', bad_json)
+    bad_json = re.sub(r'(\{|,)\s*([a-zA-Z_][a-zA-Z0-9_]*)(\s*:)', r'\1 "\2"\3', bad_json)
+    bad_json = re.sub(r',\s*([}\]])', r'\1', bad_json)
+    return bad_json
+
+
+def legacy_path(text: str):
+    """What AgentStreamProcessor.finish() used to do: repair the whole text, then scan it."""
+    return legacy_extract_json_and_span(legacy_fix_json_like_string(text))
+
+
+class Command(BaseCommand):
+    help = (
+        "JSON extraction from recorded model outputs (testdata/model_outputs): the old "
+        "per-character scan over the fully repaired text vs. raw_decode with span-only "
+        "repair. Reports throughput per output and whether the expected object came back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=2000)
+        parser.add_argument("--scale", type=int, default=1,
+                            help="Repeat each output's text before its JSON block this many times.")
+
+    def run(self, extract, text: str, repeat: int):
+        try:
+            result = extract(text)[0]
+        except JSONExtractionError:
+            result = None
+        started = time.perf_counter()
+        for _ in range(repeat):
+            try:
+                extract(text)
+            except JSONExtractionError:
+                pass
+        seconds = time.perf_counter() - started
+        return result, len(text.encode()) * repeat / seconds / 1e6
+
+    def handle(self, *args, **options):
+        paths = {"old": legacy_path, "new": extract_json_and_span}
+        self.stdout.write(f"{'output':>15} {'KiB':>6} " + " ".join(f"{name + ' MB/s':>10} {name + ' ok':>7}" for name in paths))
+        for file in sorted(CORPUS_DIR.glob("*.json")):
+            recording = json.loads(file.read_text())
+            text, expected = recording["text"], recording["expected"]
+            if options["scale"] > 1:
+                brace = text.find("{") if text.find("{") != -1 else len(text)
+                text = text[:brace] * options["scale"] + text[brace:]
+            row = f"{file.stem:>15} {len(text) / 1024:>6.1f} "
+            for extract in paths.values():
+                result, throughput = self.run(extract, text, options["repeat"])
+                row += f"{throughput:>10.1f} {str(result == expected):>7} "
+            self.stdout.write(row.rstrip())
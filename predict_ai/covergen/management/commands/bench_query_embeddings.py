@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from ...helpers.embedding_coalescer import EmbeddingCoalescer
+
+
+class SlowStubEmbeddings(DeterministicFakeEmbedding):
+    """
+    Local embeddings with the latency shape of an API client: a fixed round
+    trip plus a small per-text cost, over a limited connection pool.
+    """
+
+    latency_ms: float = 80.0
+    per_text_ms: float = 0.2
+    max_connections: int = 8
+    requests: int = 0
+    _pool: threading.Semaphore = None
+
+    def embed_documents(self, texts):
+        if self._pool is None:
+            self._pool = threading.Semaphore(self.max_connections)
+        with self._pool:
+            self.requests += 1
+            time.sleep((self.latency_ms + self.per_text_ms * len(texts)) / 1000)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-query and coalesced query embedding under concurrent callers, "
+        "against a local stub with simulated API latency: throughput, API requests "
+        "and p50/p99 caller latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64])
+        parser.add_argument("--queries", type=int, default=20, help="Queries per thread.")
+        parser.add_argument("--latency-ms", type=float, default=80.0)
+        parser.add_argument("--max-connections", type=int, default=8,
+                            help="Concurrent requests the stub client allows.")
+        parser.add_argument("--max-wait-ms", type=float, default=5.0)
+        parser.add_argument("--max-batch", type=int, default=32)
+
+    def run(self, embeddings, threads: int, per_thread: int):
+        latencies = []
+        lock = threading.Lock()
+
+        def caller(worker: int):
+            local = []
+            for i in range(per_thread):
+                t0 = time.perf_counter()
+                embeddings.embed_query(f"query {worker}-{i}")
+                local.append((time.perf_counter() - t0) * 1000)
+            with lock:
+                latencies.extend(local)
+
+        workers = [threading.Thread(target=caller, args=(w,)) for w in range(threads)]
+        started = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        return time.perf_counter() - started, latencies
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':>10} {'threads':>8} {'queries':>8} {'requests':>9} "
+            f"{'q/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+        )
+        for threads in options["threads"]:
+            for mode in ("per-query", "coalesced"):
+                stub = SlowStubEmbeddings(
+                    size=64, latency_ms=options["latency_ms"], max_connections=options["max_connections"],
+                )
+                embeddings = stub if mode == "per-query" else EmbeddingCoalescer(
+                    stub, options["max_wait_ms"], options["max_batch"],
+                )
+                seconds, latencies = self.run(embeddings, threads, options["queries"])
+                self.stdout.write(
+                    f"{mode:>10} {threads:>8} {len(latencies):>8} {stub.requests:>9} "
+                    f"{len(latencies) / seconds:>9.1f} {np.percentile(latencies, 50):>8.1f} "
+                    f"{np.percentile(latencies, 99):>8.1f}"
+                )
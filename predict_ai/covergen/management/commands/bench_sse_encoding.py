@@ -0,0 +1,90 @@
+import contextlib
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from langchain_core.messages import AIMessageChunk
+
+from ...helpers import stream_helper
+from ...helpers.sse_writer import SSEWriter
+
+STREAM_CHUNKS_DIR = Path(__file__).resolve().parents[2] / "testdata" / "stream_chunks"
+
+
+def legacy_emit_sse(obj: dict) -> str:
+    return f"data: {json.dumps(obj, ensure_ascii=False)}\n\n"
+
+
+def legacy_emit_text_delta(text: str) -> str:
+    return legacy_emit_sse({"type": "cover_letter_delta", "text": text})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Command(BaseCommand):
+    help = (
+        "Bytes on the wire, response writes and CPU per stream for the recorded agent "
+        "streams (testdata/stream_chunks): the old encoder (json.dumps per frame, one "
+        "write per frame) vs. SSEWriter (pre-serialized frames, id: lines, coalesced "
+        "progress, one write per agent step), plain and gzipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--token-ms", type=float, default=15.0,
+                            help="Simulated time between chunks, for progress coalescing.")
+
+    def old_stream(self, steps, token_ms):
+        with mock.patch.object(stream_helper, "emit_sse", legacy_emit_sse), \
+                mock.patch.object(stream_helper, "emit_text_delta", legacy_emit_text_delta):
+            processor = stream_helper.AgentStreamProcessor({})
+            writes = [frame.encode() for frame in processor.start()]
+            for step in steps:
+                writes += [frame.encode() for frame in processor.feed(step)]
+            writes += [frame.encode() for frame in processor.finish()]
+        return writes
+
+    def new_stream(self, steps, token_ms, compress=False):
+        clock = Clock()
+        writer = SSEWriter(compress=compress, clock=clock)
+        processor = stream_helper.AgentStreamProcessor({})
+        writes = [writer.write(processor.start())]
+        for step in steps:
+            clock.now += token_ms / 1000
+            writes.append(writer.write(processor.feed(step)))
+        writes += [writer.write(processor.finish()), writer.close()]
+        return [data for data in writes if data]
+
+    def handle(self, *args, **options):
+        encoders = {
+            "old": lambda steps, ms: self.old_stream(steps, ms),
+            "new": lambda steps, ms: self.new_stream(steps, ms),
+            "new+gzip": lambda steps, ms: self.new_stream(steps, ms, compress=True),
+        }
+        self.stdout.write(f"{'recording':>18} {'encoder':>9} {'bytes':>7} {'writes':>7} {'progress':>9} {'cpu us':>8}")
+        for path in sorted(STREAM_CHUNKS_DIR.glob("*.json")):
+            steps = [(AIMessageChunk(content=chunk, id="run"), {}) for chunk in json.loads(path.read_text())["chunks"]]
+            for name, encode in encoders.items():
+                # The processor's debug prints would drown the table (and the timing).
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    writes = encode(steps, options["token_ms"])
+                    started = time.process_time()
+                    for _ in range(options["repeat"]):
+                        encode(steps, options["token_ms"])
+                    cpu = (time.process_time() - started) / options["repeat"] * 1e6
+                body = b"".join(writes)
+                text = zlib.decompress(body, 31) if name.endswith("gzip") else body
+                progress = text.count(b'"type": "progress"')
+                self.stdout.write(
+                    f"{path.stem:>18} {name:>9} {len(body):>7} {len(writes):>7} {progress:>9} {cpu:>8.0f}"
+                )
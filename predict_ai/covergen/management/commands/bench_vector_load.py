@@ -0,0 +1,96 @@
+import json
+import multiprocessing
+import os
+import resource
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ...helpers.vector_codec import pack_vector, stack_vectors
+
+
+def _create_db(path: str, rows: int, dim: int) -> None:
+    """Fill a throwaway SQLite file with the same vector in JSON and packed form."""
+    rng = np.random.default_rng(0)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE vectors (row_index INTEGER PRIMARY KEY, page_content TEXT, "
+        "embedding_json TEXT, embedding_blob BLOB)"
+    )
+    batch = []
+    for i in range(rows):
+        vec = rng.standard_normal(dim, dtype=np.float32)
+        batch.append((i, f"Project {i}", json.dumps(vec.tolist()), pack_vector(vec)))
+        if len(batch) >= 1000:
+            conn.executemany("INSERT INTO vectors VALUES (?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO vectors VALUES (?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def _load_json(path: str) -> np.ndarray:
+    """Old path: decode every JSON row into list[float], then build the matrix."""
+    conn = sqlite3.connect(path)
+    embeddings = [
+        json.loads(text)
+        for (text,) in conn.execute("SELECT embedding_json FROM vectors ORDER BY row_index")
+    ]
+    conn.close()
+    return np.array(embeddings, dtype=np.float32)
+
+
+def _load_packed(path: str) -> np.ndarray:
+    """New path: stream packed blobs straight into one preallocated matrix."""
+    conn = sqlite3.connect(path)
+    (count,) = conn.execute("SELECT COUNT(*) FROM vectors").fetchone()
+    cursor = conn.execute("SELECT embedding_blob FROM vectors ORDER BY row_index")
+    matrix = stack_vectors((blob for (blob,) in cursor), count)
+    conn.close()
+    return matrix
+
+
+def _measure(loader, path, queue) -> None:
+    """Run one loader in a fresh process so peak RSS is not polluted by earlier runs."""
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    matrix = loader(path)
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux
+    queue.put((elapsed, (peak_rss - base_rss) / 1024, matrix.nbytes / 1024 / 1024))
+
+
+class Command(BaseCommand):
+    help = "Benchmark JSON vs packed float32 vector loading (time and peak RSS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[600, 10_000, 100_000])
+        parser.add_argument("--dim", type=int, default=1536)
+
+    def handle(self, *args, **options):
+        dim = options["dim"]
+        ctx = multiprocessing.get_context("fork")
+
+        self.stdout.write(
+            f"{'rows':>8} {'format':>7} {'db MB':>8} {'load s':>8} {'peak RSS MB':>12} {'matrix MB':>10}"
+        )
+        for rows in options["rows"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "bench.sqlite3")
+                _create_db(path, rows, dim)
+                db_mb = os.path.getsize(path) / 1024 / 1024
+
+                for name, loader in (("json", _load_json), ("packed", _load_packed)):
+                    queue = ctx.Queue()
+                    proc = ctx.Process(target=_measure, args=(loader, path, queue))
+                    proc.start()
+                    elapsed, rss_mb, matrix_mb = queue.get()
+                    proc.join()
+                    self.stdout.write(
+                        f"{rows:>8} {name:>7} {db_mb:>8.1f} {elapsed:>8.3f} {rss_mb:>12.1f} {matrix_mb:>10.1f}"
+                    )
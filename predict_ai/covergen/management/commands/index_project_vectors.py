@@ -1,81 +1,255 @@
 import os
 import csv
+import uuid
+from itertools import islice
+from pathlib import Path
 from django.conf import settings
 from django.core.management.base import BaseCommand
-
-from langchain_openai import OpenAIEmbeddings
+from django.db import reset_queries, transaction
+from django.utils import timezone
+
+from ...helpers.embedding_backends import embedding_model_id, make_embeddings
+from ...helpers.embedding_pipeline import (
+    DEFAULT_MAX_BATCH_SIZE,
+    DEFAULT_MAX_BATCH_TOKENS,
+    DEFAULT_MAX_WORKERS,
+    EmbeddingJournal,
+    EmbeddingPipeline,
+)
+from ...helpers.project_catalog import iter_project_records
 from ...models import ProjectVector  # adjust path
+from ...rag_vectors import catalog_vectors, write_project_snapshot
+from ...vector_index import DEFAULT_CATALOG, catalog_name
 
 CSV_FILE_PATH = settings.BASE_DIR / "active_projects_2025-11-12_15-24-13.csv"
+DEFAULT_CHUNK_SIZE = 1000
+
+
+def iter_chunks(iterable, size):
+    """Yield lists of up to `size` items without materializing `iterable`."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class Command(BaseCommand):
-    help = "Create embeddings from CSV projects and store only vectors in DB."
+    help = (
+        "Create embeddings from CSV projects and store only vectors in DB. "
+        "Only new or changed rows (by content hash) are re-embedded. "
+        "The CSV is streamed in fixed-size chunks, so memory stays flat for large catalogs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--csv",
+            default=str(CSV_FILE_PATH),
+            help="Path of the portfolio CSV to index.",
+        )
+        parser.add_argument(
+            "--catalog",
+            default=DEFAULT_CATALOG,
+            help="Catalog (agency portfolio) the CSV belongs to; other catalogs are left untouched.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Rows read, embedded and written per chunk.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report added/changed/removed counts without embedding or writing anything.",
+        )
+        parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                            help="Max concurrent embedding requests.")
+        parser.add_argument("--batch-tokens", type=int, default=DEFAULT_MAX_BATCH_TOKENS,
+                            help="Token budget per embedding request.")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE,
+                            help="Max texts per embedding request.")
 
     def handle(self, *args, **options):
-        if not os.path.exists(CSV_FILE_PATH):
-            self.stderr.write(self.style.ERROR(f"CSV not found: {CSV_FILE_PATH}"))
+        csv_path = options["csv"]
+        if not os.path.exists(csv_path):
+            self.stderr.write(self.style.ERROR(f"CSV not found: {csv_path}"))
             return
-
-        with open(CSV_FILE_PATH, "r", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-
-        if not rows:
-            self.stdout.write(self.style.WARNING("No rows found in CSV"))
+        try:
+            self.catalog = catalog_name(options["catalog"])
+        except ValueError as e:
+            self.stderr.write(self.style.ERROR(str(e)))
             return
 
-        texts = []
-
-        for idx, row in enumerate(rows):
-            project_url = (
-                row.get("Project_URL")
-                or row.get("ProjectUrl")
-                or row.get("URL")
-                or row.get("project_url")
-                or row.get("\ufeffProject_URL")
-                or "Unknown URL"
+        self.dry_run = options["dry_run"]
+        self.run_id = uuid.uuid4().hex
+        # Rows embedded with another model (EMBEDDING_BACKEND changed) count as changed.
+        self.model_id = embedding_model_id()
+        self.counts = {"rows": 0, "added": 0, "changed": 0, "unchanged": 0}
+        self.embed_stats = {"rows": 0, "tokens": 0, "resumed": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+
+        # Finished batches are checkpointed here, so a failed run resumes where it stopped.
+        # One journal per catalog: finishing this run never drops another catalog's resume state.
+        journal_path = Path(getattr(settings, "EMBEDDING_JOURNAL_PATH", settings.BASE_DIR / "embedding_journal.jsonl"))
+        self.journal = EmbeddingJournal(journal_path.with_name(f"{journal_path.stem}.{self.catalog}{journal_path.suffix}"))
+        self.pipeline = None
+        if not self.dry_run:
+            self.pipeline = EmbeddingPipeline(
+                make_embeddings(),
+                journal=self.journal,
+                max_workers=options["workers"],
+                max_batch_tokens=options["batch_tokens"],
+                max_batch_size=options["batch_size"],
             )
+            # Pass 1, outside any transaction: embed new/changed rows into the journal.
+            for chunk in self.read_chunks(csv_path, options["chunk_size"]):
+                self.embed_chunk(chunk)
+
+        # Pass 2, one transaction: retrieval sees either the old catalog or the new one, never a mix.
+        # Vectors come from the journal, so no embeddings request runs while it is open.
+        with transaction.atomic():
+            for chunk in self.read_chunks(csv_path, options["chunk_size"]):
+                self.process_chunk(chunk)
+
+            if not self.counts["rows"]:
+                self.stdout.write(self.style.WARNING("No rows found in CSV"))
+                return
+
+            stored = catalog_vectors(self.catalog)
+            if self.dry_run:
+                # Nothing was stamped, so count stored rows the CSV did not match.
+                removed = stored.count() - self.counts["changed"] - self.counts["unchanged"]
+            else:
+                removed, _ = stored.exclude(ingest_run=self.run_id).delete()
+
+        self.stdout.write(
+            f"added={self.counts['added']} changed={self.counts['changed']} "
+            f"removed={removed} unchanged={self.counts['unchanged']}"
+        )
+        if self.dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: nothing embedded or written"))
+            return
 
-            priority_raw = row.get("Priority", "") or ""
-            try:
-                priority = int(priority_raw)
-            except (ValueError, TypeError):
-                priority = 0
-
-            categories = row.get("Categories", "N/A")
-            technology = row.get("Technology", "N/A")
-            title = row.get("Title") or row.get("ProjectName") or row.get("Name") or ""
-            description = row.get("Description") or row.get("Notes") or ""
-
-            # Same text you used before for embeddings
-            page_content = " | ".join(
-                x for x in [
-                    title.strip(),
-                    description.strip(),
-                    f"Categories: {categories}",
-                    f"Technology: {technology}",
-                    f"URL: {project_url}",
-                    f"Priority: {priority}",
-                ] if x
+        self.journal.clear()
+        stats = self.embed_stats
+        if stats["rows"] or stats["resumed"]:
+            seconds = stats["seconds"] or 1e-9
+            self.stdout.write(
+                f"Embedded {stats['rows']} rows ({stats['resumed']} resumed from journal) "
+                f"in {stats['batches']} batches, {stats['seconds']:.1f}s: "
+                f"{stats['rows'] / seconds:.1f} rows/s, {stats['tokens'] / seconds:.0f} tokens/s, "
+                f"{stats['retries']} rate-limit retries"
             )
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {self.counts['added']} new and {self.counts['changed']} changed vectors, removed {removed}"
+        ))
+
+        snapshot_dir = write_project_snapshot(self.catalog)
+        self.stdout.write(self.style.SUCCESS(f"Wrote index snapshot {snapshot_dir}"))
+
+    def read_chunks(self, csv_path, size):
+        with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+            yield from iter_chunks(iter_project_records(csv.DictReader(f)), size)
+
+    def classify(self, records):
+        """(existing, added, changed, unchanged) for one chunk of CSV records."""
+        # With DEBUG on, Django keeps every executed SQL string (vector blobs included).
+        reset_queries()
+
+        # project_key -> stored row, for this chunk only
+        existing = {
+            obj.project_key: obj
+            for obj in catalog_vectors(self.catalog).filter(
+                project_key__in=[r["project_key"] for r in records]
+            ).only("id", "project_key", "row_index", "content_hash", "embedding_model")
+        }
+
+        added, changed, unchanged = [], [], []
+        for r in records:
+            obj = existing.get(r["project_key"])
+            if obj is None:
+                added.append(r)
+            elif obj.content_hash != r["content_hash"] or obj.embedding_model != self.model_id:
+                changed.append(r)
+            else:
+                unchanged.append(r)
+        return existing, added, changed, unchanged
+
+    def embed(self, records):
+        """content key -> packed vector for `records`; journaled ones are not sent again."""
+        # Journal entries are keyed per model, so a resume never mixes models.
+        return self.pipeline.run(
+            {"hash": f"{self.model_id}|{r['content_hash']}", "text": r["page_content"]} for r in records
+        )
+
+    def embed_chunk(self, records):
+        """Pass 1: embed the chunk's new and changed rows into the journal."""
+        _, added, changed, _ = self.classify(records)
+        if added or changed:
+            self.embed(added + changed)
+            for key in self.embed_stats:
+                self.embed_stats[key] += self.pipeline.stats[key]
+
+    def process_chunk(self, records):
+        """Pass 2: classify and write one chunk of CSV records, with vectors from pass 1."""
+        existing, added, changed, unchanged = self.classify(records)
+        self.counts["rows"] += len(records)
+        self.counts["added"] += len(added)
+        self.counts["changed"] += len(changed)
+        self.counts["unchanged"] += len(unchanged)
+        if self.dry_run:
+            return
 
-            texts.append((idx, page_content))
-
-        self.stdout.write("Generating embeddings...")
-        embeddings_model = OpenAIEmbeddings()
-        # list[str] → list[list[float]]
-        vectors = embeddings_model.embed_documents([t[1] for t in texts])
-
-        ProjectVector.objects.all().delete()  # optional: clean slate
-
-        objs = []
-        for (row_index, page_content), emb in zip(texts, vectors):
-            objs.append(ProjectVector(
-                row_index=row_index,
-                page_content=page_content,
-                embedding=emb,
-            ))
-
-        ProjectVector.objects.bulk_create(objs, batch_size=100)
-        self.stdout.write(self.style.SUCCESS(f"Stored {len(objs)} vectors in DB"))
+        to_embed = added + changed
+        if to_embed:
+            # Normally all journaled by pass 1; only rows edited in between are embedded here.
+            packed = self.embed(to_embed)
+            for record in to_embed:
+                record["embedding"] = packed[f"{self.model_id}|{record['content_hash']}"]
+                record["embedding_model"] = self.model_id
+
+        ProjectVector.objects.bulk_create(
+            [ProjectVector(catalog=self.catalog, ingest_run=self.run_id, **r) for r in added],
+            batch_size=100,
+        )
+
+        now = timezone.now()
+        changed_objs = []
+        for r in changed:
+            obj = existing[r["project_key"]]
+            obj.row_index = r["row_index"]
+            obj.page_content = r["page_content"]
+            obj.content_hash = r["content_hash"]
+            obj.embedding = r["embedding"]
+            obj.embedding_model = r["embedding_model"]
+            obj.categories = r["categories"]
+            obj.technologies = r["technologies"]
+            obj.priority = r["priority"]
+            obj.url = r["url"]
+            obj.title = r["title"]
+            obj.summary = r["summary"]
+            obj.short_description = r["short_description"]
+            obj.ingest_run = self.run_id
+            obj.updated_at = now
+            changed_objs.append(obj)
+        ProjectVector.objects.bulk_update(
+            changed_objs,
+            ["row_index", "page_content", "content_hash", "embedding", "embedding_model",
+             "categories", "technologies", "priority",
+             "url", "title", "summary", "short_description", "ingest_run", "updated_at"],
+            batch_size=100,
+        )
+
+        # Unchanged rows are only stamped as seen (and re-positioned if they moved); no re-embedding.
+        moved_objs = []
+        for r in unchanged:
+            obj = existing[r["project_key"]]
+            if obj.row_index != r["row_index"]:
+                obj.row_index = r["row_index"]
+                obj.updated_at = now
+                moved_objs.append(obj)
+        ProjectVector.objects.bulk_update(moved_objs, ["row_index", "updated_at"], batch_size=500)
+        catalog_vectors(self.catalog).filter(
+            project_key__in=[r["project_key"] for r in unchanged]
+        ).update(ingest_run=self.run_id)
@@ -1,13 +1,9 @@
 from langchain.agents.middleware import wrap_model_call, ModelRequest, ModelResponse
-from typing import Callable
+from typing import Awaitable, Callable
 from ..helpers.system_prompts import UpworkResponse
 import mimetypes
 
-@wrap_model_call
-def inject_context(
-    request: ModelRequest,
-    handler: Callable[[ModelRequest], ModelResponse]
-) -> ModelResponse:
+def with_context(request: ModelRequest) -> ModelRequest:
     """
     Inject context about files, categories, and snippets user has provided this session.
     Handles payload keys: 'files', 'context_snippets', 'categories'.
@@ -98,7 +94,15 @@ def inject_context(
         print("message in middlware£££££££££££3333333", messages)
         request = request.override(messages=messages)
 
-    return handler(request)
+    return request
+
+
+@wrap_model_call
+def inject_context(
+    request: ModelRequest,
+    handler: Callable[[ModelRequest], ModelResponse]
+) -> ModelResponse:
+    return handler(with_context(request))
 
 
 @wrap_model_call
@@ -112,3 +116,21 @@ def state_based_output(
     request = request.override(response_format=UpworkResponse) 
 
     return handler(request)
+
+
+# Async twins for agents driven with ainvoke()/astream(): a wrap_model_call
+# middleware only runs on the code path (sync or async) it was written for.
+@wrap_model_call
+async def ainject_context(
+    request: ModelRequest,
+    handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+) -> ModelResponse:
+    return await handler(with_context(request))
+
+
+@wrap_model_call
+async def astate_based_output(
+    request: ModelRequest,
+    handler: Callable[[ModelRequest], Awaitable[ModelResponse]]
+) -> ModelResponse:
+    return await handler(request.override(response_format=UpworkResponse))
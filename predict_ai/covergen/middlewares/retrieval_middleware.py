@@ -0,0 +1,34 @@
+from langchain.agents.middleware import after_model, AgentState
+from langgraph.config import get_config
+from langgraph.runtime import Runtime
+
+from ..tools.retrieval_tool import find_relevant_past_projects, prefetch_project_searches, thread_id_from
+
+
+@after_model
+def batch_project_searches(state: AgentState, runtime: Runtime) -> None:
+    """
+    When the model asks for several project searches in one turn, run them
+    as one batched embeddings request + one multi-query FAISS search before
+    the tool calls execute; each call then reads its result from the memo.
+    """
+    messages = state.get("messages") or []
+    tool_calls = getattr(messages[-1], "tool_calls", None) if messages else None
+    queries = [
+        call["args"].get("query", "")
+        for call in tool_calls or []
+        if call.get("name") == find_relevant_past_projects.name
+    ]
+    if len(queries) < 2:
+        return None
+
+    try:
+        searched = prefetch_project_searches(
+            thread_id_from(get_config()), queries,
+            categories=state.get("categories") or [], catalog=state.get("catalog") or None,
+        )
+        print(f"--- Batched {searched} project searches for {len(queries)} tool calls ---")
+    except Exception as e:
+        # Each tool call falls back to its own search.
+        print(f"Batched project search failed: {e}")
+    return None
@@ -0,0 +1,82 @@
+import struct
+
+import numpy as np
+from django.db import migrations, models
+
+# Frozen copy of the version 1 vector_codec format, so later codec changes
+# don't change what this migration writes:
+# b"PV" | version (uint8) | dtype code (uint8, 1 = float32) | dim (uint32) | values.
+HEADER = struct.Struct("<2sBBI")
+
+
+def pack_vector(values):
+    arr = np.asarray(values, dtype="<f4")
+    return HEADER.pack(b"PV", 1, 1, arr.shape[0]) + arr.tobytes()
+
+
+def unpack_vector(blob):
+    magic, version, code, dim = HEADER.unpack_from(blob)
+    if (magic, version, code) != (b"PV", 1, 1):
+        raise ValueError("Unexpected packed vector header")
+    return np.frombuffer(blob, dtype="<f4", count=dim, offset=HEADER.size)
+
+
+def json_to_packed(apps, schema_editor):
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    batch = []
+    for obj in ProjectVector.objects.only("id", "embedding").iterator(chunk_size=500):
+        obj.embedding_packed = pack_vector(obj.embedding or [])
+        batch.append(obj)
+        if len(batch) >= 500:
+            ProjectVector.objects.bulk_update(batch, ["embedding_packed"])
+            batch = []
+    if batch:
+        ProjectVector.objects.bulk_update(batch, ["embedding_packed"])
+
+
+def packed_to_json(apps, schema_editor):
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    batch = []
+    for obj in ProjectVector.objects.only("id", "embedding_packed").iterator(chunk_size=500):
+        obj.embedding = unpack_vector(obj.embedding_packed).tolist()
+        batch.append(obj)
+        if len(batch) >= 500:
+            ProjectVector.objects.bulk_update(batch, ["embedding"])
+            batch = []
+    if batch:
+        ProjectVector.objects.bulk_update(batch, ["embedding"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='embedding_packed',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='projectvector',
+            name='embedding',
+            field=models.JSONField(null=True),
+        ),
+        migrations.RunPython(json_to_packed, packed_to_json),
+        migrations.RemoveField(
+            model_name='projectvector',
+            name='embedding',
+        ),
+        migrations.RenameField(
+            model_name='projectvector',
+            old_name='embedding_packed',
+            new_name='embedding',
+        ),
+        migrations.AlterField(
+            model_name='projectvector',
+            name='embedding',
+            field=models.BinaryField(),
+        ),
+    ]
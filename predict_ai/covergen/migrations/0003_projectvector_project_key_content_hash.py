@@ -0,0 +1,68 @@
+import hashlib
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def populate_keys_and_hashes(apps, schema_editor):
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    seen_urls = {}
+    batch = []
+    rows = ProjectVector.objects.order_by("row_index").only("id", "row_index", "page_content")
+    for obj in rows.iterator(chunk_size=500):
+        url = None
+        for segment in (obj.page_content or "").split(" | "):
+            seg = segment.strip()
+            if seg.lower().startswith("url:"):
+                url = seg[4:].strip()
+                break
+        url = url or f"row:{obj.row_index}"
+
+        occurrence = seen_urls.get(url, 0) + 1
+        seen_urls[url] = occurrence
+        obj.project_key = url if occurrence == 1 else f"{url}#{occurrence}"
+        obj.content_hash = hashlib.sha256((obj.page_content or "").encode("utf-8")).hexdigest()
+        batch.append(obj)
+        if len(batch) >= 500:
+            ProjectVector.objects.bulk_update(batch, ["project_key", "content_hash"])
+            batch = []
+    if batch:
+        ProjectVector.objects.bulk_update(batch, ["project_key", "content_hash"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0002_pack_embedding_float32'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='project_key',
+            field=models.CharField(max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='content_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='projectvector',
+            name='row_index',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.RunPython(populate_keys_and_hashes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='projectvector',
+            name='project_key',
+            field=models.CharField(max_length=512, unique=True),
+        ),
+    ]
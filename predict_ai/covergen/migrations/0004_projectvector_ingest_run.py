@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0003_projectvector_project_key_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='ingest_run',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:23
+
+import re
+
+from django.db import migrations, models
+
+
+# Frozen copies of the project_catalog parsers as of this migration.
+def split_terms(value):
+    terms = []
+    for part in (value or "").split(","):
+        term = re.sub(r"\s+", " ", part).strip().lower()
+        if term and term != "n/a" and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def parse_priority(value):
+    try:
+        return int(value or 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def backfill_structured_fields(apps, schema_editor):
+    """Existing rows keep their content hash, so re-indexing would not fill these in."""
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    batch = []
+    for obj in ProjectVector.objects.only("id", "page_content").iterator(chunk_size=500):
+        for segment in (obj.page_content or "").split(" | "):
+            label, _, value = segment.partition(":")
+            label = label.strip().lower()
+            if label == "categories":
+                obj.categories = split_terms(value)
+            elif label == "technology":
+                obj.technologies = split_terms(value)
+            elif label == "priority":
+                obj.priority = parse_priority(value.strip())
+        batch.append(obj)
+        if len(batch) >= 500:
+            ProjectVector.objects.bulk_update(batch, ["categories", "technologies", "priority"])
+            batch = []
+    if batch:
+        ProjectVector.objects.bulk_update(batch, ["categories", "technologies", "priority"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0004_projectvector_ingest_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='categories',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='priority',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='technologies',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(backfill_structured_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:27
+
+import re
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+PAYLOAD_FIELDS = ["url", "title", "summary", "short_description"]
+
+# Frozen copies of the project_catalog helpers as of this migration, so later
+# changes to them don't change what this backfill writes.
+SUMMARY_MAX_CHARS = 200
+DESCRIPTION_MIN_WORDS = 10
+DESCRIPTION_MAX_WORDS = 15
+APP_STORE_HOSTS = ("apps.apple.com", "play.google.com", "chromewebstore.google.com", "chrome.google.com")
+
+
+def split_terms(value):
+    terms = []
+    for part in (value or "").split(","):
+        term = re.sub(r"\s+", " ", part).strip()
+        if term and term.lower() != "n/a" and term not in terms:
+            terms.append(term)
+    return terms
+
+
+def parse_page_content(page_content):
+    row = {}
+    labels = {"categories": "Categories", "technology": "Technology", "url": "Project_URL", "priority": "Priority"}
+    free_text = []
+    for segment in (page_content or "").split(" | "):
+        label, sep, value = segment.partition(":")
+        key = labels.get(label.strip().lower()) if sep else None
+        if key:
+            row[key] = value.strip()
+        elif segment.strip():
+            free_text.append(segment.strip())
+    if free_text:
+        row["Title"] = free_text[0]
+    if len(free_text) > 1:
+        row["Description"] = free_text[1]
+    return row
+
+
+def title_from_url(url):
+    parsed = urlparse(url if "://" in url else f"https://{url}")
+    host = (parsed.hostname or "").removeprefix("www.")
+    if host in APP_STORE_HOSTS:
+        parts = [p for p in parsed.path.split("/") if p]
+        slug = ""
+        if "app" in parts and parts.index("app") + 1 < len(parts):
+            slug = parts[parts.index("app") + 1]
+        elif "detail" in parts and parts.index("detail") + 1 < len(parts):
+            slug = parts[parts.index("detail") + 1]
+        elif "id=" in parsed.query:
+            slug = parsed.query.split("id=", 1)[1].split("&", 1)[0].rsplit(".", 1)[-1]
+        if slug:
+            return " ".join(w.capitalize() for w in re.split(r"[-_]+", slug) if w)
+    return host or url
+
+
+def truncate_chars(text, limit):
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0].rstrip(",;/ ") + "..."
+
+
+def build_summary(technologies, categories, description=""):
+    if description.strip():
+        return truncate_chars(" ".join(description.split()), SUMMARY_MAX_CHARS)
+    parts = [p for p in (technologies.strip(), ", ".join(split_terms(categories))) if p]
+    return truncate_chars(" - ".join(parts), SUMMARY_MAX_CHARS)
+
+
+def build_short_description(technologies, categories, description=""):
+    if description.strip():
+        words = description.split()[:DESCRIPTION_MAX_WORDS]
+        return " ".join(words).rstrip(",;.") + "."
+
+    tech = ", ".join(split_terms(technologies)) or "Custom"
+    words = f"{tech} project covering".split()
+    covered = []
+    for category in split_terms(categories):
+        candidate = covered + [category.split(" / ")[0]]
+        if len(words) + len(", ".join(candidate).split()) > DESCRIPTION_MAX_WORDS - 1:
+            break
+        covered = candidate
+    words += (", ".join(covered) or "a client website").split()
+
+    for filler in ("built end to end", "with custom design and development"):
+        if len(words) >= DESCRIPTION_MIN_WORDS:
+            break
+        words += filler.split()
+    return " ".join(words[:DESCRIPTION_MAX_WORDS]) + "."
+
+
+def backfill_payload_fields(apps, schema_editor):
+    """Existing rows keep their content hash, so re-indexing would not fill these in."""
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    batch = []
+    for obj in ProjectVector.objects.only("id", "page_content").iterator(chunk_size=500):
+        row = parse_page_content(obj.page_content)
+        technology = row.get("Technology", "")
+        categories = row.get("Categories", "")
+        description = row.get("Description", "")
+        # parse_page_content only ever fills in "Project_URL".
+        obj.url = row.get("Project_URL", "").strip() or "Unknown URL"
+        obj.title = row.get("Title") or title_from_url(obj.url)
+        obj.summary = build_summary(technology, categories, description)
+        obj.short_description = build_short_description(technology, categories, description)
+        batch.append(obj)
+        if len(batch) >= 500:
+            ProjectVector.objects.bulk_update(batch, PAYLOAD_FIELDS)
+            batch = []
+    if batch:
+        ProjectVector.objects.bulk_update(batch, PAYLOAD_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0005_projectvector_structured_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='short_description',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='title',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='projectvector',
+            name='url',
+            field=models.CharField(blank=True, default='', max_length=512),
+        ),
+        migrations.RunPython(backfill_payload_fields, migrations.RunPython.noop),
+    ]
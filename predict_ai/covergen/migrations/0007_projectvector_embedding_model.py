@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:33
+
+from django.db import migrations, models
+
+
+def stamp_openai_model(apps, schema_editor):
+    """Every vector stored so far came from the default OpenAIEmbeddings() model."""
+    ProjectVector = apps.get_model("covergen", "ProjectVector")
+    ProjectVector.objects.filter(embedding_model="").update(embedding_model="openai:text-embedding-ada-002")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0006_projectvector_tool_payload_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='embedding_model',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+        migrations.RunPython(stamp_openai_model, migrations.RunPython.noop),
+    ]
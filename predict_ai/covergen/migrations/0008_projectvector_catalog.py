@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('covergen', '0007_projectvector_embedding_model'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectvector',
+            name='catalog',
+            field=models.CharField(db_index=True, default='default', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='projectvector',
+            name='project_key',
+            field=models.CharField(max_length=512),
+        ),
+        migrations.AddConstraint(
+            model_name='projectvector',
+            constraint=models.UniqueConstraint(fields=('catalog', 'project_key'), name='projectvector_catalog_project_key'),
+        ),
+    ]
@@ -1,18 +1,59 @@
 from django.db import models
 
+from .helpers.vector_codec import pack_vector, unpack_vector
+
 # Create your models here.
 class ProjectVector(models.Model):
     """
     Minimal storage:
+    - catalog: which portfolio the row belongs to (one per agency CSV)
+    - project_key: stable identity across re-indexes (project URL, "#n" for
+      repeats), unique within its catalog
     - page_content: the text we embedded
-    - embedding: the vector
+    - content_hash: sha256 of page_content, used to skip re-embedding unchanged rows
+    - embedding: the vector, packed float32 with a dim/dtype header
+      (see helpers/vector_codec.py)
+    - embedding_model: which model produced it (helpers/embedding_backends.py)
     - row_index: position in original CSV (optional but handy)
+    - categories / technologies / priority: structured CSV columns (normalized,
+      lowercase terms) used to pre-filter and rank retrieval
+    - url / title / summary / short_description: compact, precomputed fields
+      the retrieval tool returns to the agent instead of page_content
+    - ingest_run: id of the last index run that saw this row; rows left on an
+      older run after a full pass were removed from the CSV
     """
-    row_index = models.IntegerField(unique=True)
+    catalog = models.CharField(max_length=64, default="default", db_index=True)
+    project_key = models.CharField(max_length=512)
+    row_index = models.IntegerField(db_index=True)
     page_content = models.TextField()
-    embedding = models.JSONField()  # list[float]
+    content_hash = models.CharField(max_length=64)
+    embedding = models.BinaryField()  # packed float32
+    embedding_model = models.CharField(max_length=255, blank=True, default="", db_index=True)
+    categories = models.JSONField(default=list)    # list[str]
+    technologies = models.JSONField(default=list)  # list[str]
+    priority = models.IntegerField(default=0, db_index=True)
+    url = models.CharField(max_length=512, blank=True, default="")
+    title = models.CharField(max_length=255, blank=True, default="")
+    summary = models.TextField(blank=True, default="")
+    short_description = models.CharField(max_length=255, blank=True, default="")
+    ingest_run = models.CharField(max_length=32, blank=True, default="", db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["catalog", "project_key"], name="projectvector_catalog_project_key"),
+        ]
 
     def __str__(self):
-        return f"ProjectVector #{self.row_index}"
\ No newline at end of file
+        return f"ProjectVector {self.catalog}/{self.project_key}"
+
+    @property
+    def vector(self):
+        """Decoded embedding as a float32 ndarray."""
+        return unpack_vector(self.embedding)
+
+    @vector.setter
+    def vector(self, values):
+        self.embedding = pack_vector(values)
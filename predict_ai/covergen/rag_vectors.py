@@ -1,40 +1,619 @@
 # apps/projects/rag_vectors.py
-import math
-from functools import lru_cache
-from typing import List, Tuple
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Tuple
 
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
 
+from .helpers.embedding_coalescer import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT_MS, EmbeddingCoalescer
+from .helpers.embedding_backends import EmbeddingModelMismatch, embedding_model_id, make_embeddings
+from .helpers.embedding_cache import DEFAULT_LRU_SIZE, DEFAULT_MAX_BYTES, CachedEmbeddings, QueryEmbeddingStore
+from .helpers.project_catalog import normalize_term
+from .helpers.ranking import DEFAULT_PRIORITY_SCALE, DEFAULT_WEIGHTS, rank_candidates
+from .helpers.vector_codec import stack_vectors
 from .models import ProjectVector
+from .vector_index import (
+    DEFAULT_CATALOG,
+    SnapshotError,
+    build_index,
+    catalog_dir,
+    catalog_name,
+    current_generation,
+    index_nbytes,
+    load_snapshot,
+    pointer_token,
+    search_index,
+    write_snapshot,
+)
 
 
-@lru_cache(maxsize=1)
-def get_project_retriever():
+# Non-vector columns copied into every row dict / the snapshot's rows.json.
+ROW_COLUMNS = (
+    "project_key", "row_index", "page_content", "categories", "technologies", "priority",
+    "url", "title", "summary", "short_description", "created_at",
+)
+VECTOR_COLUMNS = (*ROW_COLUMNS, "embedding")
+
+
+def _row_dict(values) -> dict:
+    row = dict(zip(ROW_COLUMNS, values))
+    # Epoch seconds keep rows.json plain JSON; used as the optional recency signal.
+    row["created_at"] = row["created_at"].timestamp() if row["created_at"] else 0.0
+    return row
+
+
+def load_vector_matrix(queryset=None) -> Tuple[np.ndarray, List[dict]]:
+    """
+    Read every stored vector into one contiguous (n, dim) float32 matrix.
+
+    Returns (matrix, rows) where rows[i] holds the non-vector columns of
+    matrix row i. Packed payloads are streamed from the DB and copied
+    straight into the matrix, so no per-float Python objects are created.
+    """
+    if queryset is None:
+        queryset = ProjectVector.objects.all()
+    queryset = queryset.order_by("row_index", "id")
+
+    count = queryset.count()
+    rows: List[dict] = []
+
+    def blobs():
+        for *values, embedding in queryset.values_list(*VECTOR_COLUMNS).iterator(chunk_size=2000):
+            rows.append(_row_dict(values))
+            yield embedding
+
+    matrix = stack_vectors(blobs(), count)
+    return matrix, rows
+
+
+def iter_vector_chunks(queryset=None, chunk_size: int = 5000) -> Iterator[Tuple[np.ndarray, List[dict]]]:
+    """Like load_vector_matrix, but yields (matrix, rows) a chunk at a time."""
+    if queryset is None:
+        queryset = ProjectVector.objects.all()
+    queryset = queryset.order_by("row_index", "id")
+
+    blobs, rows = [], []
+    for *values, embedding in queryset.values_list(*VECTOR_COLUMNS).iterator(chunk_size=2000):
+        rows.append(_row_dict(values))
+        blobs.append(embedding)
+        if len(blobs) >= chunk_size:
+            yield stack_vectors(blobs, len(blobs)), rows
+            blobs, rows = [], []
+    if blobs:
+        yield stack_vectors(blobs, len(blobs)), rows
+
+
+def catalog_vectors(catalog: str = DEFAULT_CATALOG):
+    return ProjectVector.objects.filter(catalog=catalog)
+
+
+def catalog_exists(catalog: str) -> bool:
+    """
+    True for the default catalog and for any catalog that has a snapshot or
+    indexed rows. Request-supplied names are checked with this before a
+    registry is created for them.
+    """
+    if catalog == DEFAULT_CATALOG or pointer_token(catalog_dir(catalog)) is not None:
+        return True
+    return catalog_vectors(catalog).exists()
+
+
+def db_fingerprint(catalog: str = DEFAULT_CATALOG) -> str:
+    """Cheap summary of a catalog's ProjectVector rows; changes whenever the indexer touches one."""
+    stats = catalog_vectors(catalog).aggregate(
+        count=Count("id"), max_id=Max("id"), max_updated=Max("updated_at")
+    )
+    max_updated = stats["max_updated"].isoformat() if stats["max_updated"] else ""
+    return f"{stats['count']}:{stats['max_id'] or 0}:{max_updated}"
+
+
+def row_document(row: dict, **extra_metadata) -> Document:
+    metadata = {key: row.get(key) for key in ROW_COLUMNS if key != "page_content"}
+    metadata.update(extra_metadata)
+    return Document(page_content=row["page_content"], metadata=metadata)
+
+
+def build_vectorstore(index, rows: List[dict], embedding_fn) -> FAISS:
+    """Wrap a FAISS index whose row i is rows[i] in a LangChain vector store."""
+    docs = {}
+    index_to_docstore_id = {}
+    for i, row in enumerate(rows):
+        doc_id = row["project_key"]
+        docs[doc_id] = row_document(row)
+        index_to_docstore_id[i] = doc_id
+
+    return FAISS(
+        embedding_function=embedding_fn,
+        index=index,
+        docstore=InMemoryDocstore(docs),
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def check_embedding_model(catalog: str = DEFAULT_CATALOG) -> str:
+    """
+    Configured embedding model id; raises EmbeddingModelMismatch when the
+    catalog's stored vectors were produced by a different model.
+    """
+    model_id = embedding_model_id()
+    other = catalog_vectors(catalog).exclude(embedding_model=model_id).values_list("embedding_model", flat=True).first()
+    if other is not None:
+        raise EmbeddingModelMismatch(
+            f"Stored vectors come from {other!r} but EMBEDDING_BACKEND is {model_id!r}; "
+            "re-run index_project_vectors"
+        )
+    return model_id
+
+
+def write_project_snapshot(catalog: str = DEFAULT_CATALOG):
+    """
+    Build an index from the catalog's DB rows and persist it as its next snapshot generation.
+    Vectors are added to the index chunk by chunk, so no second full-size matrix is held.
     """
-    Build FAISS index from vectors stored in DB.
-    Called once and cached, so retrieval is fast.
+    model_id = check_embedding_model(catalog)
+    fingerprint = db_fingerprint(catalog)
+    queryset = catalog_vectors(catalog)
+    ntotal = queryset.count()
+    index = None
+    rows: List[dict] = []
+    # IVF trains on the first chunk, so make it a decent sample.
+    for matrix, chunk_rows in iter_vector_chunks(queryset, chunk_size=max(5000, min(ntotal, 50_000))):
+        if index is None:
+            index = build_index(matrix, ntotal=ntotal)
+        else:
+            index.add(matrix)
+        rows.extend(chunk_rows)
+    if index is None:
+        return None
+    return write_snapshot(index, rows, fingerprint, root=catalog_dir(catalog), embedding_model=model_id)
+
+
+class ProjectIndex:
     """
-    vectors = list(ProjectVector.objects.all())
-    print(f"Loaded {len(vectors)} vectors from DB")
-    # print(vectors)
+    One loaded generation of the catalog: the FAISS index, its row table and
+    an inverted index from category/technology term to row positions.
+    """
+
+    def __init__(self, index, rows: List[dict], embeddings, info: dict):
+        self.index = index
+        self.rows = rows
+        self.embeddings = embeddings
+        self.info = info
+        self.postings = build_postings(rows)
+        self._retriever = None
+        self.nbytes = index_nbytes(index) + rows_nbytes(rows) + sum(p.nbytes for p in self.postings.values())
+
+    def as_retriever(self):
+        if self._retriever is None:
+            if not self.rows:
+                self._retriever = FAISS.from_texts(["No projects found"], self.embeddings).as_retriever()
+            else:
+                vectorstore = build_vectorstore(self.index, self.rows, self.embeddings)
+                self._retriever = vectorstore.as_retriever(search_kwargs={"k": 10})
+        return self._retriever
+
+    def filter_ids(self, categories) -> Optional[np.ndarray]:
+        """
+        Row positions matching any selected category, or None when nothing was
+        selected. A selection matches catalog terms listed for it in
+        PROJECT_CATEGORY_ALIASES and any term that contains it
+        (e.g. "mobile app" -> "mobile apps", "web + mobile apps").
+        """
+        if isinstance(categories, str):
+            categories = categories.split(",")
+        selected = [normalize_term(c) for c in categories or [] if normalize_term(c)]
+        if not selected:
+            return None
+
+        aliases = getattr(settings, "PROJECT_CATEGORY_ALIASES", {})
+        terms = set()
+        for category in selected:
+            terms.update(normalize_term(t) for t in aliases.get(category, []))
+            terms.update(t for t in self.postings if category in t)
+
+        matched = [self.postings[t] for t in terms if t in self.postings]
+        if not matched:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(matched))
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Stacked query vectors; one embeddings request for all cache misses when the backend supports it."""
+        embed_many = getattr(self.embeddings, "embed_queries", None)
+        vectors = embed_many(queries) if embed_many else [self.embeddings.embed_query(q) for q in queries]
+        return np.asarray(vectors, dtype=np.float32).reshape(len(queries), -1)
 
-    if not vectors:
-        return FAISS.from_texts(["No projects found"], OpenAIEmbeddings()).as_retriever()
+    def search(self, query: str, k: int = 10, categories=None, min_results: Optional[int] = None) -> List[Document]:
+        """
+        Nearest projects to `query`. With `categories`, only matching rows are
+        searched; if that yields fewer than `min_results` hits, the list is
+        topped up from an unfiltered search.
+        """
+        return self.search_many([query], k=k, categories=categories, min_results=min_results)[0]
 
-    # text_embeddings: list[(text, embedding)]
-    text_embeddings: List[Tuple[str, List[float]]] = [
-        (v.page_content, v.embedding) for v in vectors
-    ]
+    def search_many(self, queries: List[str], k: int = 10, categories=None,
+                    min_results: Optional[int] = None) -> List[List[Document]]:
+        """search() for several queries at once, as one FAISS search over the stacked query matrix."""
+        if not self.rows or not queries:
+            return [[] for _ in queries]
+        if min_results is None:
+            min_results = getattr(settings, "PROJECT_FILTER_MIN_RESULTS", 3)
 
-    metadatas = [{"row_index": v.row_index} for v in vectors]
+        matrix = self.embed_queries(queries)
+        hits: List[List[Tuple[int, float]]] = [[] for _ in queries]
 
-    embedding_fn = OpenAIEmbeddings()
-    vectorstore = FAISS.from_embeddings(
-        text_embeddings=text_embeddings,
-        embedding=embedding_fn,
-        metadatas=metadatas,
+        ids = self.filter_ids(categories)
+        if ids is not None and len(ids):
+            distances, positions = search_index(self.index, matrix, min(k, len(ids)), ids=ids)
+            for i in range(len(queries)):
+                hits[i] = [(int(p), float(d)) for p, d in zip(positions[i], distances[i]) if p >= 0]
+
+        short = [i for i in range(len(queries)) if len(hits[i]) < min_results]
+        if short:
+            distances, positions = search_index(self.index, matrix[short], k + max(len(hits[i]) for i in short))
+            for row, i in enumerate(short):
+                seen = {p for p, _ in hits[i]}
+                hits[i] += [
+                    (int(p), float(d)) for p, d in zip(positions[row], distances[row])
+                    if p >= 0 and p not in seen
+                ]
+
+        return [[row_document(self.rows[p], distance=d) for p, d in query_hits[:k]] for query_hits in hits]
+
+    def search_ranked(
+        self,
+        query: str,
+        top_n: Optional[int] = None,
+        candidates: Optional[int] = None,
+        categories=None,
+    ) -> List[Document]:
+        """
+        search() for `candidates` hits, then rerank them by similarity,
+        priority and (optionally) recency and return the top `top_n`
+        unique projects, best first. Weights come from PROJECT_RANKING.
+        """
+        return self.search_ranked_many([query], top_n=top_n, candidates=candidates, categories=categories)[0]
+
+    def search_ranked_many(self, queries: List[str], top_n: Optional[int] = None,
+                           candidates: Optional[int] = None, categories=None) -> List[List[Document]]:
+        """search_ranked() for several queries, sharing one embeddings request and one FAISS search."""
+        ranking = {**DEFAULT_RANKING, **getattr(settings, "PROJECT_RANKING", {})}
+        top_n = top_n or ranking["top_n"]
+        weights = {name: ranking[name] for name in DEFAULT_WEIGHTS}
+        results = self.search_many(queries, k=candidates or ranking["candidates"], categories=categories)
+        return [rerank(docs, weights, top_n, ranking["priority_scale"]) for docs in results]
+
+
+def rerank(docs: List[Document], weights: dict, top_n: int,
+           priority_scale: float = DEFAULT_PRIORITY_SCALE) -> List[Document]:
+    """Order search hits by rank_candidates, keeping the best hit per project URL; sets metadata["score"]."""
+    if not docs:
+        return []
+    positions, scores = rank_candidates(
+        keys=[project_url(d.metadata["project_key"]) for d in docs],
+        distances=[d.metadata["distance"] for d in docs],
+        priorities=[d.metadata.get("priority") or 0 for d in docs],
+        recency=[d.metadata.get("created_at") or 0 for d in docs],
+        weights=weights,
+        top_n=top_n,
+        priority_scale=priority_scale,
+    )
+    ranked = []
+    for position, score in zip(positions, scores):
+        doc = docs[position]
+        doc.metadata["score"] = round(float(score), 4)
+        ranked.append(doc)
+    return ranked
+
+
+DEFAULT_RANKING = {**DEFAULT_WEIGHTS, "top_n": 3, "candidates": 10, "priority_scale": DEFAULT_PRIORITY_SCALE}
+
+
+def project_url(project_key: str) -> str:
+    """project_key without the "#2", "#3" suffix given to repeated URLs."""
+    return re.sub(r"#\d+$", "", project_key)
+
+
+def rows_nbytes(rows: List[dict]) -> int:
+    """Rough in-memory size of the row table (str payloads plus per-row dict overhead)."""
+    return sum(
+        len(row.get("page_content") or "") + len(row.get("summary") or "") + 1000
+        for row in rows
     )
 
-    return vectorstore.as_retriever(search_kwargs={"k": 10})
+
+def build_postings(rows: List[dict]) -> dict:
+    """term -> sorted int64 array of row positions, over categories and technologies."""
+    positions: dict = {}
+    for i, row in enumerate(rows):
+        for term in (*(row.get("categories") or []), *(row.get("technologies") or [])):
+            positions.setdefault(term, []).append(i)
+    return {term: np.asarray(p, dtype=np.int64) for term, p in positions.items()}
+
+
+_embedding_backend = None
+_embedding_backend_lock = threading.Lock()
+_query_embeddings: Optional[CachedEmbeddings] = None
+_query_embeddings_lock = threading.Lock()
+
+
+def get_embedding_backend():
+    """The configured embeddings model (settings.EMBEDDING_BACKEND), created once per process."""
+    global _embedding_backend
+    if _embedding_backend is None:
+        with _embedding_backend_lock:
+            if _embedding_backend is None:
+                _embedding_backend = make_embeddings()
+    return _embedding_backend
+
+
+def warm_up_embeddings() -> float:
+    """
+    Load the embedding backend and run one encode, so the first real query
+    does not pay for model loading / ONNX session setup. Returns seconds spent.
+    """
+    started = time.perf_counter()
+    backend = get_embedding_backend()
+    if embedding_model_id().startswith("local:"):
+        backend.embed_documents(["warm up"])
+    get_query_embeddings()
+    return time.perf_counter() - started
+
+
+def get_query_embeddings() -> CachedEmbeddings:
+    """
+    Process-wide embeddings for search queries: cache misses from concurrent
+    callers are micro-batched (settings.QUERY_EMBEDDING_BATCH) and results are
+    cached per settings.QUERY_EMBEDDING_CACHE.
+    Shared across index generations so the cache survives hot swaps.
+    """
+    global _query_embeddings
+    if _query_embeddings is None:
+        with _query_embeddings_lock:
+            if _query_embeddings is None:
+                backend = get_embedding_backend()
+                batching = getattr(settings, "QUERY_EMBEDDING_BATCH", {}) or {}
+                max_batch = batching.get("max_batch", DEFAULT_MAX_BATCH)
+                if max_batch > 1:
+                    backend = EmbeddingCoalescer(
+                        backend, batching.get("max_wait_ms", DEFAULT_MAX_WAIT_MS), max_batch,
+                    )
+
+                config = getattr(settings, "QUERY_EMBEDDING_CACHE", {}) or {}
+                path = config.get("path")
+                store = QueryEmbeddingStore(path, config.get("max_bytes", DEFAULT_MAX_BYTES)) if path else None
+                _query_embeddings = CachedEmbeddings(
+                    backend, store=store, lru_size=config.get("lru_size", DEFAULT_LRU_SIZE),
+                    model=embedding_model_id(),
+                )
+    return _query_embeddings
+
+
+def load_project_index(catalog: str = DEFAULT_CATALOG) -> ProjectIndex:
+    """
+    Load the catalog's shared on-disk FAISS snapshot (memory-mapped, read-only).
+    Falls back to building the index from DB vectors when the snapshot
+    is missing or stale. Vectors from another embedding model than the
+    configured one are rejected (EmbeddingModelMismatch).
+    """
+    root = catalog_dir(catalog)
+    generation = current_generation(root)
+    model_id = embedding_model_id()
+    try:
+        snapshot = load_snapshot(fingerprint=db_fingerprint(catalog), root=root, embedding_model=model_id)
+        print(f"Loaded {catalog} snapshot gen {snapshot.generation} with {len(snapshot.rows)} vectors")
+        index, rows = snapshot.index, snapshot.rows
+        generation, source = snapshot.generation, "snapshot"
+    except SnapshotError as e:
+        print(f"Snapshot for {catalog} unavailable ({e}); rebuilding index from DB")
+        check_embedding_model(catalog)
+        matrix, rows = load_vector_matrix(catalog_vectors(catalog))
+        print(f"Loaded {len(rows)} vectors from DB")
+        index = build_index(matrix) if rows else None
+        source = "db"
+
+    info = {
+        "catalog": catalog, "generation": generation, "source": source, "vectors": len(rows),
+        "embedding_model": model_id, "loaded_at": time.time(),
+    }
+    return ProjectIndex(index, rows, get_query_embeddings(), info)
+
+
+class RetrieverRegistry:
+    """
+    Holds the live ProjectIndex, keyed by the index generation it was built from.
+
+    Every get() does one stat() of the snapshot pointer. When the indexer has
+    published a new generation, the new index is loaded on a background thread
+    and swapped in with a single reference assignment; callers that already
+    hold the old index finish their search on it undisturbed. Only the very
+    first call in a process loads synchronously.
+
+    A failed background load is not retried on every get(): the same pointer
+    is tried again after `retry_after` seconds, doubling up to
+    `max_retry_after` while it keeps failing. A newly published generation
+    is tried straight away.
+    """
+
+    def __init__(self, loader: Callable[[], ProjectIndex] = load_project_index, root=None,
+                 retry_after: float = 30.0, max_retry_after: float = 600.0):
+        self._loader = loader
+        self._root = root
+        self._lock = threading.Lock()
+        self._current: Optional[ProjectIndex] = None
+        self._pointer = None
+        self._loading = False
+        self._last_error: Optional[str] = None
+        self._retry_after = retry_after
+        self._max_retry_after = max_retry_after
+        self._failed_pointer = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def get(self):
+        pointer = pointer_token(self._root)
+        current = self._current
+        if current is None:
+            with self._lock:
+                if self._current is None:
+                    self._swap_in(pointer)
+                return self._current
+
+        if pointer != self._pointer:
+            self._start_background_load(pointer)
+        return current
+
+    def _swap_in(self, pointer) -> None:
+        self._current, self._pointer = self._loader(), pointer
+
+    @property
+    def _info(self) -> dict:
+        return self._current.info if self._current is not None else {}
+
+    @property
+    def nbytes(self) -> int:
+        return getattr(self._current, "nbytes", 0)
+
+    def _start_background_load(self, pointer) -> None:
+        with self._lock:
+            if self._loading or pointer == self._pointer:
+                return
+            if pointer == self._failed_pointer and time.monotonic() < self._retry_at:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self._swap_in(pointer)
+                self._last_error, self._failed_pointer, self._failures = None, None, 0
+                print(f"Swapped in index generation {self._info.get('generation')}")
+            except Exception as e:
+                # Keep serving the previous generation; retry this pointer after a backoff.
+                if pointer != self._failed_pointer:
+                    print(f"Background index load failed: {e}")
+                    self._failed_pointer, self._failures = pointer, 0
+                self._failures += 1
+                delay = min(self._retry_after * 2 ** (self._failures - 1), self._max_retry_after)
+                self._retry_at = time.monotonic() + delay
+                self._last_error = str(e)
+            finally:
+                self._loading = False
+                connection.close()
+
+        threading.Thread(target=run, name="project-index-loader", daemon=True).start()
+
+    def status(self) -> dict:
+        return {
+            "generation": current_generation(self._root),
+            "loaded_generation": self._info.get("generation"),
+            "source": self._info.get("source"),
+            "vectors": self._info.get("vectors"),
+            "embedding_model": self._info.get("embedding_model"),
+            "loaded_at": self._info.get("loaded_at"),
+            "loading": self._loading,
+            "last_error": self._last_error,
+            "failures": self._failures,
+            "nbytes": self.nbytes,
+        }
+
+
+DEFAULT_INDEX_CACHE_BYTES = 1024 * 1024 * 1024
+
+
+class CatalogRegistry:
+    """
+    One RetrieverRegistry per catalog, kept in LRU order. Whenever the loaded
+    indexes together exceed settings.PROJECT_INDEX_CACHE_BYTES, the least
+    recently used catalogs are dropped (never the one being served); they are
+    simply reloaded from their snapshot on next use.
+    """
+
+    def __init__(self, loader: Callable[[str], ProjectIndex] = load_project_index,
+                 max_bytes: Optional[int] = None):
+        self._loader = loader
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._registries: "OrderedDict[str, RetrieverRegistry]" = OrderedDict()
+        self.evictions = 0
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, "PROJECT_INDEX_CACHE_BYTES", DEFAULT_INDEX_CACHE_BYTES)
+
+    def registry(self, catalog: str) -> RetrieverRegistry:
+        with self._lock:
+            registry = self._registries.get(catalog)
+            if registry is None:
+                registry = RetrieverRegistry(partial(self._loader, catalog), root=catalog_dir(catalog))
+                self._registries[catalog] = registry
+            self._registries.move_to_end(catalog)
+            return registry
+
+    def get(self, catalog: Optional[str] = None):
+        catalog = catalog_name(catalog)
+        project_index = self.registry(catalog).get()
+        self._evict(keep=catalog)
+        return project_index
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            total = sum(r.nbytes for r in self._registries.values())
+            for name in list(self._registries):  # least recently used first
+                if total <= self.max_bytes:
+                    break
+                if name == keep:
+                    continue
+                total -= self._registries.pop(name).nbytes
+                self.evictions += 1
+                print(f"Evicted catalog index {name!r} (loaded indexes over {self.max_bytes} bytes)")
+
+    def status(self) -> dict:
+        with self._lock:
+            registries = list(self._registries.items())
+        return {
+            "max_bytes": self.max_bytes,
+            "loaded_bytes": sum(r.nbytes for _, r in registries),
+            "evictions": self.evictions,
+            "catalogs": {name: registry.status() for name, registry in registries},
+            "query_cache": _query_embeddings.stats() if _query_embeddings is not None else None,
+        }
+
+
+retriever_registry = CatalogRegistry()
+
+
+def get_project_index(catalog: Optional[str] = None) -> ProjectIndex:
+    """Current generation's index for a catalog; cheap enough to call on every tool invocation."""
+    return retriever_registry.get(catalog)
+
+
+def get_project_retriever(catalog: Optional[str] = None):
+    """LangChain retriever over the current generation (unfiltered search)."""
+    return get_project_index(catalog).as_retriever()
+
+
+def search_projects(query: str, k: int = 10, categories=None, catalog: Optional[str] = None) -> List[Document]:
+    """Category-filtered similarity search over the current generation."""
+    return get_project_index(catalog).search(query, k=k, categories=categories)
+
+
+def find_ranked_projects(query: str, top_n: Optional[int] = None, categories=None,
+                         catalog: Optional[str] = None) -> List[Document]:
+    """Category-filtered search, reranked and deduplicated by project URL."""
+    return get_project_index(catalog).search_ranked(query, top_n=top_n, categories=categories)
+
+
+def find_ranked_projects_many(queries: List[str], top_n: Optional[int] = None, categories=None,
+                              catalog: Optional[str] = None) -> List[List[Document]]:
+    """find_ranked_projects() for several queries in one batched search."""
+    return get_project_index(catalog).search_ranked_many(queries, top_n=top_n, categories=categories)
@@ -1,3 +1,1274 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from langchain.agents import create_agent
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langgraph.graph import START, MessagesState, StateGraph
+
+from . import rag_vectors, views
+from .helpers.checkpointer import SQLiteCheckpointSaver
+from .helpers.embedding_backends import EmbeddingModelMismatch, make_embeddings
+from .helpers.embedding_cache import CachedEmbeddings, QueryEmbeddingStore
+from .helpers.embedding_coalescer import EmbeddingCoalescer
+from .helpers.embedding_pipeline import (
+    EmbeddingJournal,
+    EmbeddingPipeline,
+    RateLimitExhausted,
+    make_batches,
+)
+from .helpers.sse_writer import HEARTBEAT, SSEWriter
+from .helpers.project_catalog import iter_project_records, parse_page_content
+from .helpers.ranking import rank_candidates
+from .helpers.stream_helper import (
+    AgentStreamProcessor,
+    JSONExtractionError,
+    JsonFieldStreamReader,
+    StructuredFieldReader,
+    emit_sse,
+    extract_json_and_span,
+    fix_json_like_string,
+)
+from .helpers.tool_cache import ToolResultCache, query_key
+from .helpers.vector_codec import VectorCodecError, pack_vector, stack_vectors, unpack_vector
+from .management.commands.bench_generate_concurrency import StubChatModel
+from .middlewares.retrieval_middleware import batch_project_searches
+from .models import ProjectVector
+from .rag_vectors import CatalogRegistry, ProjectIndex, RetrieverRegistry, check_embedding_model, row_document
+from .tools.retrieval_tool import find_relevant_past_projects, format_projects, project_search_cache
+from .vector_index import (
+    SnapshotError,
+    build_index,
+    current_generation,
+    load_snapshot,
+    search_index,
+    write_snapshot,
+)
+
+INDEX_COMMAND = "covergen.management.commands.index_project_vectors"
+
+
+class VectorCodecTests(SimpleTestCase):
+    def test_round_trip(self):
+        blob = pack_vector([0.25, -1.5, 3.0])
+        self.assertEqual(len(blob), 8 + 3 * 4)
+        np.testing.assert_array_equal(unpack_vector(blob), np.array([0.25, -1.5, 3.0], dtype=np.float32))
+
+    def test_stack_vectors_builds_contiguous_matrix(self):
+        blobs = [pack_vector([i, i + 1.0]) for i in range(4)]
+        matrix = stack_vectors(iter(blobs), 4)
+        self.assertEqual(matrix.shape, (4, 2))
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        np.testing.assert_array_equal(matrix[:, 0], [0, 1, 2, 3])
+
+    def test_rejects_mixed_dimensions_and_bad_payloads(self):
+        with self.assertRaises(VectorCodecError):
+            stack_vectors([pack_vector([1.0, 2.0]), pack_vector([1.0])], 2)
+        with self.assertRaises(VectorCodecError):
+            unpack_vector(b"XX" + pack_vector([1.0])[2:])
+
+
+class IndexSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.matrix = np.random.default_rng(0).standard_normal((5, 8), dtype=np.float32)
+        self.rows = [{"row_index": i, "page_content": f"Project {i}"} for i in range(5)]
+
+    def test_write_then_load_memory_mapped(self):
+        write_snapshot(build_index(self.matrix), self.rows, "fp-1", root=self.tmp)
+        snapshot = load_snapshot(fingerprint="fp-1", root=self.tmp)
+        self.assertEqual(snapshot.generation, 1)
+        self.assertEqual(snapshot.rows, self.rows)
+        _, ids = snapshot.index.search(self.matrix[2:3], 1)
+        self.assertEqual(ids[0][0], 2)
+
+    def test_generation_bumps_and_stale_or_corrupt_snapshot_is_rejected(self):
+        write_snapshot(build_index(self.matrix), self.rows, "fp-1", root=self.tmp)
+        path = write_snapshot(build_index(self.matrix), self.rows, "fp-2", root=self.tmp)
+        self.assertEqual(current_generation(self.tmp), 2)
+
+        with self.assertRaises(SnapshotError):
+            load_snapshot(fingerprint="fp-1", root=self.tmp)
+
+        with open(path / "rows.json", "a") as f:
+            f.write(" ")
+        with self.assertRaises(SnapshotError):
+            load_snapshot(fingerprint="fp-2", root=self.tmp)
+
+    def test_compact_index_rescores_exactly_and_maps_full_vectors(self):
+        backend = {"type": "flat", "quantize": "int8", "truncate_dim": 4}
+        matrix = np.random.default_rng(1).standard_normal((200, 8), dtype=np.float32)
+        index = build_index(matrix[:100], backend)
+        index.add(matrix[100:])
+        exact_d, exact_i = build_index(matrix, {"type": "flat"}).search(matrix[:5], 3)
+
+        write_snapshot(index, [{"row_index": i} for i in range(200)], "fp-1", root=self.tmp, backend=backend)
+        snapshot = load_snapshot(root=self.tmp, backend={**backend, "rescore": 50})
+        self.assertIsInstance(snapshot.index.vectors, np.memmap)
+        distances, positions = snapshot.index.search(matrix[:5], 3)
+        np.testing.assert_array_equal(positions, exact_i)
+        np.testing.assert_allclose(distances, exact_d, rtol=1e-4, atol=1e-4)
+
+        _, positions = search_index(snapshot.index, matrix[:1], 3, ids=np.arange(1, 200, 2))
+        self.assertTrue(np.all(positions % 2 == 1))
+
+        with self.assertRaisesRegex(SnapshotError, "truncate_dim"):
+            load_snapshot(root=self.tmp, backend={"type": "flat"})
+
+    def test_ann_backends_round_trip_and_filter_by_category(self):
+        matrix = np.random.default_rng(2).standard_normal((200, 8), dtype=np.float32)
+        rows = [
+            {"row_index": i, "page_content": f"Project {i}", "categories": ["mobile apps" if i % 2 else "ecommerce"]}
+            for i in range(200)
+        ]
+        mobile = np.arange(1, 200, 2)
+        _, exact = build_index(matrix[mobile], {"type": "flat"}).search(matrix[:5], 3)
+
+        for backend in ({"type": "hnsw"}, {"type": "ivf", "nlist": 4, "nprobe": 4}):
+            with self.subTest(backend=backend["type"]):
+                root = self.tmp / backend["type"]
+                index = build_index(matrix, backend)
+                expected = index.search(matrix[:5], 3)
+                write_snapshot(index, rows, "fp-1", root=root, backend=backend)
+
+                snapshot = load_snapshot(fingerprint="fp-1", root=root, backend=backend)
+                self.assertEqual(snapshot.manifest["backend"]["type"], backend["type"])
+                self.assertEqual(snapshot.rows, rows)
+                distances, positions = snapshot.index.search(matrix[:5], 3)
+                np.testing.assert_array_equal(positions, expected[1])
+                np.testing.assert_allclose(distances, expected[0])
+
+                project_index = ProjectIndex(snapshot.index, snapshot.rows, None, snapshot.manifest)
+                ids = project_index.filter_ids(["Mobile App"])
+                np.testing.assert_array_equal(ids, mobile)
+                _, positions = search_index(snapshot.index, matrix[:5], 3, ids=ids)
+                np.testing.assert_array_equal(positions, mobile[exact])
+
+                with self.assertRaisesRegex(SnapshotError, "type"):
+                    load_snapshot(root=root, backend={"type": "flat"})
+
+    def test_snapshot_from_another_embedding_model_is_rejected(self):
+        write_snapshot(build_index(self.matrix), self.rows, "fp-1", root=self.tmp, embedding_model="openai:a")
+        load_snapshot(root=self.tmp, embedding_model="openai:a")
+        with self.assertRaisesRegex(SnapshotError, "openai:a"):
+            load_snapshot(root=self.tmp, embedding_model="local:b")
+
+
+def make_project_index(rows, embeddings=None):
+    """In-memory ProjectIndex over `rows` (dicts with page_content/categories/...)."""
+    embeddings = embeddings or DeterministicFakeEmbedding(size=16)
+    rows = [
+        {"project_key": f"https://p{i}.com/", "row_index": i, "categories": [], "technologies": [],
+         "priority": 0, **row}
+        for i, row in enumerate(rows)
+    ]
+    matrix = np.asarray(embeddings.embed_documents([r["page_content"] for r in rows]), dtype=np.float32)
+    return ProjectIndex(build_index(matrix), rows, embeddings, {"generation": 1})
+
+
+class FilteredSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.project_index = make_project_index([
+            {"page_content": "Shopify store", "categories": ["ecommerce"], "technologies": ["shopify"]},
+            {"page_content": "Clinic app", "categories": ["mobile apps"], "technologies": ["ios"]},
+            {"page_content": "Booking app", "categories": ["web + mobile apps"], "technologies": ["react native"]},
+            {"page_content": "Law firm site", "categories": ["company / corporate"], "technologies": ["wordpress"]},
+            {"page_content": "Fitness app", "categories": ["mobile apps"], "technologies": ["android"]},
+        ])
+
+    def keys(self, docs):
+        return {d.metadata["project_key"] for d in docs}
+
+    def test_selected_categories_pre_filter_the_search(self):
+        docs = self.project_index.search("Shopify store", k=10, categories=["Mobile App"], min_results=1)
+        self.assertEqual(self.keys(docs), {"https://p1.com/", "https://p2.com/", "https://p4.com/"})
+
+    @override_settings(PROJECT_CATEGORY_ALIASES={"cms": ["wordpress"]})
+    def test_aliases_map_ui_categories_to_catalog_terms(self):
+        docs = self.project_index.search("anything", k=10, categories=["CMS"], min_results=1)
+        self.assertEqual(self.keys(docs), {"https://p3.com/"})
+
+    def test_too_few_filtered_hits_fall_back_to_unfiltered(self):
+        docs = self.project_index.search("Shopify store", k=3, categories=["ecommerce"], min_results=3)
+        self.assertEqual(len(docs), 3)
+        self.assertEqual(docs[0].metadata["project_key"], "https://p0.com/")
+
+        docs = self.project_index.search("Shopify store", k=3, categories=["no such category"])
+        self.assertEqual(len(docs), 3)
+
+
+class RankingTests(SimpleTestCase):
+    def test_priority_breaks_near_ties_and_duplicates_collapse(self):
+        positions, scores = rank_candidates(
+            keys=["a", "b", "a", "c"],
+            distances=[0.40, 0.41, 0.39, 1.20],
+            priorities=[3, 7, 5, 7],
+            weights={"similarity": 0.7, "priority": 0.3},
+            top_n=3,
+        )
+        # "b" (nearly as close, top priority) beats both "a" rows; only the best "a" survives.
+        self.assertEqual(list(positions), [1, 2, 3])
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_similarity_only_weights_keep_distance_order(self):
+        positions, _ = rank_candidates(
+            keys=["a", "b", "c"], distances=[0.9, 0.1, 0.5], priorities=[7, 1, 1],
+            weights={"similarity": 1.0, "priority": 0.0}, top_n=3,
+        )
+        self.assertEqual(list(positions), [1, 2, 0])
+
+    def test_slightly_higher_priority_does_not_outrank_a_much_closer_match(self):
+        # cosine 0.90 at priority 5 vs 0.75 at priority 6; a far-off third
+        # candidate must not stretch the gap between them.
+        positions, scores = rank_candidates(
+            keys=["close", "higher", "far"], distances=[0.20, 0.50, 2.0], priorities=[5, 6, 5], top_n=3,
+        )
+        self.assertEqual(list(positions), [0, 1, 2])
+
+        _, alone = rank_candidates(keys=["close", "higher"], distances=[0.20, 0.50], priorities=[5, 6], top_n=2)
+        np.testing.assert_allclose(alone, scores[:2])
+
+    def test_search_ranked_returns_top_unique_projects(self):
+        project_index = make_project_index([
+            {"page_content": "Shopify store", "priority": 2},
+            {"page_content": "Shopify store", "priority": 7, "project_key": "https://p0.com/#2"},
+            {"page_content": "Clinic app", "priority": 5},
+        ])
+        docs = project_index.search_ranked("Shopify store", top_n=2)
+        self.assertEqual([d.metadata["project_key"] for d in docs], ["https://p0.com/#2", "https://p2.com/"])
+        self.assertIn("score", docs[0].metadata)
+
+
+class ToolPayloadTests(SimpleTestCase):
+    CSV_ROWS = [
+        {"Project_URL": "https://www.shop.example.com/", "Categories": "Ecommerce, Skin Care / Beauty",
+         "Technology": "Shopify", "Priority": "5"},
+        {"Project_URL": "https://apps.apple.com/us/app/seen-dating-app/id123", "Categories": "Mobile Apps",
+         "Technology": "iOS", "Priority": "7"},
+    ]
+
+    def test_records_carry_compact_fields(self):
+        shop, app = iter_project_records(self.CSV_ROWS)
+        self.assertEqual(shop["url"], "https://www.shop.example.com/")
+        self.assertEqual(shop["title"], "shop.example.com")
+        self.assertEqual(shop["summary"], "Shopify - Ecommerce, Skin Care / Beauty")
+        self.assertEqual(app["title"], "Seen Dating App")
+        for record in (shop, app):
+            self.assertTrue(10 <= len(record["short_description"].split()) <= 15)
+            # The migration backfill recovers the same inputs from stored page_content.
+            self.assertEqual(parse_page_content(record["page_content"])["Technology"],
+                             self.CSV_ROWS[record["row_index"]]["Technology"])
+
+    def test_long_titles_and_descriptions_fit_their_columns(self):
+        row = {"Project_URL": "https://long.example.com/", "Title": "Title " * 100,
+               "Description": " ".join(["x" * 40] * 15), "Categories": "CMS", "Technology": "Wix"}
+        record = next(iter_project_records([row]))
+        self.assertLessEqual(len(record["title"]), ProjectVector._meta.get_field("title").max_length)
+        self.assertTrue(record["title"].endswith("..."))
+        self.assertLessEqual(
+            len(record["short_description"]), ProjectVector._meta.get_field("short_description").max_length
+        )
+
+    def test_tool_output_respects_token_budget(self):
+        docs = [row_document({**r, "page_content": "x" * 5000}) for r in iter_project_records(self.CSV_ROWS * 3)]
+        full = format_projects(docs, token_budget=10_000)
+        self.assertEqual(full.count("Result "), 6)
+        self.assertNotIn("xxx", full)
+
+        tight = format_projects(docs, token_budget=120)
+        self.assertLess(tight.count("Result "), 6)
+        self.assertIn("- URL: https://www.shop.example.com/", tight)
+        # Over budget even for one result: still return the best one, without its summary.
+        self.assertIn("Result 1:", format_projects(docs, token_budget=1))
+        self.assertNotIn("Summary", format_projects(docs, token_budget=1))
+
+
+class ToolCallFakeChatModel(GenericFakeChatModel):
+    """Fake chat model that accepts bind_tools (the agent binds the search tool)."""
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class ToolMemoTests(SimpleTestCase):
+    def setUp(self):
+        project_search_cache.clear()
+        self.backend = CountingFakeEmbeddings(size=16)
+        self.project_index = make_project_index(
+            [{"page_content": "Shopify store"}, {"page_content": "Clinic app"}, {"page_content": "Law firm site"}],
+            CachedEmbeddings(self.backend),
+        )
+        self.backend.embedded = 0
+        patcher = mock.patch("covergen.rag_vectors.get_project_index", return_value=self.project_index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_query_key_ignores_order_case_and_punctuation(self):
+        self.assertEqual(query_key("Shopify custom app!", ["CMS"]), query_key("custom  shopify APP", ["cms"]))
+        self.assertNotEqual(query_key("Shopify app", ["CMS"]), query_key("Shopify app", ["ecommerce"]))
+
+        cache = ToolResultCache(max_threads=1)
+        cache.put("t1", "k", "result")
+        cache.put("t2", "k", "other")
+        self.assertIsNone(cache.get("t1", "k"))
+        self.assertEqual(cache.get("t2", "k"), "other")
+
+    def test_repeated_tool_calls_are_memoized_per_thread(self):
+        def call(query, thread_id):
+            runtime = SimpleNamespace(state={}, config={"configurable": {"thread_id": thread_id}})
+            return find_relevant_past_projects.func(query, runtime)
+
+        hits = project_search_cache.counters["hits"]
+        first = call("Shopify store", "t1")
+        self.assertIn("https://p0.com/", first)
+        self.assertEqual(call("store shopify", "t1"), first)
+        self.assertEqual(self.backend.queries + self.backend.embedded, 1)
+
+        call("store shopify", "t2")  # other conversations do not share the memo
+        self.assertEqual(project_search_cache.counters["hits"] - hits, 1)
+
+    def test_parallel_tool_calls_share_one_batched_search(self):
+        model = ToolCallFakeChatModel(messages=iter([
+            AIMessage(content="", tool_calls=[
+                {"name": "find_relevant_past_projects", "args": {"query": q}, "id": f"call-{i}"}
+                for i, q in enumerate(["Shopify store", "Clinic app", "Law firm site"])
+            ]),
+            AIMessage(content="done"),
+        ]))
+        agent = create_agent(model=model, tools=[find_relevant_past_projects], middleware=[batch_project_searches])
+        with mock.patch.object(self.project_index, "search_many", wraps=self.project_index.search_many) as search:
+            result = agent.invoke({"messages": [HumanMessage("hi")]},
+                                  config={"configurable": {"thread_id": "t-parallel"}})
+
+        self.assertEqual(search.call_count, 1)
+        self.assertEqual(len(search.call_args.args[0]), 3)
+        self.assertEqual(self.backend.embedded, 3)  # one embed_documents request for the three queries
+        self.assertEqual(self.backend.queries, 0)
+        tool_outputs = [m.content for m in result["messages"] if m.type == "tool"]
+        self.assertEqual(len(tool_outputs), 3)
+        self.assertIn("https://p1.com/", tool_outputs[1].split("---")[0])
+
+
+class RetrieverRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.index = build_index(np.eye(4, dtype=np.float32))
+        self.rows = [{"project_key": str(i), "row_index": i, "page_content": ""} for i in range(4)]
+        self.release = threading.Event()
+        self.release.set()
+
+    def loader(self):
+        self.release.wait(5)
+        generation = current_generation(self.tmp)
+        return SimpleNamespace(name=f"index-gen-{generation}", info={"generation": generation})
+
+    def test_swaps_new_generation_in_background(self):
+        with override_settings(PROJECT_INDEX_DIR=self.tmp):
+            write_snapshot(self.index, self.rows, "fp", root=self.tmp)
+            registry = RetrieverRegistry(loader=self.loader)
+            self.assertEqual(registry.get().name, "index-gen-1")
+
+            # A new generation is published; callers keep getting gen 1 until it is loaded.
+            self.release.clear()
+            write_snapshot(self.index, self.rows, "fp", root=self.tmp)
+            self.assertEqual(registry.get().name, "index-gen-1")
+            self.assertTrue(registry.status()["loading"])
+            self.assertEqual(registry.status()["generation"], 2)
+
+            self.release.set()
+            for _ in range(100):
+                if not registry.status()["loading"]:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(registry.get().name, "index-gen-2")
+            self.assertEqual(registry.status()["loaded_generation"], 2)
+
+    def wait_for_load(self, registry):
+        for _ in range(100):
+            if not registry.status()["loading"]:
+                return
+            time.sleep(0.01)
+
+    def test_failed_load_is_retried_after_a_backoff(self):
+        calls = []
+
+        def loader():
+            calls.append(current_generation(self.tmp))
+            if len(calls) > 1:
+                raise SnapshotError("corrupt snapshot")
+            return self.loader()
+
+        with override_settings(PROJECT_INDEX_DIR=self.tmp):
+            write_snapshot(self.index, self.rows, "fp", root=self.tmp)
+            registry = RetrieverRegistry(loader=loader, retry_after=60)
+            registry.get()
+            write_snapshot(self.index, self.rows, "fp", root=self.tmp)
+            with mock.patch("sys.stdout", new_callable=StringIO) as out:
+                for _ in range(20):
+                    self.assertEqual(registry.get().name, "index-gen-1")
+                    self.wait_for_load(registry)
+                self.assertEqual(len(calls), 2)  # one failed attempt, not one per get()
+                self.assertEqual(registry.status()["last_error"], "corrupt snapshot")
+
+                with mock.patch("covergen.rag_vectors.time.monotonic", return_value=time.monotonic() + 61):
+                    registry.get()
+                    self.wait_for_load(registry)
+                self.assertEqual(len(calls), 3)
+                self.assertEqual(registry.status()["failures"], 2)
+
+                # A newly published generation is tried straight away.
+                write_snapshot(self.index, self.rows, "fp", root=self.tmp)
+                registry.get()
+                self.wait_for_load(registry)
+                self.assertEqual(calls[-1], 3)
+            self.assertEqual(out.getvalue().count("Background index load failed"), 2)
+
+
+class CatalogRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.loads = []
+
+    def loader(self, catalog):
+        self.loads.append(catalog)
+        return SimpleNamespace(name=catalog, nbytes=400, info={"catalog": catalog})
+
+    def test_least_recently_used_catalogs_are_evicted_over_budget(self):
+        registry = CatalogRegistry(loader=self.loader, max_bytes=1000)
+        self.assertEqual(registry.get("Agency-A").name, "agency-a")
+        registry.get("agency-b")
+        registry.get("agency-a")  # a is now more recent than b
+        registry.get("agency-c")
+
+        status = registry.status()
+        self.assertEqual(list(status["catalogs"]), ["agency-a", "agency-c"])
+        self.assertEqual(status["loaded_bytes"], 800)
+        self.assertEqual(status["evictions"], 1)
+
+        registry.get("agency-b")  # reloaded on demand
+        self.assertEqual(self.loads, ["agency-a", "agency-b", "agency-c", "agency-b"])
+
+    def test_catalog_being_served_is_never_evicted(self):
+        registry = CatalogRegistry(loader=self.loader, max_bytes=100)
+        self.assertEqual(registry.get().name, "default")
+        self.assertEqual(list(registry.status()["catalogs"]), ["default"])
+        with self.assertRaises(ValueError):
+            registry.get("../etc")
+
+
+def parse_sse(chunks, gzipped=False):
+    """(id, data) of each event in a response body; comments are skipped."""
+    body = b"".join(chunks)
+    if gzipped:
+        body = zlib.decompress(body, 31)
+    events = []
+    for block in body.decode().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "data" in fields:
+            events.append((fields.get("id"), fields["data"]))
+    return events
+
+
+class GenerateStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.model = StubChatModel(first_token_ms=0, token_ms=0)
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(views, "make_chat_model", return_value=self.model),
+            mock.patch.object(views, "checkpointer", SQLiteCheckpointSaver(tmp / "checkpoints.sqlite3", compact_interval=0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        views.clear_agents()
+        self.addCleanup(views.clear_agents)
+
+    def payload(self, **extra):
+        return json.dumps({"session_id": f"stream-{time.monotonic_ns()}", "client_text": "Shopify migration", **extra})
+
+    def events(self, chunks):
+        return [json.loads(data) for _, data in parse_sse(chunks)]
+
+    @override_settings(SSE_STREAM={"progress_interval": 0})
+    def test_async_view_streams_the_same_events_as_the_sync_view(self):
+        request = RequestFactory().post("/api/genrate-cover-letter", self.payload(), content_type="application/json")
+        response = views.generate_cover_letter(request)
+        sync_events = self.events(list(response.streaming_content))
+
+        async def consume():
+            request = AsyncRequestFactory().post("/api/genrate-cover-letter", self.payload(), content_type="application/json")
+            response = await views.agenerate_cover_letter(request)
+            self.assertTrue(response.is_async)
+            return [frame async for frame in response.streaming_content]
+
+        async_events = self.events(asyncio.run(consume()))
+
+        self.assertEqual(async_events, sync_events)
+        types = [event["type"] for event in async_events]
+        self.assertEqual(types[0], "progress")
+        self.assertIn("structured_data", types)
+        self.assertNotIn("error", types)
+        structured = next(event for event in async_events if event["type"] == "structured_data")
+        self.assertEqual(structured["data"]["job_summary"], "Shopify migration")
+
+    def test_agent_is_compiled_once_per_configuration(self):
+        with mock.patch.object(views, "create_agent", wraps=create_agent) as compile_agent:
+            for _ in range(3):
+                request = RequestFactory().post("/api/genrate-cover-letter", self.payload(), content_type="application/json")
+                list(views.generate_cover_letter(request).streaming_content)
+            self.assertIs(views.get_agent(), views.get_agent())
+            self.assertEqual(compile_agent.call_count, 1)
+
+            agent = views.get_agent()
+            with override_settings(CHAT_MODEL={"model": "gpt-5.1-mini"}):
+                self.assertIsNot(views.get_agent(), agent)
+            self.assertIsNot(views.get_agent(asynchronous=True), agent)
+            self.assertEqual(compile_agent.call_count, 3)
+        self.assertEqual(self.model.calls, 3)
+
+    def test_attached_context_costs_a_single_model_pass(self):
+        payload = self.payload(selected_categories=["Shopify"], context_snippets=["https://example.com/brief"])
+        request = RequestFactory().post("/api/genrate-cover-letter", payload, content_type="application/json")
+        events = self.events(list(views.generate_cover_letter(request).streaming_content))
+        self.assertIn("structured_data", [event["type"] for event in events])
+
+        async def consume():
+            request = AsyncRequestFactory().post("/api/genrate-cover-letter", payload, content_type="application/json")
+            return [frame async for frame in (await views.agenerate_cover_letter(request)).streaming_content]
+
+        asyncio.run(consume())
+
+        self.assertEqual(self.model.calls, 2)  # one per request
+        for prompt in self.model.prompts:
+            injected = [m.content for m in prompt if m.type == "system" and "CONTEXT INFORMATION" in m.content]
+            self.assertEqual(len(injected), 1)
+            self.assertIn("Shopify", injected[0])
+            self.assertIn("https://example.com/brief", injected[0])
+
+    def test_async_view_rejects_invalid_catalog(self):
+        request = AsyncRequestFactory().post(
+            "/api/genrate-cover-letter", self.payload(catalog="../x"), content_type="application/json"
+        )
+        response = asyncio.run(views.agenerate_cover_letter(request))
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SSE_STREAM={"gzip": True, "heartbeat": 0.03})
+    def test_async_stream_is_gzipped_and_kept_alive_while_waiting(self):
+        self.model.first_token_ms = 120
+
+        async def consume():
+            request = AsyncRequestFactory().post(
+                "/api/genrate-cover-letter", self.payload(), content_type="application/json",
+                headers={"accept-encoding": "gzip, br"},
+            )
+            response = await views.agenerate_cover_letter(request)
+            return response, [chunk async for chunk in response.streaming_content]
+
+        response, chunks = asyncio.run(consume())
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn(HEARTBEAT, zlib.decompress(b"".join(chunks), 31).decode())
+        events = [json.loads(data) for _, data in parse_sse(chunks, gzipped=True)]
+        self.assertIn("structured_data", [event["type"] for event in events])
+
+    @override_settings(SSE_STREAM={"heartbeat": 0.03})
+    def test_sync_stream_is_kept_alive_during_a_slow_step(self):
+        self.model.first_token_ms = 150
+        request = RequestFactory().post("/api/genrate-cover-letter", self.payload(), content_type="application/json")
+        chunks = list(views.generate_cover_letter(request).streaming_content)
+        pings = [n for n, chunk in enumerate(chunks) if chunk == HEARTBEAT.encode()]
+        self.assertGreaterEqual(len(pings), 2)
+        self.assertLess(pings[0], 3)  # sent while the model was still waiting for its first token
+        events = [json.loads(data) for _, data in parse_sse(chunks)]
+        self.assertIn("structured_data", [event["type"] for event in events])
+        self.assertNotIn("error", [event["type"] for event in events])
+
+    @override_settings(SSE_STREAM={"gzip": True})
+    def test_gzip_needs_the_client_to_accept_it(self):
+        request = RequestFactory().post("/api/genrate-cover-letter", self.payload(), content_type="application/json")
+        response = views.generate_cover_letter(request)
+        chunks = list(response.streaming_content)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        self.assertEqual(parse_sse(chunks)[0][0], "1")
+
+
+class SSEWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+
+    def writer(self, **options):
+        return SSEWriter(clock=lambda: self.now, **options)
+
+    def test_frames_are_numbered_and_progress_is_coalesced(self):
+        writer = self.writer(progress_interval=0.1)
+        progress = [emit_sse({"type": "progress", "percent": p, "message": ""}) for p in (1, 2, 3, 4)]
+        chunks = [writer.write([progress[0]])]
+        self.now = 0.05
+        chunks.append(writer.write([progress[1]]))
+        chunks.append(writer.write([progress[2]]))
+        self.assertEqual(chunks[1:], [b"", b""])
+        chunks.append(writer.write([emit_sse({"type": "cover_letter_delta", "text": "Hi"})]))
+        self.now = 0.2
+        chunks.append(writer.write([progress[3], emit_sse({"type": "done"})]))
+
+        events = [(event_id, json.loads(data)) for event_id, data in parse_sse(chunks)]
+        self.assertEqual([event_id for event_id, _ in events], ["1", "2", "3", "4"])
+        self.assertEqual([event.get("percent", event["type"]) for _, event in events], [1, "cover_letter_delta", 4, "done"])
+
+    def test_held_back_progress_is_sent_on_close(self):
+        writer = self.writer(progress_interval=1)
+        writer.write([emit_sse({"type": "progress", "percent": 10, "message": ""})])
+        writer.write([emit_sse({"type": "progress", "percent": 100, "message": ""})])
+        self.assertEqual(json.loads(parse_sse([writer.close()])[0][1])["percent"], 100)
+
+    def test_heartbeat_after_idle_period(self):
+        writer = self.writer(heartbeat=15)
+        self.now = 10
+        self.assertEqual(writer.write([]), b"")
+        self.assertEqual(writer.heartbeat_in(), 5)
+        self.now = 15
+        self.assertEqual(writer.write([]), HEARTBEAT.encode())
+        self.assertEqual(writer.write([]), b"")
+
+    def test_gzip_chunks_decode_as_they_arrive(self):
+        writer = self.writer(compress=True)
+        self.assertEqual(writer.headers["Content-Encoding"], "gzip")
+        decoder = zlib.decompressobj(31)
+        for n in range(3):
+            chunk = writer.write([emit_sse({"type": "cover_letter_delta", "text": f"word {n}"})])
+            self.assertIn(f"word {n}".encode(), decoder.decompress(chunk))
+        decoder.decompress(writer.close())
+        self.assertTrue(decoder.eof)
+
+
+STREAM_CHUNKS_DIR = Path(__file__).parent / "testdata" / "stream_chunks"
+
+
+def rescan_proposal(chunks):
+    """The old whole-buffer rescan, as a reference for ProposalScanner."""
+    response = proposal = ""
+    for chunk in chunks:
+        response += chunk
+        if "human_proposal_text" in response and "structured_data" not in response:
+            proposal += chunk
+    match = re.search(r"total_word:\s*(\d+)", proposal)
+    return proposal, int(match.group(1)) if match else 0
+
+
+class StreamReplayTests(SimpleTestCase):
+    def recordings(self):
+        for path in sorted(STREAM_CHUNKS_DIR.glob("*.json")):
+            yield path.stem, json.loads(path.read_text())
+
+    def replay(self, chunks):
+        processor = AgentStreamProcessor({})
+        frames = processor.start()
+        for chunk in chunks:
+            frames += processor.feed((AIMessageChunk(content=chunk), {"langgraph_node": "model"}))
+        return processor, [json.loads(frame[len("data: "):]) for frame in frames]
+
+    def test_replays_recorded_streams(self):
+        for name, recording in self.recordings():
+            with self.subTest(name):
+                expected = recording["expected"]
+                processor, events = self.replay(recording["chunks"])
+                types = [event["type"] for event in events]
+                self.assertEqual(types.count("cover_letter_done"), 1)
+                self.assertEqual(types.count("done"), 1)
+                done = next(event for event in events if event["type"] == "cover_letter_done")
+                self.assertEqual(done["content"], expected["cover_letter"])
+                self.assertEqual(processor.scanner.total_word, expected["total_word"])
+                self.assertEqual(processor.scanner.words, expected["words"])
+
+                percents = [event["percent"] for event in events if event["type"] == "progress"]
+                self.assertEqual(percents, sorted(set(percents)))
+                self.assertEqual(percents[-1], expected["percent"])
+
+    def test_progress_tracks_words_streamed_so_far(self):
+        _, recording = next(self.recordings())
+        chunks = recording["chunks"]
+        _, events = self.replay(chunks)
+        reported = [event["percent"] for event in events if event["type"] == "progress"][1:]
+
+        wanted = []
+        for n in range(1, len(chunks) + 1):
+            proposal, total = rescan_proposal(chunks[:n])
+            if total and "structured_data" not in "".join(chunks[:n]):
+                percent = min(100, len(proposal.split()) * 100 // total)
+                if percent > max(wanted, default=1):
+                    wanted.append(percent)
+        self.assertEqual(reported, wanted)
+
+    def test_chunk_boundaries_do_not_change_the_result(self):
+        for name, recording in self.recordings():
+            text = "".join(recording["chunks"])
+            for size in (1, 2, 5, 17, len(text)):
+                with self.subTest(name, size=size):
+                    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+                    processor, _ = self.replay(chunks)
+                    proposal, total = rescan_proposal(chunks)
+                    scanner = processor.scanner
+                    self.assertEqual(scanner.state, scanner.STRUCTURED)
+                    self.assertEqual(scanner.proposal_text, proposal)
+                    self.assertEqual(scanner.total_word, total)
+                    self.assertEqual(scanner.words, len(proposal.split()))
+
+
+class JsonFieldStreamReaderTests(SimpleTestCase):
+    DOCUMENT = json.dumps({
+        "structured_data": {"human_proposal_text": "nested, not this one"},
+        "note": "human_proposal_text",
+        "human_proposal_text": 'Line one\n"Quoted" \\ path/to café \U0001F680 done\ttab',
+        "tail": [1, {"x": "}"}],
+    })
+
+    def read(self, chunks):
+        reader = JsonFieldStreamReader("human_proposal_text")
+        return reader, [reader.feed(chunk) for chunk in chunks]
+
+    def test_decodes_the_field_at_any_chunk_size(self):
+        expected = json.loads(self.DOCUMENT)["human_proposal_text"]
+        for size in (1, 2, 3, 5, 8, len(self.DOCUMENT)):
+            with self.subTest(size=size):
+                chunks = [self.DOCUMENT[i:i + size] for i in range(0, len(self.DOCUMENT), size)]
+                reader, deltas = self.read(["Sure, here it is: "] + chunks)
+                self.assertEqual("".join(deltas), expected)
+                self.assertEqual(reader.text, expected)
+                self.assertTrue(reader.done)
+
+    def test_text_is_released_as_soon_as_it_arrives(self):
+        reader, deltas = self.read(['{"human_proposal_text": "Hi th', 'ere\\', 'u00e9', '", "structured_data": {}}'])
+        self.assertEqual(deltas, ["Hi th", "ere", "\u00e9", ""])
+        self.assertTrue(reader.done)
+
+    def test_processor_streams_deltas_without_the_total_word_header(self):
+        recording = json.loads((STREAM_CHUNKS_DIR / "structured_output.json").read_text())
+        processor = AgentStreamProcessor({})
+        events = []
+        for n, chunk in enumerate(recording["chunks"]):
+            for frame in processor.feed((AIMessageChunk(content=chunk), {})):
+                events.append((n, json.loads(frame[len("data: "):])))
+
+        deltas = [(n, event["text"]) for n, event in events if event["type"] == "cover_letter_delta"]
+        cover_letter = recording["expected"]["cover_letter"]
+        self.assertEqual("".join(text for _, text in deltas), re.sub(r"^total_word:\s*\d+\n+", "", cover_letter))
+        self.assertLessEqual(deltas[0][0], 12)  # the first words, not the end of the generation
+        done_at = next(n for n, event in events if event["type"] == "cover_letter_done")
+        self.assertGreaterEqual(done_at, deltas[-1][0])
+
+
+class StructuredFieldReaderTests(SimpleTestCase):
+    def field_events(self, chunks):
+        processor = AgentStreamProcessor({})
+        events = []
+        for n, chunk in enumerate(chunks):
+            for frame in processor.feed((AIMessageChunk(content=chunk, id="run-1"), {})):
+                event = json.loads(frame[len("data: "):])
+                if event["type"] == "structured_field":
+                    events.append((n, event["field"], event["value"]))
+        return events
+
+    def test_fields_match_the_final_structured_data_at_any_chunk_size(self):
+        for path in sorted(STREAM_CHUNKS_DIR.glob("*.json")):
+            recording = json.loads(path.read_text())
+            text = "".join(recording["chunks"])
+            for size in (1, 2, 5, 17, len(text)):
+                with self.subTest(path.stem, size=size):
+                    chunks = [text[i:i + size] for i in range(0, len(text), size)]
+                    events = self.field_events(chunks)
+                    self.assertEqual({field: value for _, field, value in events}, recording["expected"]["structured_data"])
+                    self.assertEqual(len(events), len(recording["expected"]["structured_data"]))
+
+    def test_each_field_is_sent_before_the_stream_ends(self):
+        recording = json.loads((STREAM_CHUNKS_DIR / "structured_output.json").read_text())
+        chunks = recording["chunks"]
+        events = self.field_events(chunks)
+        first_at, first_field, _ = events[0]
+        self.assertEqual(first_field, "greeting")
+        self.assertLess(first_at, len(chunks) - 100)
+        self.assertEqual([n for n, _, _ in events], sorted(n for n, _, _ in events))
+
+    def test_fields_that_do_not_validate_are_skipped(self):
+        reader = StructuredFieldReader()
+        document = json.dumps({
+            "human_proposal_text": "Hi",
+            "structured_data": {
+                "project_type": "redesign",
+                "budget": "fixed",
+                "technical_questions": ["Which CMS?", 3],
+                "job_summary": "Landing page",
+                "required_technologies": {"Frontend": ["React"]},
+            },
+        })
+        completed = [pair for ch in document for pair in reader.feed(ch)]
+        self.assertEqual(completed, [("job_summary", "Landing page"), ("required_technologies", {"Frontend": ["React"]})])
+
+
+class JsonExtractionTests(SimpleTestCase):
+    def test_recorded_outputs(self):
+        for path in sorted((Path(__file__).parent / "testdata" / "model_outputs").glob("*.json")):
+            recording = json.loads(path.read_text())
+            text, expected = recording["text"], recording["expected"]
+            with self.subTest(path.stem):
+                if expected is None:
+                    with self.assertRaises(JSONExtractionError):
+                        extract_json_and_span(text)
+                    continue
+                parsed, start, end = extract_json_and_span(text)
+                self.assertEqual(parsed, expected)
+                self.assertEqual(text[start], "{")
+                self.assertEqual(text[end - 1], "}")
+
+    def test_braces_in_prose_before_the_object_are_skipped(self):
+        text = 'Use {name} in templates, not {broken: [1,,]}. {"job_summary": "it\'s {done}"} trailing'
+        parsed, start, end = extract_json_and_span(text)
+        self.assertEqual(parsed, {"job_summary": "it's {done}"})
+        self.assertEqual(text[start:end], '{"job_summary": "it\'s {done}"}')
+
+    def test_repair_leaves_double_quoted_strings_alone(self):
+        fixed = fix_json_like_string("""{summary: "client's store, key: 'x'", tags: ['a', 'b',], note: 'say "hi"',}""")
+        self.assertEqual(json.loads(fixed), {"summary": "client's store, key: 'x'", "tags": ["a", "b"], "note": 'say "hi"'})
+
+
+def chat_graph(saver):
+    builder = StateGraph(MessagesState)
+    builder.add_node("reply", lambda state: {"messages": [AIMessage(f"reply {len(state['messages'])}")]})
+    builder.add_edge(START, "reply")
+    return builder.compile(checkpointer=saver)
+
+
+class CheckpointerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def saver(self, **options):
+        saver = SQLiteCheckpointSaver(self.tmp / "checkpoints.sqlite3", compact_interval=0, **options)
+        self.addCleanup(saver.close)
+        return saver
+
+    def say(self, graph, thread_id, text="hi"):
+        return graph.invoke({"messages": [HumanMessage(text)]}, {"configurable": {"thread_id": thread_id}})
+
+    def history(self, graph, thread_id):
+        return graph.get_state({"configurable": {"thread_id": thread_id}}).values.get("messages", [])
+
+    def test_session_continues_on_another_worker(self):
+        self.say(chat_graph(self.saver()), "t1")
+        other_worker = chat_graph(self.saver())
+        self.assertEqual([m.content for m in self.history(other_worker, "t1")], ["hi", "reply 1"])
+
+        config = {"configurable": {"thread_id": "t1"}}
+        result = asyncio.run(other_worker.ainvoke({"messages": [HumanMessage("again")]}, config))
+        self.assertEqual(result["messages"][-1].content, "reply 3")
+
+    def test_threads_expire_and_least_recently_used_are_evicted(self):
+        saver = self.saver(max_threads=2, ttl=60)
+        graph = chat_graph(saver)
+        self.say(graph, "a")
+        self.say(graph, "b")
+        self.history(graph, "a")  # a is now more recent than b
+        self.say(graph, "c")
+        self.assertEqual(self.history(graph, "b"), [])
+        self.assertEqual(len(self.history(graph, "a")), 2)
+        self.assertEqual(saver.stats()["threads"], 2)
+
+        later = SimpleNamespace(time=lambda: time.time() + 61)
+        with mock.patch("covergen.helpers.checkpointer.time", later):
+            self.assertEqual(self.history(graph, "a"), [])
+            self.assertEqual(saver.compact()["expired_threads"], 1)  # c
+        self.assertEqual(saver.stats()["threads"], 0)
+
+    def test_compaction_keeps_latest_checkpoints_and_state(self):
+        saver = self.saver(keep_checkpoints=1)
+        graph = chat_graph(saver)
+        for text in ("one", "two", "three"):
+            self.say(graph, "t1", text)
+        before = saver.stats()
+
+        result = saver.compact()
+        after = saver.stats()
+        self.assertEqual(after["checkpoints"], 1)
+        self.assertEqual(result["checkpoints"], before["checkpoints"] - 1)
+        self.assertLess(after["blobs"], before["blobs"])
+        self.assertEqual(len(self.history(graph, "t1")), 6)
+        self.assertEqual(self.say(graph, "t1", "four")["messages"][-1].content, "reply 7")
+
+    def test_live_writes_are_not_blocked_while_compaction_reads(self):
+        saver = self.saver(keep_checkpoints=1)
+        graph = chat_graph(saver)
+        self.say(graph, "t1", "one")
+        self.say(graph, "t1", "two")
+        other_worker = chat_graph(self.saver())
+        loads_typed = saver.serde.loads_typed
+        written = []
+
+        def loads_during_compaction(data):
+            if not written:
+                # Another worker writes while the compactor is deserializing checkpoints.
+                written.append(self.say(other_worker, "t2", "meanwhile"))
+            return loads_typed(data)
+
+        with mock.patch.object(saver.serde, "loads_typed", side_effect=loads_during_compaction):
+            started = time.monotonic()
+            saver.compact()
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(len(written), 1)
+        self.assertEqual(len(self.history(graph, "t2")), 2)
+        self.assertEqual(len(self.history(graph, "t1")), 4)
+
+    def test_one_worker_compacts_per_interval(self):
+        first = SQLiteCheckpointSaver(self.tmp / "checkpoints.sqlite3", compact_interval=300)
+        self.addCleanup(first.close)
+        second = self.saver()
+        self.say(chat_graph(second), "t1")
+
+        self.assertNotIn("skipped", first.compact())
+        self.assertTrue(second.compact()["skipped"])
+        self.assertNotIn("skipped", first.compact())  # the lease holder itself may run again
+
+        later = SimpleNamespace(time=lambda: time.time() + 301)
+        with mock.patch("covergen.helpers.checkpointer.time", later):
+            self.assertNotIn("skipped", second.compact())
+
+
+class CountingFakeEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic local embeddings that remember how many texts they embedded."""
+
+    embedded: int = 0
+    queries: int = 0
+    requests: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        self.requests += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class FlakyFakeEmbeddings(CountingFakeEmbeddings):
+    """Fails the first `rate_limits` calls with a 429, then the call numbered `fail_on` fatally."""
+
+    calls: int = 0
+    rate_limits: int = 0
+    fail_on: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls <= self.rate_limits:
+            raise RateLimitError("Rate limit reached for requests")
+        if self.calls == self.fail_on:
+            raise RuntimeError("connection reset")
+        return super().embed_documents(texts)
+
+
+class EmbeddingPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.items = [{"hash": f"h{i}", "text": f"project number {i}"} for i in range(10)]
+
+    def test_batches_respect_token_budget(self):
+        items = [{"text": "x", "tokens": 3} for _ in range(7)]
+        self.assertEqual([len(b) for b in make_batches(items, max_tokens=6, max_size=10)], [2, 2, 2, 1])
+        self.assertEqual([len(b) for b in make_batches(items, max_tokens=100, max_size=3)], [3, 3, 1])
+
+    def test_backs_off_on_rate_limit_and_reports_throughput(self):
+        backend = FlakyFakeEmbeddings(size=4, rate_limits=2)
+        pipeline = EmbeddingPipeline(backend, max_workers=1, max_batch_size=5, base_backoff=0.001)
+        vectors = pipeline.run(self.items)
+        self.assertEqual(len(vectors), 10)
+        self.assertEqual(pipeline.stats["retries"], 2)
+        self.assertEqual(pipeline.stats["rows"], 10)
+        self.assertGreater(pipeline.stats["rows_per_s"], 0)
+
+        pipeline = EmbeddingPipeline(
+            FlakyFakeEmbeddings(size=4, rate_limits=100), max_retries=2, base_backoff=0.001
+        )
+        with self.assertRaises(RateLimitExhausted):
+            pipeline.run(self.items)
+
+    def test_rerun_resumes_from_journal(self):
+        journal = EmbeddingJournal(self.tmp / "journal.jsonl")
+        crashing = FlakyFakeEmbeddings(size=4, fail_on=3)
+        with self.assertRaises(RuntimeError):
+            EmbeddingPipeline(crashing, journal=journal, max_workers=1, max_batch_size=2).run(self.items)
+        checkpointed = len(EmbeddingJournal(journal.path))
+        # Batches before the failure are always journaled; a queued one may also slip through.
+        self.assertGreaterEqual(checkpointed, 4)
+        self.assertLess(checkpointed, 10)
+
+        backend = CountingFakeEmbeddings(size=4)
+        pipeline = EmbeddingPipeline(backend, journal=journal, max_workers=2, max_batch_size=2)
+        vectors = pipeline.run(self.items)
+        self.assertEqual(len(vectors), 10)
+        self.assertEqual(backend.embedded, 10 - checkpointed)
+        self.assertEqual(pipeline.stats["resumed"], checkpointed)
+
+
+class QueryEmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def make_store(self, max_bytes=1024 * 1024):
+        store = QueryEmbeddingStore(self.tmp / "queries.sqlite3", max_bytes=max_bytes)
+        self.addCleanup(store.close)
+        return store
+
+    def test_lru_then_store_then_backend(self):
+        backend = CountingFakeEmbeddings(size=8)
+        store = self.make_store()
+        cached = CachedEmbeddings(backend, store=store, lru_size=2)
+
+        first = cached.embed_query("Shopify  migration custom app")
+        self.assertEqual(cached.embed_query("shopify migration CUSTOM app"), first)
+        self.assertEqual(backend.queries, 1)
+
+        # A fresh process (empty LRU) is served from the shared store.
+        restarted = CachedEmbeddings(CountingFakeEmbeddings(size=8), store=store)
+        self.assertEqual(restarted.embed_query("shopify migration custom app"), first)
+        self.assertEqual(restarted.embeddings.queries, 0)
+
+        stats = cached.stats()
+        self.assertEqual((stats["lru_hits"], stats["misses"]), (1, 1))
+        self.assertEqual(restarted.stats()["store_hits"], 1)
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_keys_include_model_and_store_evicts_by_size(self):
+        store = self.make_store(max_bytes=200)
+        store.put("model-a", "q1", b"x" * 90)
+        store.put("model-a", "q2", b"x" * 90)
+        self.assertIsNone(store.get("model-b", "q1"))
+        store.get("model-a", "q1")  # q1 is now the most recently used
+        store.put("model-a", "q3", b"x" * 90)
+        self.assertIsNotNone(store.get("model-a", "q1"))
+        self.assertIsNone(store.get("model-a", "q2"))
+        self.assertLessEqual(store.size_bytes(), 200)
+
+
+class EmbeddingCoalescerTests(SimpleTestCase):
+    def embed_concurrently(self, embeddings, texts):
+        results, errors = {}, []
+
+        def call(text):
+            try:
+                results[text] = embeddings.embed_query(text)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call, args=(t,)) for t in texts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=5)
+        return results, errors
+
+    def test_concurrent_queries_share_one_request(self):
+        backend = CountingFakeEmbeddings(size=8)
+        coalescer = EmbeddingCoalescer(backend, max_wait_ms=200, max_batch=10)
+        texts = [f"query {i}" for i in range(8)]
+
+        results, errors = self.embed_concurrently(coalescer, texts)
+        self.assertEqual(errors, [])
+        for text in texts:
+            self.assertEqual(results[text], backend.embed_query(text))
+        self.assertLessEqual(coalescer.stats["requests"], 2)
+        self.assertEqual(coalescer.stats["queries"], 8)
+
+    @override_settings(QUERY_EMBEDDING_BATCH={"max_wait_ms": 200, "max_batch": 32}, QUERY_EMBEDDING_CACHE={})
+    def test_concurrent_searches_share_backend_requests(self):
+        backend = CountingFakeEmbeddings(size=16)
+        with mock.patch("covergen.rag_vectors._embedding_backend", backend), \
+                mock.patch("covergen.rag_vectors._query_embeddings", None):
+            embeddings = rag_vectors.get_query_embeddings()
+            project_index = make_project_index(
+                [{"page_content": f"Project {i}"} for i in range(20)], embeddings=embeddings,
+            )
+            backend.requests = 0
+            results, errors = {}, []
+
+            def search(query):
+                try:
+                    results[query] = project_index.search_ranked(query)
+                except Exception as e:
+                    errors.append(e)
+
+            queries = [f"search {i}" for i in range(16)]
+            threads = [threading.Thread(target=search, args=(q,)) for q in queries]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(timeout=5)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 16)
+        self.assertLessEqual(backend.requests, 2)
+        self.assertEqual(embeddings.embeddings.stats["queries"], 16)
+
+    def test_batch_failure_reaches_every_caller(self):
+        backend = FlakyFakeEmbeddings(size=8, rate_limits=1)
+        coalescer = EmbeddingCoalescer(backend, max_wait_ms=200, max_batch=3)
+        _, errors = self.embed_concurrently(coalescer, ["a", "b", "c"])
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(e, RateLimitError) for e in errors))
+
+
+class IndexProjectVectorsTests(TestCase):
+    HEADER = "Project_URL,Categories,Technology,Priority\n"
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        # Snapshots, journals and the query cache all live under this run's temp dir.
+        index_dir = self.tmp / "project_index"
+        overrides = override_settings(
+            PROJECT_INDEX_DIR=index_dir,
+            EMBEDDING_JOURNAL_PATH=index_dir / "embedding_journal.jsonl",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.csv_path = self.tmp / "projects.csv"
+        self.embeddings = CountingFakeEmbeddings(size=8)
+
+    def run_command(self, csv_text, *args):
+        self.csv_path.write_text(self.HEADER + csv_text, encoding="utf-8")
+        out = StringIO()
+        with mock.patch(f"{INDEX_COMMAND}.CSV_FILE_PATH", self.csv_path), \
+                mock.patch(f"{INDEX_COMMAND}.make_embeddings", return_value=self.embeddings):
+            call_command("index_project_vectors", *args, stdout=out)
+        return out.getvalue()
+
+    def test_only_new_or_changed_rows_are_embedded(self):
+        self.run_command("https://a.com/,Ecommerce,Shopify,5\nhttps://b.com/,CMS,Wordpress,3\n")
+        self.assertEqual(self.embeddings.embedded, 2)
+
+        output = self.run_command("https://b.com/,CMS,Wordpress,4\nhttps://c.com/,CMS,Wix,2\n")
+        self.assertIn("added=1 changed=1 removed=1 unchanged=0", output)
+        self.assertEqual(self.embeddings.embedded, 4)
+        self.assertEqual(
+            sorted(ProjectVector.objects.values_list("project_key", flat=True)),
+            ["https://b.com/", "https://c.com/"],
+        )
+        self.assertEqual(ProjectVector.objects.get(project_key="https://c.com/").title, "c.com")
+
+    def test_embedding_runs_outside_the_write_transaction(self):
+        command_connection = connections["default"]  # this thread's; embedding runs on pool threads
+        baseline = len(command_connection.atomic_blocks)  # TestCase's own transactions
+        depths = []
+        embed_documents = self.embeddings.embed_documents
+
+        def record_depth(texts):
+            depths.append(len(command_connection.atomic_blocks))
+            return embed_documents(texts)
+
+        with mock.patch.object(CountingFakeEmbeddings, "embed_documents", side_effect=record_depth):
+            self.run_command("https://a.com/,Ecommerce,Shopify,5\nhttps://b.com/,CMS,Wordpress,3\n")
+        self.assertTrue(depths)
+        self.assertEqual(set(depths), {baseline})
+        self.assertEqual(ProjectVector.objects.count(), 2)
+
+    def test_finishing_a_run_keeps_other_catalogs_journals(self):
+        base = Path(settings.EMBEDDING_JOURNAL_PATH)
+        other = EmbeddingJournal(base.with_name(f"{base.stem}.agency-b{base.suffix}"))
+        other.append({"openai:x|hash": b"\x00" * 32})
+
+        self.run_command("https://a.com/,Ecommerce,Shopify,5\n")
+        self.assertIn("openai:x|hash", EmbeddingJournal(other.path))
+        self.assertFalse(base.with_name(f"{base.stem}.default{base.suffix}").exists())
+
+    def test_changing_embedding_model_re_embeds_everything(self):
+        csv_text = "https://a.com/,Ecommerce,Shopify,5\nhttps://b.com/,CMS,Wordpress,3\n"
+        self.run_command(csv_text)
+        self.assertEqual(set(ProjectVector.objects.values_list("embedding_model", flat=True)),
+                         {"openai:text-embedding-ada-002"})
+
+        with override_settings(EMBEDDING_BACKEND={"type": "local", "model": "all-MiniLM-L6-v2", "onnx": False}):
+            output = self.run_command(csv_text)
+            self.assertIn("added=0 changed=2 removed=0 unchanged=0", output)
+            self.assertEqual(self.embeddings.embedded, 4)
+            self.assertEqual(set(ProjectVector.objects.values_list("embedding_model", flat=True)),
+                             {"local:all-MiniLM-L6-v2"})
+            self.assertEqual(load_snapshot().manifest["embedding_model"], "local:all-MiniLM-L6-v2")
+
+        # Back on the old settings, the stored vectors no longer match.
+        with self.assertRaises(EmbeddingModelMismatch):
+            check_embedding_model()
+
+    @override_settings(EMBEDDING_BACKEND={"type": "local", "model": "all-MiniLM-L6-v2"})
+    def test_local_backend_without_sentence_transformers_is_a_config_error(self):
+        with mock.patch.dict(sys.modules, {"sentence_transformers": None}):
+            with self.assertRaisesRegex(ImproperlyConfigured, "sentence-transformers"):
+                make_embeddings()
+
+    def test_catalogs_are_indexed_independently(self):
+        self.run_command("https://a.com/,Ecommerce,Shopify,5\n")
+        output = self.run_command("https://a.com/,CMS,Wix,2\nhttps://x.com/,CMS,Wix,2\n", "--catalog", "agency-x")
+        self.assertIn("added=2 changed=0 removed=0 unchanged=0", output)
+
+        self.assertEqual(ProjectVector.objects.filter(catalog="default").count(), 1)
+        self.assertEqual(ProjectVector.objects.filter(catalog="agency-x").count(), 2)
+        snapshot = load_snapshot(root=settings.PROJECT_INDEX_DIR / "catalogs" / "agency-x")
+        self.assertEqual(len(snapshot.rows), 2)
+        self.assertEqual(len(load_snapshot().rows), 1)
+
+    def test_generate_rejects_unknown_catalogs_before_loading_them(self):
+        self.run_command("https://a.com/,CMS,Wix,2\n", "--catalog", "agency-x")
+        self.assertTrue(rag_vectors.catalog_exists("agency-x"))
+
+        body = json.dumps({"session_id": "s", "client_text": "Shopify store", "catalog": "agency-y"})
+        request = RequestFactory().post("/api/genrate-cover-letter", body, content_type="application/json")
+        response = views.generate_cover_letter(request)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("agency-y", json.loads(response.content)["error"])
+        self.assertNotIn("agency-y", views.retriever_registry.status()["catalogs"])
+
+    def test_dry_run_reports_without_writing(self):
+        self.run_command("https://a.com/,Ecommerce,Shopify,5\n")
+        output = self.run_command("https://a.com/,Ecommerce,Shopify,5\nhttps://a.com/,CMS,Wix,2\n", "--dry-run")
+        self.assertIn("added=1 changed=0 removed=0 unchanged=1", output)
+        self.assertEqual(ProjectVector.objects.count(), 1)
+        self.assertEqual(self.embeddings.embedded, 1)
+
+    def test_streams_csv_in_chunks_from_custom_path(self):
+        other_csv = self.tmp / "other.csv"
+        other_csv.write_text(
+            self.HEADER + "".join(f"https://p{i}.com/,CMS,Wix,{i}\n" for i in range(5)),
+            encoding="utf-8",
+        )
+        self.run_command("https://old.com/,CMS,Wix,1\n")
+
+        output = self.run_command("", "--csv", str(other_csv), "--chunk-size", "2")
+        self.assertIn("added=5 changed=0 removed=1 unchanged=0", output)
+        self.assertEqual(ProjectVector.objects.count(), 5)
+        self.assertEqual(
+            list(ProjectVector.objects.order_by("row_index").values_list("row_index", flat=True)),
+            [0, 1, 2, 3, 4],
+        )
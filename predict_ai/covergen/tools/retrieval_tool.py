@@ -1,52 +1,119 @@
-from ..rag_vectors import get_project_retriever
+from typing import List, Optional
+
+from django.conf import settings
+
+from ..helpers.embedding_pipeline import count_tokens
+from ..helpers.tool_cache import DEFAULT_MAX_THREADS, DEFAULT_TTL, ToolResultCache, query_key
+from ..rag_vectors import find_ranked_projects_many, project_url
+from langchain.tools import ToolRuntime
 from langchain_core.tools import tool
 
-@tool
-def find_relevant_past_projects(query: str) -> str:
+RESULT_SEPARATOR = "\n\n---\n\n"
+NO_RESULTS = "No relevant past projects found in the database."
+
+_cache_config = getattr(settings, "PROJECT_TOOL_CACHE", {}) or {}
+# Memoized tool results per conversation thread (cleared by the view at the start of each request).
+project_search_cache = ToolResultCache(
+    max_threads=_cache_config.get("max_threads", DEFAULT_MAX_THREADS),
+    ttl=_cache_config.get("ttl", DEFAULT_TTL),
+)
+
+
+def format_project(position: int, metadata: dict, with_summary: bool = True) -> str:
+    """One result block from the fields precomputed at index time (no page_content parsing)."""
+    url = metadata.get("url") or project_url(metadata.get("project_key") or "")
+    parts = [f"Result {position}:", f"- URL: {url}"]
+    if metadata.get("title"):
+        parts.append(f"- Title: {metadata['title']}")
+    if metadata.get("short_description"):
+        parts.append(f"- Description: {metadata['short_description']}")
+    if with_summary and metadata.get("summary"):
+        parts.append(f"- Summary: {metadata['summary']}")
+    return "\n".join(parts)
+
+
+def format_projects(docs, token_budget: int) -> str:
     """
-    Search the stored project vectors for projects relevant to the query.
-    Returns a concise formatted string of the top 3 most relevant matches
-    (URL + short summary) for the agent to use.
+    Join result blocks until the token budget is spent. A block that does not
+    fit is retried without its Summary line; the first result is always kept.
     """
-    print(f"--- RAG Tool Called with Query: {query} ---")
-    
-    try:
-        retriever = get_project_retriever()
-        # Retriever already handles similarity search.
-        retrieved_docs = retriever.invoke(query)
-    except Exception as e:
-        return f"Error while retrieving projects: {e}"
+    blocks, used = [], 0
+    for position, doc in enumerate(docs, start=1):
+        for with_summary in (True, False):
+            block = format_project(position, doc.metadata, with_summary)
+            cost = count_tokens(block) + (count_tokens(RESULT_SEPARATOR) if blocks else 0)
+            if used + cost <= token_budget:
+                break
+        else:
+            if blocks:
+                break
+        blocks.append(block)
+        used += cost
+    return RESULT_SEPARATOR.join(blocks)
 
-    if not retrieved_docs:
-        return "No relevant past projects found in the database."
 
-    # Only keep the top 3 results to avoid noise
-    top_docs = retrieved_docs[:3]
+def thread_id_from(config) -> Optional[str]:
+    return ((config or {}).get("configurable") or {}).get("thread_id")
 
-    formatted_results = []
-    for i, doc in enumerate(top_docs, start=1):
-        content = (doc.page_content or "").strip()
 
-        # Try to extract URL from the content if you embed it like "URL: https://..."
-        url = None
-        for segment in content.split(" | "):
-            seg = segment.strip()
-            if seg.lower().startswith("url:"):
-                url = seg[4:].strip()
-                break
+def answer_queries(queries: List[str], categories=None, catalog: Optional[str] = None) -> List[str]:
+    """Formatted tool results for several queries, from one batched search."""
+    budget = getattr(settings, "PROJECT_TOOL_TOKEN_BUDGET", 300)
+    # Fetches candidates, reranks by similarity + priority and dedupes by URL.
+    ranked = find_ranked_projects_many(queries, categories=categories, catalog=catalog)
+    return [format_projects(docs, budget) if docs else NO_RESULTS for docs in ranked]
+
 
-        # Shorten very long text – we just want a compact summary for the agent
-        max_len = 600
-        if len(content) > max_len:
-            content = content[:max_len].rsplit(" ", 1)[0] + "..."
+def prefetch_project_searches(thread_id: Optional[str], queries: List[str], categories=None,
+                              catalog: Optional[str] = None) -> int:
+    """
+    Answer several pending tool calls (e.g. parallel calls from one model
+    turn) with a single batched search and memoize them for the thread.
+    Returns how many searches were run.
+    """
+    if not thread_id:
+        return 0
+    pending = {}
+    for query in queries:
+        key = query_key(query, categories, catalog)
+        if key not in pending and (thread_id, key) not in project_search_cache:
+            pending[key] = query
+    if not pending:
+        return 0
+    for key, result in zip(pending, answer_queries(list(pending.values()), categories, catalog)):
+        project_search_cache.put(thread_id, key, result)
+    return len(pending)
 
-        parts = [f"Result {i}:"]
-        if url:
-            parts.append(f"- URL: {url}")
-        parts.append(f"- Summary: {content}")
 
-        formatted_results.append("\n".join(parts))
+@tool
+def find_relevant_past_projects(query: str, runtime: ToolRuntime) -> str:
+    """
+    Search the stored project vectors for projects relevant to the query.
+    Returns a concise formatted string of the top 3 matches, already ranked
+    by relevance and priority (URL, title and short description), for the agent to use.
+    """
+    print(f"--- RAG Tool Called with Query: {query} ---")
+
+    # Categories the user ticked in the UI narrow the search before the vector lookup.
+    state = runtime.state or {}
+    categories = state.get("categories") or []
+    # Which agency's portfolio to search (None -> the default catalog).
+    catalog = state.get("catalog") or None
+
+    # Repeated / reworded queries in this conversation (and parallel calls
+    # batched by prefetch_project_searches) are answered from the memo.
+    thread_id = thread_id_from(runtime.config)
+    key = query_key(query, categories, catalog)
+    cached = project_search_cache.get(thread_id, key)
+    if cached is not None:
+        print("--- RAG Tool answered from memo ---")
+        return cached
+
+    try:
+        result = answer_queries([query], categories, catalog)[0]
+    except Exception as e:
+        return f"Error while retrieving projects: {e}"
 
-    print(f"--- RAG Tool Returned {len(top_docs)} Relevant Projects ---")
-    print(top_docs)
-    return "\n\n---\n\n".join(formatted_results)
+    project_search_cache.put(thread_id, key, result)
+    print(f"--- RAG Tool Returned ({count_tokens(result)} tokens) ---")
+    return result
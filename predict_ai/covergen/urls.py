@@ -1,4 +1,5 @@
 # chat/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
@@ -6,6 +7,11 @@ urlpatterns = [
     # page
     path("", views.index, name="home"),
     path("proposal-generator", views.chatbot_view, name="coverletter_chatbot"),
-    path("api/genrate-cover-letter", views.generate_cover_letter, name="chat_stream")
+    path(
+        "api/genrate-cover-letter",
+        views.agenerate_cover_letter if getattr(settings, "ASYNC_GENERATE", False) else views.generate_cover_letter,
+        name="chat_stream",
+    ),
+    path("api/index-status", views.index_status, name="index_status"),
 
 ]
@@ -0,0 +1,464 @@
+"""
+On-disk FAISS snapshots of the project catalog.
+
+Layout under settings.PROJECT_INDEX_DIR:
+
+    CURRENT                  -> name of the live snapshot, e.g. "gen-000004"
+    gen-000004/
+        index.faiss          -> serialized FAISS index (row i == rows[i]); with
+                                truncate_dim / quantize only the compact codes
+        vectors.npy          -> full-precision rows for exact rescoring (compact
+                                indexes only; memory-mapped, read per candidate)
+        rows.json            -> row position -> {"project_key", "row_index", "page_content",
+                                "categories", "technologies", "priority", "url", "title",
+                                "summary", "short_description", "created_at"}
+        manifest.json        -> format version, generation, dim, count, embedding
+                                model, DB fingerprint and sha256 of the files above
+
+The default catalog uses that layout at the root; every other catalog has
+its own copy under catalogs/<name>/.
+
+Snapshots are written to a temp dir and renamed into place, then CURRENT is
+swapped with os.replace, so readers never see a half-written generation.
+Workers open the index memory-mapped and read-only, so its pages live in the
+OS page cache once and are shared by every process on the host.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import faiss
+import numpy as np
+from django.conf import settings
+
+FORMAT_VERSION = 5
+INDEX_FILE = "index.faiss"
+ROWS_FILE = "rows.json"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+KEEP_GENERATIONS = 2
+
+# Map flat codes (Flat, HNSW storage) straight from the file instead of copying
+# them to the heap. IVF inverted lists are still read into memory.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class Snapshot:
+    """A loaded snapshot: the (memory-mapped) index plus its row table."""
+
+    def __init__(self, index, rows: List[dict], manifest: dict, path: Path):
+        self.index = index
+        self.rows = rows
+        self.manifest = manifest
+        self.path = path
+
+    @property
+    def generation(self) -> int:
+        return self.manifest["generation"]
+
+
+def index_dir() -> Path:
+    return Path(getattr(settings, "PROJECT_INDEX_DIR", settings.BASE_DIR / "project_index"))
+
+
+DEFAULT_CATALOG = "default"
+CATALOG_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+
+def catalog_name(value: Optional[str] = None) -> str:
+    """Validated catalog key (lowercase slug); blank means the default catalog."""
+    name = (value or "").strip().lower() or DEFAULT_CATALOG
+    if not CATALOG_NAME_RE.match(name):
+        raise ValueError(f"Invalid catalog name {value!r}: use lowercase letters, digits, '-' and '_'")
+    return name
+
+
+def catalog_dir(catalog: str = DEFAULT_CATALOG, root: Optional[Path] = None) -> Path:
+    root = root or index_dir()
+    return root if catalog == DEFAULT_CATALOG else root / "catalogs" / catalog
+
+
+# settings.PROJECT_INDEX_BACKEND is merged over these.
+DEFAULT_BACKEND = {
+    "type": "flat",        # "flat" (exact), "hnsw" or "ivf"
+    "hnsw_m": 32,          # HNSW graph degree (build time)
+    "ef_construction": 200,
+    "ef_search": 64,       # HNSW search breadth (query time)
+    "nlist": None,         # IVF list count (build time); None -> ~4*sqrt(n)
+    "nprobe": 8,           # IVF lists scanned per query (query time)
+    # Compact first pass (build time); exact rescoring against full vectors on disk.
+    "truncate_dim": None,  # keep only the first N dimensions (Matryoshka-style)
+    "quantize": None,      # None or "int8" (8-bit scalar quantization)
+    "rescore": 4,          # first pass fetches k * rescore candidates (query time)
+}
+BACKEND_TYPES = ("flat", "hnsw", "ivf")
+QUANTIZERS = (None, "int8")
+
+
+def index_backend(overrides: Optional[dict] = None) -> dict:
+    backend = {**DEFAULT_BACKEND, **getattr(settings, "PROJECT_INDEX_BACKEND", {}), **(overrides or {})}
+    if backend["type"] not in BACKEND_TYPES:
+        raise ValueError(f"Unknown PROJECT_INDEX_BACKEND type {backend['type']!r}; use one of {BACKEND_TYPES}")
+    if backend["quantize"] not in QUANTIZERS:
+        raise ValueError(f"Unknown PROJECT_INDEX_BACKEND quantize {backend['quantize']!r}; use one of {QUANTIZERS}")
+    return backend
+
+
+def is_compact(backend: dict) -> bool:
+    return bool(backend["truncate_dim"] or backend["quantize"])
+
+
+def compact_vectors(matrix: np.ndarray, truncate_dim: Optional[int]) -> np.ndarray:
+    """First `truncate_dim` dimensions, re-normalized to unit length (no-op without truncation)."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if not truncate_dim or truncate_dim >= matrix.shape[1]:
+        return matrix
+    head = np.ascontiguousarray(matrix[:, :truncate_dim])
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    return head / np.maximum(norms, 1e-12)
+
+
+class RescoringIndex:
+    """
+    Compact first-pass index (truncated and/or int8) plus the full-precision
+    vectors. search() takes k * rescore candidates from the compact index and
+    re-ranks them by exact L2 distance, so results and distances match a flat
+    index as long as the true neighbours survive the first pass.
+
+    `vectors` may be an np.memmap: only the candidate rows are read from disk.
+    """
+
+    def __init__(self, compact, vectors, truncate_dim: Optional[int], rescore: int):
+        self.compact = compact
+        self._chunks = [vectors] if isinstance(vectors, np.ndarray) else list(vectors)
+        self.truncate_dim = truncate_dim
+        self.rescore = rescore
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    @property
+    def ntotal(self) -> int:
+        return self.compact.ntotal
+
+    @property
+    def d(self) -> int:
+        return self._chunks[0].shape[1]
+
+    def add(self, matrix: np.ndarray) -> None:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.compact.add(compact_vectors(matrix, self.truncate_dim))
+        self._chunks.append(matrix)
+
+    def search(self, queries: np.ndarray, k: int, params=None):
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        first_k = min(self.ntotal, max(k, k * self.rescore))
+        _, candidates = self.compact.search(compact_vectors(queries, self.truncate_dim), first_k, params=params)
+
+        vectors = self.vectors
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, query in enumerate(queries):
+            ids = np.sort(candidates[i][candidates[i] >= 0])
+            if not len(ids):
+                continue
+            exact = ((np.asarray(vectors[ids]) - query) ** 2).sum(axis=1)
+            order = np.argsort(exact, kind="stable")[:k]
+            distances[i, :len(order)] = exact[order]
+            positions[i, :len(order)] = ids[order]
+        return distances, positions
+
+
+def ivf_nlist(backend: dict, ntotal: int) -> int:
+    nlist = backend["nlist"] or int(4 * np.sqrt(max(ntotal, 1)))
+    # Every list needs at least one training point.
+    return max(1, min(nlist, ntotal))
+
+
+def build_index(matrix: np.ndarray, backend: Optional[dict] = None, ntotal: Optional[int] = None):
+    """
+    Build an L2 index over `matrix` with the configured backend. All of them
+    use the same metric as LangChain's default exact FAISS index.
+
+    `ntotal` is the final row count when more rows will be add()ed later;
+    IVF sizes its lists from it and trains on `matrix`.
+
+    With `truncate_dim` / `quantize` set, returns a RescoringIndex whose
+    first pass runs on the compact vectors.
+    """
+    backend = index_backend(backend)
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if not is_compact(backend):
+        return _build_faiss_index(matrix, backend, ntotal)
+
+    compact = _build_faiss_index(compact_vectors(matrix, backend["truncate_dim"]), backend, ntotal)
+    index = RescoringIndex(compact, matrix, backend["truncate_dim"], backend["rescore"])
+    apply_search_params(index, backend)
+    return index
+
+
+def _build_faiss_index(matrix: np.ndarray, backend: dict, ntotal: Optional[int]):
+    dim = matrix.shape[1]
+    codes = "SQ8" if backend["quantize"] == "int8" else "Flat"
+
+    if backend["type"] == "hnsw":
+        if codes == "Flat":
+            index = faiss.IndexHNSWFlat(dim, backend["hnsw_m"])
+        else:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, backend["hnsw_m"])
+        index.hnsw.efConstruction = backend["ef_construction"]
+    elif backend["type"] == "ivf":
+        nlist = ivf_nlist(backend, ntotal or matrix.shape[0])
+        index = faiss.index_factory(dim, f"IVF{nlist},{codes}")
+    elif codes == "Flat":
+        index = faiss.IndexFlatL2(dim)
+    else:
+        index = faiss.index_factory(dim, codes)
+
+    # IVF learns its lists, SQ8 its per-dimension value ranges.
+    if not index.is_trained:
+        index.train(matrix)
+    index.add(matrix)
+    apply_search_params(index, backend)
+    return index
+
+
+def index_nbytes(index) -> int:
+    """Approximate memory a loaded index occupies: vector codes, HNSW links and IVF ids."""
+    if index is None:
+        return 0
+    if isinstance(index, RescoringIndex):
+        # Memory-mapped full vectors are only paged in per candidate.
+        full = 0 if isinstance(index.vectors, np.memmap) else index.vectors.nbytes
+        return index_nbytes(index.compact) + full
+    codes = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+    try:
+        code_size = codes.sa_code_size()
+    except RuntimeError:
+        code_size = index.d * 4
+    size = code_size * index.ntotal
+    if isinstance(index, faiss.IndexHNSW):
+        size += index.hnsw.neighbors.size() * 4
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        size += index.ntotal * 8 + ivf.nlist * index.d * 4
+    return size
+
+
+def apply_search_params(index, backend: dict) -> None:
+    """Query-time knobs; applied on every load so they can be tuned without re-indexing."""
+    if isinstance(index, RescoringIndex):
+        index.rescore = backend["rescore"]
+        index = index.compact
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = backend["ef_search"]
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = backend["nprobe"]
+
+
+def search_index(index, queries: np.ndarray, k: int, ids: Optional[np.ndarray] = None):
+    """
+    index.search(), optionally restricted to row positions `ids` (pre-filtering
+    inside FAISS, so only matching rows are scored). Returns (distances, positions).
+    """
+    if ids is None:
+        return index.search(queries, k)
+
+    selector = faiss.IDSelectorBatch(np.ascontiguousarray(ids, dtype=np.int64))
+    base = index.compact if isinstance(index, RescoringIndex) else index
+    if isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    elif faiss.try_extract_index_ivf(base) is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=faiss.try_extract_index_ivf(base).nprobe)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # `selector` must stay referenced until the search returns.
+    result = index.search(queries, k, params=params)
+    del selector
+    return result
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def current_generation(root: Optional[Path] = None) -> int:
+    """Generation number CURRENT points at, or 0 when there is no snapshot."""
+    root = root or index_dir()
+    try:
+        name = (root / CURRENT_FILE).read_text().strip()
+    except FileNotFoundError:
+        return 0
+    try:
+        return int(name.split("-", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+def pointer_token(root: Optional[Path] = None):
+    """
+    One stat() of CURRENT: changes whenever the indexer swaps in a new
+    generation (os.replace gives the pointer a new inode). None if absent.
+    """
+    root = root or index_dir()
+    try:
+        st = os.stat(root / CURRENT_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns)
+
+
+def _generation_name(generation: int) -> str:
+    return f"gen-{generation:06d}"
+
+
+def write_snapshot(
+    index,
+    rows: List[dict],
+    fingerprint: str,
+    root: Optional[Path] = None,
+    backend: Optional[dict] = None,
+    embedding_model: str = "",
+) -> Path:
+    """
+    Persist `index` + `rows` as the next generation and point CURRENT at it.
+    Returns the snapshot directory.
+    """
+    root = root or index_dir()
+    root.mkdir(parents=True, exist_ok=True)
+
+    generation = current_generation(root) + 1
+    name = _generation_name(generation)
+    tmp_dir = root / f".{name}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    files = [INDEX_FILE, ROWS_FILE]
+    if isinstance(index, RescoringIndex):
+        # Compact codes in index.faiss, full-precision rows for rescoring beside it.
+        faiss.write_index(index.compact, str(tmp_dir / INDEX_FILE))
+        np.save(tmp_dir / VECTORS_FILE, index.vectors)
+        files.append(VECTORS_FILE)
+    else:
+        faiss.write_index(index, str(tmp_dir / INDEX_FILE))
+    with open(tmp_dir / ROWS_FILE, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False)
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "generation": generation,
+        "created_at": time.time(),
+        "count": index.ntotal,
+        "dim": index.d,
+        "db_fingerprint": fingerprint,
+        "backend": index_backend(backend),
+        "embedding_model": embedding_model,
+        "checksums": {file_name: _sha256(tmp_dir / file_name) for file_name in files},
+    }
+    with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    final_dir = root / name
+    os.replace(tmp_dir, final_dir)
+
+    pointer_tmp = root / f".{CURRENT_FILE}.tmp"
+    pointer_tmp.write_text(name)
+    os.replace(pointer_tmp, root / CURRENT_FILE)
+
+    _prune_old_generations(root, keep=KEEP_GENERATIONS)
+    return final_dir
+
+
+def _prune_old_generations(root: Path, keep: int) -> None:
+    """Drop old generations. Workers still mapping them keep their pages until they close."""
+    generations = sorted(p for p in root.glob("gen-*") if p.is_dir())
+    for path in generations[:-keep]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def load_snapshot(
+    fingerprint: Optional[str] = None,
+    root: Optional[Path] = None,
+    backend: Optional[dict] = None,
+    embedding_model: Optional[str] = None,
+) -> Snapshot:
+    """
+    Open the CURRENT snapshot read-only and memory-mapped.
+
+    Raises SnapshotError when it is missing, corrupt, from another format
+    version, built with a different backend type than the one configured,
+    (if `embedding_model` is given) embedded with another model, or (if
+    `fingerprint` is given) built from different DB contents.
+    """
+    backend = index_backend(backend)
+    root = root or index_dir()
+    generation = current_generation(root)
+    if not generation:
+        raise SnapshotError(f"No snapshot found in {root}")
+
+    path = root / _generation_name(generation)
+    try:
+        with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Unreadable manifest in {path}: {e}") from e
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Snapshot format {manifest.get('format_version')} != {FORMAT_VERSION}")
+
+    built = {**DEFAULT_BACKEND, **manifest.get("backend", {})}
+    for param in ("type", "truncate_dim", "quantize"):
+        if built[param] != backend[param]:
+            raise SnapshotError(f"Snapshot was built with {param}={built[param]!r}, settings ask for {backend[param]!r}")
+
+    if embedding_model is not None and manifest.get("embedding_model") != embedding_model:
+        raise SnapshotError(
+            f"Snapshot vectors come from {manifest.get('embedding_model')!r}, settings use {embedding_model!r}"
+        )
+
+    if fingerprint is not None and manifest.get("db_fingerprint") != fingerprint:
+        raise SnapshotError("Snapshot is stale: DB contents changed since it was written")
+
+    for file_name, expected in manifest.get("checksums", {}).items():
+        try:
+            actual = _sha256(path / file_name)
+        except OSError as e:
+            raise SnapshotError(f"Missing snapshot file {file_name}: {e}") from e
+        if actual != expected:
+            raise SnapshotError(f"Checksum mismatch for {file_name}")
+
+    index = faiss.read_index(str(path / INDEX_FILE), MMAP_FLAGS)
+    if is_compact(backend):
+        try:
+            vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        except (OSError, ValueError) as e:
+            raise SnapshotError(f"Unreadable {VECTORS_FILE} in {path}: {e}") from e
+        if len(vectors) != index.ntotal:
+            raise SnapshotError(f"{VECTORS_FILE} and the compact index disagree on size")
+        index = RescoringIndex(index, vectors, backend["truncate_dim"], backend["rescore"])
+    apply_search_params(index, backend)
+    with open(path / ROWS_FILE, encoding="utf-8") as f:
+        rows = json.load(f)
+
+    if index.ntotal != len(rows) or index.ntotal != manifest.get("count"):
+        raise SnapshotError("Snapshot index and row table disagree on size")
+
+    return Snapshot(index, rows, manifest, path)
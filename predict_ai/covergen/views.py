@@ -1,17 +1,23 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from django.http import HttpRequest, JsonResponse,StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import InMemorySaver
-from .helpers.system_prompts import build_system_prompt, build_agent_prompt
-from .helpers.stream_helper import stream_generator
-from .tools.retrieval_tool import find_relevant_past_projects
-from .middlewares.file_middleware import inject_context, state_based_output
+from .helpers.system_prompts import AGENT_SYSTEM_PROMPT, build_system_prompt, build_agent_prompt
+from .helpers.stream_helper import astream_generator, stream_generator
+from .helpers.checkpointer import make_checkpointer
+from .helpers.sse_writer import make_sse_writer
+from .tools.retrieval_tool import find_relevant_past_projects, project_search_cache
+from .rag_vectors import catalog_exists, retriever_registry
+from .vector_index import catalog_name
+from .middlewares.file_middleware import ainject_context, astate_based_output, inject_context, state_based_output
+from .middlewares.retrieval_middleware import batch_project_searches
 from dotenv import load_dotenv
 from langchain.agents import create_agent, AgentState
 import json
+from functools import lru_cache
 from django.conf import settings 
 
 
@@ -19,17 +25,24 @@ CSV_FILE_PATH = settings.BASE_DIR / "active_projects_2025-11-12_15-24-13.csv"
 # LOAD ENV VARIABLE
 load_dotenv()
 
-# Initialize langchain short memory
-checkpointer = InMemorySaver()
+# Conversation memory per session thread (settings.CHECKPOINTER)
+checkpointer = make_checkpointer()
 
 
 class CustomAgentState(AgentState):
     """Custom state with messages + custom fields"""
     categories: list = []
+    catalog: str = ""
     context_snippets: list = []
     base64_string: str = ""
     file_name: str | None = None
 
+
+DEFAULT_CHAT_MODEL = {"model": "gpt-5.1", "temperature": 0.1}
+AGENT_TOOLS = [find_relevant_past_projects]
+AGENT_MIDDLEWARE = [inject_context, state_based_output, batch_project_searches]
+AGENT_ASYNC_MIDDLEWARE = [ainject_context, astate_based_output, batch_project_searches]
+
 def index(request: HttpRequest):
     """Render home page"""
     return render(request, "index.html")
@@ -40,11 +53,53 @@ def chatbot_view(request: HttpRequest):
     return render(request, "coverletter.html")
 
 
-@csrf_exempt
-@require_POST
-def generate_cover_letter(request: HttpRequest):
-    """Handle chat with dual output: JSON structure + formatted response."""
-    
+def index_status(request: HttpRequest):
+    """Health/status of the project index: on-disk vs loaded generation in this worker."""
+    return JsonResponse(retriever_registry.status())
+
+
+def chat_model_config() -> dict:
+    return {**DEFAULT_CHAT_MODEL, **getattr(settings, "CHAT_MODEL", {})}
+
+
+def make_chat_model():
+    return ChatOpenAI(**chat_model_config())
+
+
+def build_agent(model, asynchronous: bool = False):
+    """Agent with the project search tool; `asynchronous` picks the middleware for ainvoke()/astream()."""
+    middleware = AGENT_ASYNC_MIDDLEWARE if asynchronous else AGENT_MIDDLEWARE
+    return create_agent(model=model, tools=AGENT_TOOLS, middleware=middleware, state_schema=CustomAgentState, checkpointer=checkpointer)
+
+
+@lru_cache(maxsize=None)
+def _compiled_agent(model_key: tuple, asynchronous: bool):
+    print(f"--- Compiling agent for {dict(model_key)} (async={asynchronous}) ---")
+    return build_agent(make_chat_model(), asynchronous)
+
+
+def get_agent(asynchronous: bool = False):
+    """
+    The compiled agent for the current configuration, built once per process.
+    The graph, chat client and middleware are shared by every request; all
+    per-request data travels in the state and config (thread_id).
+    """
+    return _compiled_agent(tuple(sorted(chat_model_config().items())), asynchronous)
+
+
+def clear_agents() -> None:
+    """Drop the compiled agents, e.g. after swapping the chat model."""
+    _compiled_agent.cache_clear()
+
+
+def prepare_generation(request: HttpRequest):
+    """
+    Parse a generate request into (config, agent_input), or return a
+    JsonResponse for an invalid request.
+
+    The request's context (categories, snippets, file) goes into the same
+    input as the messages, so the streamed run is the only model pass.
+    """
     # ---- Parse request ----
     payload = json.loads(request.body)
     session_id = payload.get("session_id")
@@ -55,20 +110,27 @@ def generate_cover_letter(request: HttpRequest):
     categories = payload.get("selected_categories")
     base64_string = payload.get("base64_string")
     file_name = payload.get("filename")
+    try:
+        catalog = catalog_name(payload.get("catalog"))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if not catalog_exists(catalog):
+        return JsonResponse({"error": f"Unknown catalog {catalog!r}"}, status=400)
 
     config = {"configurable": {"thread_id": session_id}}
+    # Tool results are memoized per generation only.
+    if session_id:
+        project_search_cache.clear(session_id)
 
     # ---- System prompt (New single-prompt logic) ----
-    from .helpers.system_prompts import AGENT_SYSTEM_PROMPT
-    
     agent_prompt = build_system_prompt(
         base_prompt=AGENT_SYSTEM_PROMPT,
         generation_mode=generation_mode,
     )
 
     state = {
-        "messages": [{"role": "user", "content": "Raed this context and give anser based on"}],  # REQUIRED
         "categories": categories,
+        "catalog": catalog,
         "context_snippets": context_snippets,
         "base64_string": base64_string,
         "file_name": file_name
@@ -82,17 +144,19 @@ def generate_cover_letter(request: HttpRequest):
         base64_string,
         file_name
     )
-    
-    # ---- Create model with BOTH tools ----
-    model = ChatOpenAI(model="gpt-5.1", temperature=0.1)
-    
-    # The agent now has access to both tools
-    tools = [find_relevant_past_projects]
-    
-    agent = create_agent(model=model, tools=tools, middleware=[inject_context, state_based_output], state_schema=CustomAgentState, checkpointer=checkpointer)
-
-    if categories or context_snippets or base64_string:
-        agent.invoke(state, config=config)
+    return config, {**agent_input, **state}
+
+
+@csrf_exempt
+@require_POST
+def generate_cover_letter(request: HttpRequest):
+    """Handle chat with dual output: JSON structure + formatted response."""
+    prepared = prepare_generation(request)
+    if isinstance(prepared, JsonResponse):
+        return prepared
+    config, agent_input = prepared
+    agent = get_agent()
+    writer = make_sse_writer(request)
 
     # ---- Streaming response with dual output ----
     response = StreamingHttpResponse(
@@ -100,9 +164,39 @@ def generate_cover_letter(request: HttpRequest):
             agent=agent,
             agent_input=agent_input,
             config=config,
-            state=state
+            writer=writer,
+        ),
+        content_type="text/event-stream",
+        charset="utf-8",
+        headers=writer.headers,
+    )
+    return response
+
+
+@csrf_exempt
+@require_POST
+async def agenerate_cover_letter(request: HttpRequest):
+    """
+    generate_cover_letter() for ASGI: drives agent.astream() and returns an
+    async StreamingHttpResponse, so an open stream holds no worker thread.
+    Under WSGI Django would buffer the whole async stream; see ASYNC_GENERATE.
+    """
+    # prepare_generation may query the DB (catalog lookup).
+    prepared = await sync_to_async(prepare_generation)(request)
+    if isinstance(prepared, JsonResponse):
+        return prepared
+    config, agent_input = prepared
+    agent = get_agent(asynchronous=True)
+    writer = make_sse_writer(request)
+
+    return StreamingHttpResponse(
+        astream_generator(
+            agent=agent,
+            agent_input=agent_input,
+            config=config,
+            writer=writer,
         ),
         content_type="text/event-stream",
         charset="utf-8",
+        headers=writer.headers,
     )
-    return response
\ No newline at end of file
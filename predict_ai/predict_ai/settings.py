@@ -125,4 +125,129 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CSRF_TRUSTED_ORIGINS = ["http://localhost:8000", "http://127.0.0.1:8000", "https://8db96761babc.ngrok-free.app"]
-CORS_ORIGIN_ALLOW_ALL = True
\ No newline at end of file
+CORS_ORIGIN_ALLOW_ALL = True
+# Shared on-disk FAISS snapshot written by `manage.py index_project_vectors`
+PROJECT_INDEX_DIR = BASE_DIR / "project_index"
+
+# Checkpoint of finished embedding batches; lets an interrupted re-index resume
+EMBEDDING_JOURNAL_PATH = PROJECT_INDEX_DIR / "embedding_journal.jsonl"
+
+# FAISS index type for the project catalog: "flat" (exact), "hnsw" or "ivf".
+# ef_search / nprobe / rescore are applied at load time; changing "type",
+# "truncate_dim" or "quantize" needs a re-index.
+# truncate_dim / quantize ("int8") keep only compact vectors in the index and
+# rescore the top k * rescore candidates against full vectors on disk.
+# Compare backends with `manage.py bench_ann` (add --compact for compression).
+PROJECT_INDEX_BACKEND = {
+    "type": "flat",
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nlist": None,
+    "nprobe": 8,
+    "truncate_dim": None,
+    "quantize": None,
+    "rescore": 4,
+}
+
+# UI category (selected_categories) -> catalog Categories/Technology terms it
+# should match, in addition to any catalog term containing the category name.
+PROJECT_CATEGORY_ALIASES = {
+    "cms": ["wordpress", "woocommerce", "webflow", "wix", "squarespace", "elementor"],
+    "ecommerce": ["shopify", "shopify plus", "bigcommerce", "magento", "magento 2", "woocommerce"],
+    "full stack": ["node js", "react js", "next js", "vue.js", "laravel", "core php", "saas",
+                   "dashboard / admin portal / software / portal"],
+    "mobile app": ["ios", "android", "react native", "flutter"],
+    "ui design": ["figma", "web mockups", "mobile mockups", "mockup designing"],
+}
+# A category-filtered search returning fewer hits than this is topped up unfiltered.
+PROJECT_FILTER_MIN_RESULTS = 3
+
+# Reranking of retrieval candidates inside find_relevant_past_projects:
+# score = cosine * w + priority / priority_scale * w + recency * w
+# (recency is min-max normalized over the candidates).
+PROJECT_RANKING = {
+    "similarity": 0.7,
+    "priority": 0.3,
+    "recency": 0.0,
+    "priority_scale": 10,  # highest priority in the catalog
+    "top_n": 3,        # projects returned to the agent
+    "candidates": 10,  # nearest neighbours fetched before reranking
+}
+
+# Token budget for the text find_relevant_past_projects hands back to the agent.
+PROJECT_TOOL_TOKEN_BUDGET = 300
+
+# Cache for search-query embeddings: in-process LRU, then a SQLite file shared
+# by every worker on the host (set "path" to None to keep only the LRU).
+QUERY_EMBEDDING_CACHE = {
+    "lru_size": 1024,
+    "path": PROJECT_INDEX_DIR / "query_embeddings.sqlite3",
+    "max_bytes": 64 * 1024 * 1024,
+}
+
+# Query embeddings that miss the cache are sent in batches: concurrent tool
+# calls within max_wait_ms (up to max_batch texts) share one API request.
+# max_batch <= 1 disables batching.
+QUERY_EMBEDDING_BATCH = {
+    "max_wait_ms": 5,
+    "max_batch": 32,
+}
+
+# Memo of retrieval tool results per conversation thread (reset every request).
+PROJECT_TOOL_CACHE = {
+    "max_threads": 512,
+    "ttl": 900,  # seconds
+}
+
+# Embedding model for project vectors and search queries (covergen/helpers/embedding_backends.py).
+# "openai" calls the API; "local" runs a sentence-transformers model on CPU, e.g.
+#   {"type": "local", "model": "sentence-transformers/all-MiniLM-L6-v2",
+#    "onnx": True, "onnx_file": "onnx/model_qint8_avx512.onnx"}
+# Changing it requires re-running index_project_vectors (vectors from another model are rejected).
+EMBEDDING_BACKEND = {
+    "type": "openai",
+    "model": "text-embedding-ada-002",
+}
+
+# Load a local embedding model in a background thread when a server process starts.
+EMBEDDING_WARMUP = True
+
+# Memory budget for the per-catalog project indexes a worker keeps loaded;
+# least recently used catalogs are dropped (and reloaded on demand) beyond it.
+PROJECT_INDEX_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Serve the generate endpoint with the async view (agent.astream + async
+# StreamingHttpResponse). Enable when running under an ASGI server, e.g.
+# `uvicorn predict_ai.asgi:application`; under WSGI Django would buffer the
+# whole async stream before sending it.
+ASYNC_GENERATE = False
+
+# Chat model for the proposal agent (ChatOpenAI kwargs). The agent graph is
+# compiled once per distinct configuration and shared by all requests.
+CHAT_MODEL = {"model": "gpt-5.1", "temperature": 0.1}
+
+# Conversation memory of the agent (covergen/helpers/checkpointer.py).
+# "sqlite" keeps sessions in one file shared by all workers on the host,
+# expires threads unused for `ttl` seconds, evicts the least recently used
+# beyond `max_threads` and compacts old checkpoints every `compact_interval`
+# seconds. "memory" is the old per-process, unbounded InMemorySaver.
+CHECKPOINTER = {
+    "type": "sqlite",
+    "path": BASE_DIR / "var" / "checkpoints.sqlite3",
+    "ttl": 24 * 3600,
+    "max_threads": 10_000,
+    "keep_checkpoints": 2,
+    "compact_interval": 300,
+}
+
+# Wire encoding of the generate stream (covergen/helpers/sse_writer.py).
+# Progress frames are coalesced to one per `progress_interval` seconds, a
+# ": ping" comment goes out after `heartbeat` idle seconds so proxies keep the
+# connection open, and with `gzip` the stream is compressed for clients that
+# accept it (flushed after every chunk, so text still arrives live).
+SSE_STREAM = {
+    "progress_interval": 0.1,
+    "heartbeat": 15.0,
+    "gzip": False,
+}
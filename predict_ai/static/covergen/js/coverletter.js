@@ -6,6 +6,8 @@ const sessionId =
   Math.random().toString(36).slice(2, 10) +
   '-' +
   Date.now().toString(36);
+// Portfolio to search, e.g. /coverletter/?catalog=agency-x (server default when absent)
+const catalog = new URLSearchParams(window.location.search).get('catalog') || undefined;
 const clientText = document.getElementById('clientText'),
 urlInput = document.getElementById('urlInput'),
 addUrlBtn = document.getElementById('addUrlBtn'),
@@ -803,6 +805,11 @@ async function startStreaming(payload) {
   let buf = '';
   let bufferedAnalysis = null;
   let bufferedCoverLetter = '';
+  // Cover letter text streamed live (cover_letter_delta); rendered at most once per frame.
+  let liveCoverLetter = '';
+  let liveRenderPending = false;
+  // Analysis fields streamed one at a time (structured_field), shown as they arrive.
+  const streamedAnalysis = {};
 
   while (true) {
     const { done, value } = await reader.read();
@@ -810,17 +817,17 @@ async function startStreaming(payload) {
 
     buf += decoder.decode(value, { stream: true });
 
+    // Events end with a blank line; "id:" lines and ": ping" heartbeat comments carry no data.
+    buf = buf.replace(/\r\n/g, '\n');
     let idx;
-    while ((idx = buf.indexOf('\n')) !== -1) {
-      let chunk = buf.slice(0, idx).trim();
+    while ((idx = buf.indexOf('\n\n')) !== -1) {
+      const chunk = buf.slice(0, idx);
       buf = buf.slice(idx + 2);
 
-      if (!chunk) continue;
-
       const dataLines = chunk
-        .split(/\r?\n/)
+        .split('\n')
         .filter((l) => l.startsWith('data:'))
-        .map((l) => l.replace('data:', '').trim());
+        .map((l) => l.slice(5).replace(/^ /, ''));
 
       if (dataLines.length === 0) continue;
 
@@ -843,14 +850,35 @@ async function startStreaming(payload) {
         // Buffer tokens - don't display yet
         bufferedCoverLetter += obj.content || obj.token || '';
       } else if (obj.type === 'progress') {
-        // Update progress bar
-        const pct = Number(obj.percent) || 0;
-        const msg = obj.message || 'Processing...';
-        setProgress(pct, msg);
+        // Update progress bar (the overlay is gone once text is streaming)
+        if (!liveCoverLetter) {
+          const pct = Number(obj.percent) || 0;
+          const msg = obj.message || 'Processing...';
+          setProgress(pct, msg);
+        }
+      } else if (obj.type === 'cover_letter_delta') {
+        if (!liveCoverLetter) {
+          // First words: swap the progress overlay for the output panel.
+          hideProgress();
+          generateBtn.disabled = true;
+          showOutput();
+        }
+        liveCoverLetter += obj.text || '';
+        if (!liveRenderPending) {
+          liveRenderPending = true;
+          requestAnimationFrame(() => {
+            liveRenderPending = false;
+            renderCoverLetter(liveCoverLetter);
+          });
+        }
       } else if (obj.type === 'cover_letter_done') {
         generateBtn.disabled = false;
         // Backend explicitly sends the final cover letter
+        if (liveCoverLetter) liveCoverLetter = obj.content;
         renderCoverLetter(obj.content);
+      } else if (obj.type === 'structured_field') {
+        streamedAnalysis[obj.field] = obj.value;
+        populateBreakdownCards(streamedAnalysis);
       } else if (obj.type === 'structured_data') {
         console.log('obj.data ##############', obj.data);
 
@@ -860,6 +888,11 @@ async function startStreaming(payload) {
       } else if (obj.type === 'done' || obj.type === 'finished') {
         // Final completion event - now display everything
         generateBtn.disabled = false;
+        if (liveCoverLetter) {
+          clearInterval(loaderInterval);
+          initializeCopyButtons();
+          continue;
+        }
         setProgress(100, 'Completed!');
 
         setTimeout(() => {
@@ -943,6 +976,7 @@ generateBtn.addEventListener('click', async () => {
     client_text: text,
     context_snippets: urls,
     selected_categories: selectedCategories,
+    catalog: catalog,
     // files: selectedFile,
     session_id: sessionId,
     base64_string: fileBase64,